@@ -5,24 +5,49 @@ Compare Azure Content Understanding vs Document Intelligence + GPT vs Mistral AI
 on your own documents. Upload, pick a model, and get side-by-side results.
 """
 
+import io
 import os
 import sys
 import json
 import time
 import streamlit as st
 import pandas as pd
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import as_completed
 
 # ── Make sure our package is importable ────────────────────────────────
 sys.path.insert(0, os.path.dirname(__file__))
 
-from config import PREBUILT_ANALYZERS, SUPPORTED_EXTENSIONS
+from config import (
+    ADAPTIVE_CONCURRENCY,
+    CASSETTE_MODE,
+    CU_BATCH_SIZE,
+    PREBUILT_ANALYZERS,
+    SCHEDULER_POLICY,
+    SEARCH_INDEX_PATH,
+    SUPPORTED_EXTENSIONS,
+)
 from utils.comparison import (
     build_comparison_table,
     build_field_comparison,
     compute_summary_stats,
     get_mime_type,
 )
+from utils.cassette import install_from_config
+from utils.circuit_breaker import breaker_states, reset_all as reset_breakers
+from utils.concurrency import decision_log, limiter_states
+from utils.preflight import inspect_document
+from utils.scheduler import POLICIES, BatchScheduler, estimate_cost
+from utils.search_index import QueryError, SearchIndex
+from utils.spatial_index import SpatialIndex, field_locations
+from utils.scoring import (
+    parse_ground_truth,
+    score_results,
+    build_efficiency_table,
+    build_field_score_table,
+)
+
+# Record / replay every HTTP exchange when CASSETTE_MODE is set (once per process)
+cassette = install_from_config()
 
 # ═══════════════════════════════════════════════════════════════════════
 # Page config
@@ -81,6 +106,71 @@ with st.sidebar:
     run_di = st.checkbox("🟢 Document Intelligence + GPT-5", value=True)
     run_mi = st.checkbox("🟠 Mistral Doc AI (OCR)", value=True)
 
+    st.subheader("3️⃣  Ground Truth (optional)")
+    gt_file = st.file_uploader(
+        "Labeled fields (JSON / CSV keyed by filename)",
+        type=["json", "csv"],
+        help="Used to score each pipeline's extracted fields for accuracy.",
+    )
+    ground_truth = {}
+    if gt_file is not None:
+        try:
+            ground_truth = parse_ground_truth(
+                gt_file.getvalue().decode("utf-8"),
+                "csv" if gt_file.name.lower().endswith(".csv") else "json",
+            )
+            st.caption(f"✅ {len(ground_truth)} labeled documents loaded")
+        except Exception as e:
+            st.error(f"Invalid ground truth file: {e}")
+
+    st.subheader("4️⃣  Scheduling")
+    sched_policy = st.selectbox(
+        "Batch order",
+        options=list(POLICIES),
+        index=list(POLICIES).index(SCHEDULER_POLICY),
+        format_func=lambda x: POLICIES[x],
+        help="Documents are ordered by page count / size read locally; "
+             "results are always shown in upload order.",
+    )
+    sched_lanes = st.checkbox(
+        "Per-pipeline lanes", value=True,
+        help="Each pipeline drains its own queue so a slow one never blocks the others.",
+    )
+    sched_adaptive = st.checkbox(
+        "Adaptive concurrency", value=ADAPTIVE_CONCURRENCY,
+        help="Each lane raises its in-flight limit while latency stays flat and "
+             "halves it on 429s, timeouts or latency inflation.",
+    )
+    for lim in limiter_states():
+        st.caption(
+            f"🎚 **{lim['lane']}** — limit {lim['limit']} "
+            f"(↑{lim['increases']} ↓{lim['decreases']}"
+            + (f", {lim['throttled']} throttled" if lim["throttled"] else "") + ")"
+        )
+
+    st.subheader("🛡️  Circuit Breakers")
+    breakers = breaker_states()
+    if breakers:
+        icons = {"closed": "🟢", "half_open": "🟡", "open": "🔴"}
+        for b in breakers:
+            st.caption(
+                f"{icons[b['state']]} **{b['breaker']}** — {b['state']}"
+                + (f" · {b['short_circuited']} fast-failed" if b["short_circuited"] else "")
+            )
+            if b["state"] != "closed" and b["last_error"]:
+                st.caption(f"↳ {b['last_error'][:160]}")
+        if any(b["state"] != "closed" for b in breakers):
+            if st.button("Reset breakers", use_container_width=True):
+                reset_breakers()
+                st.rerun()
+    else:
+        st.caption("No calls made yet.")
+
+    if cassette is not None:
+        st.subheader("📼  Cassette")
+        st.caption(f"**{CASSETTE_MODE}** · `{cassette.path}` · {len(cassette)} exchanges")
+        st.caption(" · ".join(f"{k}: {v}" for k, v in cassette.stats.items() if v))
+
     st.divider()
     st.caption(
         "All three pipelines run **in parallel** for maximum speed. "
@@ -110,6 +200,74 @@ def get_mi_service():
     return MistralVisionService()
 
 
+@st.cache_resource
+def get_search_index():
+    return SearchIndex(SEARCH_INDEX_PATH) if SEARCH_INDEX_PATH else None
+
+
+@st.fragment
+def render_search(index: SearchIndex):
+    """Search box over every result indexed so far (reruns on its own, keeping results on screen)."""
+    with st.expander("🔎 Search processed documents", expanded=False):
+        stats = index.stats()
+        q_col, p_col = st.columns([3, 1])
+        query = q_col.text_input(
+            "Query",
+            placeholder='VendorName:"Andrews, Kirby"  inv*  "PO 4711"  pipeline:cu',
+            help="Words, \"phrases\" and prefix* match anywhere; `Field:term` searches one "
+                 "field (aliases resolve, e.g. `vendor:`), `markdown:` the text only. "
+                 "All terms must match.",
+        )
+        pipelines = p_col.multiselect("Pipelines", ["cu", "di", "mistral"])
+        st.caption(
+            f"{stats['documents']} results indexed "
+            f"({', '.join(f'{k}: {v}' for k, v in stats['by_pipeline'].items()) or 'none yet'}) "
+            f"· {stats['size_mb']} MB · `{index.path}`"
+        )
+        if not query.strip():
+            return
+        t0 = time.perf_counter()
+        try:
+            hits = index.search(query, pipelines=pipelines, limit=100)
+        except QueryError as e:
+            st.warning(str(e))
+            return
+        st.caption(f"{len(hits)} hit(s) in {(time.perf_counter() - t0) * 1000:.1f} ms")
+        if hits:
+            st.dataframe(
+                pd.DataFrame(hits)[["document", "pipeline", "analyzer", "field", "snippet", "score"]],
+                use_container_width=True, hide_index=True,
+            )
+
+
+def render_field_locations(file_bytes: bytes, raw: dict):
+    """Field boxes drawn over the first page, with the OCR words behind each field."""
+    from PIL import Image, ImageDraw
+
+    index = SpatialIndex.from_result(raw)
+    page = index.pages.get(1)
+    block = (raw.get("result", {}).get("contents") or [{}])[0]
+    locations = field_locations(block.get("fields"))
+    if not page or not page.width or not locations:
+        return
+    image = Image.open(io.BytesIO(file_bytes)).convert("RGB")
+    scale = image.width / page.width
+    overlay = ImageDraw.Draw(image, "RGBA")
+    rows = []
+    for name, regions in locations.items():
+        for page_number, (x0, y0, x1, y1) in regions:
+            if page_number != 1:
+                continue
+            overlay.rectangle([x0 * scale, y0 * scale, x1 * scale, y1 * scale],
+                              outline=(21, 101, 192, 255), fill=(21, 101, 192, 40), width=2)
+            words = index.words_in_box(1, (x0, y0, x1, y1))
+            rows.append({"Field": name, "Words": " ".join(w.text for w in words),
+                         "Box": f"{x0:.0f},{y0:.0f} – {x1:.0f},{y1:.0f}"})
+    with st.expander(f"🗺 Field locations ({len(rows)})", expanded=False):
+        st.image(image, use_container_width=True)
+        st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+
+
 # ═══════════════════════════════════════════════════════════════════════
 # Header
 # ═══════════════════════════════════════════════════════════════════════
@@ -119,6 +277,10 @@ st.markdown(
     "and **Mistral Doc AI** on your documents — all at once."
 )
 
+search_index = get_search_index()
+if search_index is not None:
+    render_search(search_index)
+
 # ═══════════════════════════════════════════════════════════════════════
 # File Upload
 # ═══════════════════════════════════════════════════════════════════════
@@ -155,65 +317,121 @@ if st.button("🚀  Run Benchmark", type="primary", use_container_width=True):
 
     all_doc_results = []
     progress = st.progress(0, text="Starting benchmark…")
-    total_tasks = len(uploaded_files)
 
-    for file_idx, uploaded_file in enumerate(uploaded_files):
+    # ── Pre-flight: real format, pages, limits — no network ─────────────
+    docs = []
+    for uploaded_file in uploaded_files:
         file_bytes = uploaded_file.getvalue()
-        filename = uploaded_file.name
-        mime = get_mime_type(filename)
+        pre = inspect_document(file_bytes, uploaded_file.name)
+        docs.append({
+            "filename": uploaded_file.name,
+            "bytes": file_bytes,
+            "pre": pre,
+            "mime": pre["mime"] if pre["format"] != "unknown" else get_mime_type(uploaded_file.name),
+        })
+
+    # ── Schedule every (document, pipeline) job, smallest first by default
+    selected = [
+        (run_cu, "cu", "🔵 Content Understanding", get_cu_service, True),
+        (run_di, "di", "🟢 DocIntel + GPT-5", get_di_service, True),
+        (run_mi, "mistral", "🟠 Mistral Doc AI", get_mi_service, False),
+    ]
+    scheduler = BatchScheduler(policy=sched_policy, lanes=sched_lanes, adaptive=sched_adaptive)
+    doc_results = [{} for _ in docs]
+    futures = {}        # future → [(doc_idx, pipeline), …] it answers for
+    cu_batch = []
+    for doc_idx, doc in enumerate(docs):
+        pre = doc["pre"]
+        cost = estimate_cost(pre)
+        for enabled, service, pname, get_service, uses_analyzer in selected:
+            if not enabled:
+                continue
+            if not pre["accepted_by"][service]:
+                # Rejected locally: skip the upload / submit round trip
+                doc_results[doc_idx][pname] = {
+                    "status": "error",
+                    "error": "Pre-flight: " + "; ".join(pre["rejections"][service]),
+                    "time_seconds": 0,
+                }
+                continue
+            doc_results[doc_idx][pname] = None     # keeps pipeline display order
+            if service == "cu" and CU_BATCH_SIZE > 1:
+                cu_batch.append((cost, doc_idx, pname))
+                continue
+            args = (analyzer_id, doc["mime"]) if uses_analyzer else (doc["mime"],)
+            kwargs = {"content_hash": pre["sha256"]} if uses_analyzer else {}
+            future = scheduler.submit(
+                service, doc_idx, doc["filename"], cost,
+                get_service().analyze, doc["bytes"], doc["filename"], *args, **kwargs,
+            )
+            futures[future] = [(doc_idx, pname)]
+
+    # ── Content Understanding: pack similar-sized documents per analyze call
+    cu_batch.sort()
+    for start in range(0, len(cu_batch), CU_BATCH_SIZE):
+        group = cu_batch[start:start + CU_BATCH_SIZE]
+        batch_docs = [
+            {
+                "bytes": docs[i]["bytes"],
+                "filename": docs[i]["filename"],
+                "mime": docs[i]["mime"],
+                "content_hash": docs[i]["pre"]["sha256"],
+            }
+            for _, i, _ in group
+        ]
+        future = scheduler.submit(
+            "cu", group[0][1], ", ".join(d["filename"] for d in batch_docs),
+            sum(c for c, _, _ in group),
+            get_cu_service().analyze_batch, batch_docs, analyzer_id, CU_BATCH_SIZE,
+        )
+        futures[future] = [(i, pname) for _, i, pname in group]
+
+    service_of = {pname: service for _, service, pname, _, _ in selected}
+    scheduler.start()
+    total_runs = sum(len(targets) for targets in futures.values())
+    done = 0
+    for future in as_completed(futures):
+        targets = futures[future]
+        try:
+            res = future.result()
+            outcomes = res if isinstance(res, list) else [res]
+        except Exception as e:
+            outcomes = [{"status": "error", "error": str(e), "time_seconds": 0}] * len(targets)
+        for (doc_idx, pname), outcome in zip(targets, outcomes):
+            doc_results[doc_idx][pname] = outcome
+            if search_index is not None and outcome.get("status") in ("success", "partial"):
+                service = service_of[pname]
+                search_index.add(
+                    docs[doc_idx]["filename"], service, outcome.get("markdown") or "",
+                    outcome.get("fields"), analyzer=analyzer_id if service == "cu" else "",
+                )
+        done += len(targets)
+        progress.progress(
+            done / total_runs,
+            text=f"Completed {done}/{total_runs} pipeline runs "
+                 f"({docs[doc_idx]['filename']} · {pname})",
+        )
+    scheduler.shutdown()
+    progress.progress(1.0, text=f"Processed {len(docs)} documents")
+
+    # ── Report in upload order ──────────────────────────────────────────
+    for doc, results in zip(docs, doc_results):
+        file_bytes, filename, pre, mime = doc["bytes"], doc["filename"], doc["pre"], doc["mime"]
 
         st.divider()
         st.subheader(f"📄 {filename}")
 
         # Show document preview
-        preview_col, results_col = st.columns([1, 3])
+        preview_col, _ = st.columns([1, 3])
         with preview_col:
-            if mime.startswith("image"):
+            if mime.startswith("image") and not pre["errors"]:
                 st.image(file_bytes, caption=filename, use_container_width=True)
             else:
                 st.write(f"📄 {filename} ({len(file_bytes) / 1024:.0f} KB)")
-
-        # ── Run pipelines in parallel ───────────────────────────────────
-        results = {}
-        futures = {}
-        with ThreadPoolExecutor(max_workers=3) as executor:
-            if run_cu:
-                svc = get_cu_service()
-                futures[
-                    executor.submit(svc.analyze, file_bytes, filename, analyzer_id, mime)
-                ] = "🔵 Content Understanding"
-            if run_di:
-                svc = get_di_service()
-                futures[
-                    executor.submit(svc.analyze, file_bytes, filename, analyzer_id, mime)
-                ] = "🟢 DocIntel + GPT-5"
-            if run_mi:
-                svc = get_mi_service()
-                futures[
-                    executor.submit(svc.analyze, file_bytes, filename, mime)
-                ] = "🟠 Mistral Doc AI"
-
-            with results_col:
-                status_placeholder = st.empty()
-                status_placeholder.info(
-                    f"⏳ Running {len(futures)} pipeline(s) in parallel…"
-                )
-
-            for future in as_completed(futures):
-                pipeline_name = futures[future]
-                try:
-                    results[pipeline_name] = future.result()
-                except Exception as e:
-                    results[pipeline_name] = {
-                        "status": "error",
-                        "error": str(e),
-                        "time_seconds": 0,
-                    }
-
-        with results_col:
-            status_placeholder.success(
-                f"✅ All pipelines completed for {filename}"
-            )
+            dims = f" · {pre['width']}×{pre['height']}px" if pre["width"] else ""
+            st.caption(f"{pre['format'].upper()} · {pre['pages'] or '?'} page(s){dims}")
+            for w in pre["warnings"]:
+                st.caption(f"⚠️ {w}")
 
         # ── Metric cards ────────────────────────────────────────────────
         metric_cols = st.columns(len(results))
@@ -233,6 +451,8 @@ if st.button("🚀  Run Benchmark", type="primary", use_container_width=True):
                 )
                 st.metric("Fields extracted", fv)
                 st.metric("Avg confidence", conf_str)
+                cost = (res.get("usage") or {}).get("cost_usd")
+                st.metric("Est. cost", f"${cost:.4f}" if cost is not None else "N/A")
 
         # ── Comparison table ────────────────────────────────────────────
         st.markdown("#### 📊 Pipeline Comparison")
@@ -275,6 +495,10 @@ if st.button("🚀  Run Benchmark", type="primary", use_container_width=True):
                     with st.expander(f"📋 Extracted fields ({len(fields)})", expanded=False):
                         st.json(fields)
 
+                # Field boxes over the document (CU results carry word / field polygons)
+                if res.get("raw_result") and mime.startswith("image") and not pre["errors"]:
+                    render_field_locations(file_bytes, res["raw_result"])
+
                 # Errors / warnings
                 errs = res.get("errors")
                 if errs:
@@ -283,10 +507,6 @@ if st.button("🚀  Run Benchmark", type="primary", use_container_width=True):
 
         # Store for batch summary
         all_doc_results.append({"filename": filename, "results": results})
-        progress.progress(
-            (file_idx + 1) / total_tasks,
-            text=f"Processed {file_idx + 1}/{total_tasks} documents",
-        )
 
     # ═══════════════════════════════════════════════════════════════════
     # 📈 Batch Summary (if multiple docs)
@@ -294,6 +514,16 @@ if st.button("🚀  Run Benchmark", type="primary", use_container_width=True):
     if len(all_doc_results) > 1:
         st.divider()
         st.header("📈 Batch Summary")
+        lane_stats = scheduler.stats()
+        if lane_stats:
+            with st.expander(f"⏱ Scheduling ({POLICIES[sched_policy]})", expanded=False):
+                st.dataframe(pd.DataFrame(lane_stats), use_container_width=True, hide_index=True)
+                decisions = decision_log(scheduler.limiter_names())
+                if decisions:
+                    st.markdown("**🎚 Concurrency decisions**")
+                    df_decisions = pd.DataFrame(decisions)
+                    df_decisions["at"] = pd.to_datetime(df_decisions["at"], unit="s")
+                    st.dataframe(df_decisions, use_container_width=True, hide_index=True)
         summary = compute_summary_stats(all_doc_results)
         if summary:
             st.dataframe(
@@ -319,6 +549,29 @@ if st.button("🚀  Run Benchmark", type="primary", use_container_width=True):
                 df_chart.pivot(index="Document", columns="Pipeline", values="Time (s)")
             )
 
+    # ═══════════════════════════════════════════════════════════════════
+    # 🎯 Accuracy vs Ground Truth
+    # ═══════════════════════════════════════════════════════════════════
+    if ground_truth:
+        scores = score_results(all_doc_results, ground_truth)
+        st.divider()
+        st.header("🎯 Accuracy vs Ground Truth")
+        if scores:
+            summary = compute_summary_stats(all_doc_results)
+            st.dataframe(
+                pd.DataFrame(build_efficiency_table(scores, summary)),
+                use_container_width=True,
+                hide_index=True,
+            )
+            with st.expander("Per-field precision / recall", expanded=False):
+                st.dataframe(
+                    pd.DataFrame(build_field_score_table(scores)),
+                    use_container_width=True,
+                    hide_index=True,
+                )
+        else:
+            st.info("No uploaded document matches a labeled filename.")
+
     # ── Download results ────────────────────────────────────────────────
     st.divider()
     results_json = json.dumps(all_doc_results, indent=2, ensure_ascii=False, default=str)
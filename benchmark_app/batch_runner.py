@@ -0,0 +1,450 @@
+"""
+🗂️ Batch runner — Azure Content Understanding over a folder of documents.
+
+Command-line counterpart of the notebook's "submit all, then poll all" batch.
+Every step (uploaded, submitted with its Operation-Location, polled, LLM
+description done, JSON written) is committed to a SQLite job journal before
+moving on, so a run killed halfway resumes polling outstanding operations
+and skips completed work instead of resubmitting the whole batch.
+
+Usage:
+    python batch_runner.py --input ../batch_1/batch1_1 \\
+        --output ../batch_1/docu_results_batch1_1 --analyzer prebuilt-invoice
+
+    # Re-running the same command resumes from the journal
+    # (default: <output>/batch_journal.sqlite).
+
+    # Full-text search over everything written so far (indexed as each job
+    # completes; --reindex rebuilds it from the result JSON in <output>)
+    python batch_runner.py --output ../batch_1/docu_results_batch1_1 \\
+        --search 'VendorName:"Andrews, Kirby" inv*'
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from config import (
+    ADAPTIVE_CONCURRENCY,
+    CASSETTE_LATENCY_SCALE,
+    PREBUILT_ANALYZERS,
+    SCHEDULER_LANE_WORKERS,
+    SCHEDULER_POLICY,
+    SUPPORTED_EXTENSIONS,
+)
+from utils.cassette import install, install_from_config
+from utils.circuit_breaker import breaker_states, get_breaker
+from utils.comparison import build_analyzer_summary
+from utils.concurrency import decision_log, limiter_states
+from utils.job_journal import JobJournal
+from utils.preflight import inspect_document
+from utils.scheduler import POLICIES, BatchScheduler, estimate_cost
+from utils.search_index import QueryError, SearchIndex
+from utils.usage import cu_usage, summarize_usage
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# Helpers
+# ═══════════════════════════════════════════════════════════════════════
+def list_documents(folder: str, limit: int | None = None) -> list[str]:
+    """Supported documents in `folder`, sorted by name."""
+    docs = sorted(
+        os.path.join(folder, f)
+        for f in os.listdir(folder)
+        if os.path.splitext(f)[1].lower() in SUPPORTED_EXTENSIONS
+    )
+    return docs[:limit] if limit else docs
+
+
+def index_result(index: SearchIndex, document: str, analyzer: str, raw: dict,
+                 field_values: dict, source: str | None = None):
+    """Add a written CU result (markdown + extracted field values) to the search index."""
+    contents = raw.get("result", {}).get("contents") or []
+    markdown = "\n\n".join(c.get("markdown", "") for c in contents if c.get("markdown"))
+    index.add(document, "cu", markdown, field_values, analyzer=analyzer, source=source)
+
+
+def reindex_folder(index: SearchIndex, output_folder: str) -> int:
+    """(Re)index every `<output>/<analyzer>/*.json` result; returns the count."""
+    from services.content_understanding import ContentUnderstandingService as CU
+    count = 0
+    for path in sorted(glob.glob(os.path.join(output_folder, "*", "*.json"))):
+        with open(path, encoding="utf-8") as f:
+            raw = json.load(f)
+        if "result" not in raw:
+            continue
+        analyzer = os.path.basename(os.path.dirname(path))
+        extracted = raw.get("_extracted", {})
+        field_values = extracted.get("field_values")
+        if field_values is None:
+            contents = raw["result"].get("contents") or [{}]
+            field_values = CU._extract_field_values(contents[0].get("fields") or {})
+        # Older results do not record the document name: fall back to the file stem
+        document = extracted.get("document") or os.path.splitext(os.path.basename(path))[0]
+        index_result(index, document, analyzer, raw, field_values, source=path)
+        count += 1
+    index.optimize()
+    return count
+
+
+def print_search(index: SearchIndex, query: str, limit: int):
+    """Print the documents matching `query`, best first."""
+    t0 = time.perf_counter()
+    try:
+        hits = index.search(query, limit=limit)
+    except QueryError as e:
+        raise SystemExit(f"❌ {e}")
+    elapsed = (time.perf_counter() - t0) * 1000
+    print(f"🔎 {len(hits)} hit(s) for {query!r} in {elapsed:.1f} ms\n")
+    for hit in hits:
+        snippet = " ".join(hit["snippet"].split())
+        print(f"  {hit['score']:>7.2f}  {hit['document']}|{hit['analyzer'] or hit['pipeline']}"
+              f"  {hit['field']}: {snippet[:120]}")
+
+
+def build_metrics(raw: dict, document: str, analyzer: str,
+                  time_seconds: float, description: str,
+                  describe_usage: dict | None = None) -> dict:
+    """Per-document metrics in the `all_metrics.json` format (+ usage and cost)."""
+    from services.content_understanding import ContentUnderstandingService as CU
+
+    contents = raw.get("result", {}).get("contents", [])
+    block = contents[0] if contents else {}
+    fields = block.get("fields", {})
+    field_values = CU._extract_field_values(fields)
+
+    confs = []
+    CU._collect_confidences(fields, confs)
+    words = [w for p in block.get("pages", []) for w in p.get("words", [])]
+    word_confs = [w["confidence"] for w in words if w.get("confidence") is not None]
+    usage = summarize_usage(cu_usage(raw) + ([describe_usage] if describe_usage else []))
+
+    return {
+        "document": document,
+        "analyzer": analyzer,
+        "time_seconds": round(time_seconds, 1),
+        "num_fields": len(fields),
+        "num_fields_with_values": len(field_values),
+        "markdown_len": len(block.get("markdown", "")),
+        "avg_confidence": round(sum(confs) / len(confs), 4) if confs else None,
+        "avg_word_confidence": (
+            round(sum(word_confs) / len(word_confs), 4) if word_confs else None
+        ),
+        "num_tables": len(block.get("tables", [])),
+        "num_pages": len(block.get("pages", [])),
+        "num_words": len(words),
+        "pages_billed": usage["pages"],
+        "prompt_tokens": usage["prompt_tokens"],
+        "completion_tokens": usage["completion_tokens"],
+        "cost_usd": usage["cost_usd"],
+        "field_values": field_values,
+        "description": description,
+    }
+
+
+def _is_transient(exc: Exception) -> bool:
+    """Worth polling the same operation again later (timeout, network, 429 / 5xx)."""
+    if isinstance(exc, (TimeoutError, requests.ConnectionError, requests.Timeout)):
+        return True
+    return (
+        isinstance(exc, requests.HTTPError)
+        and exc.response is not None
+        and (exc.response.status_code == 429 or exc.response.status_code >= 500)
+    )
+
+
+def _is_expired(exc: Exception) -> bool:
+    """The operation (or its SAS URL) no longer exists server-side."""
+    return (
+        isinstance(exc, requests.HTTPError)
+        and exc.response is not None
+        and exc.response.status_code in (404, 410)
+    )
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# Job state machine
+# ═══════════════════════════════════════════════════════════════════════
+class BatchRunner:
+    """Drives each (document, analyzer) job through the journal states."""
+
+    def __init__(self, service, journal: JobJournal, output_folder: str,
+                 index: SearchIndex | None = None):
+        self.svc = service
+        self.journal = journal
+        self.output_folder = output_folder
+        self.index = index      # full-text index, updated as jobs are written
+        self.preflight = {}     # filename → pre-flight metadata
+
+    def inspect(self, path: str) -> dict:
+        """Pre-flight metadata for a document (computed once per run)."""
+        fname = os.path.basename(path)
+        if fname not in self.preflight:
+            with open(path, "rb") as f:
+                self.preflight[fname] = inspect_document(f.read(), fname)
+        return self.preflight[fname]
+
+    def submit(self, path: str, analyzer: str):
+        """Advance a job up to `submitted` (upload + submit)."""
+        fname = os.path.basename(path)
+        job = self.journal.get(fname, analyzer)
+        try:
+            if job["state"] == "pending":
+                pre = self.inspect(path)
+                if not pre["accepted_by"]["cu"]:
+                    raise ValueError("pre-flight: " + "; ".join(pre["rejections"]["cu"]))
+                get_breaker(self.svc.endpoint, analyzer).raise_if_open()
+                with open(path, "rb") as f:
+                    blob_url = self.svc._upload_blob(f.read(), fname)
+                self.journal.record(fname, analyzer, "uploaded", blob_url=blob_url)
+                job = self.journal.get(fname, analyzer)
+            if job["state"] == "uploaded":
+                op_url = self.svc._submit_url(job["blob_url"], analyzer)
+                self.journal.record(fname, analyzer, "submitted",
+                                    op_url=op_url, submitted_at=time.time())
+                print(f"  ✓ {fname} → {analyzer}")
+        except Exception as e:
+            self.journal.record(fname, analyzer, "failed", error=str(e))
+            print(f"  ✗ {fname} → {analyzer}: {e}")
+
+    def finish(self, path: str, analyzer: str):
+        """Advance a submitted job to `written` (poll → describe → write)."""
+        fname = os.path.basename(path)
+        job = self.journal.get(fname, analyzer)
+        try:
+            if job["state"] == "submitted":
+                raw = self._poll_job(path, analyzer, job["op_url"])
+                if raw is None:
+                    return
+                self.journal.record(fname, analyzer, "polled", raw=raw)
+                job = self.journal.get(fname, analyzer)
+
+            if job["state"] == "polled":
+                usage = None
+                try:
+                    pre = self.inspect(path)
+                    with open(path, "rb") as f:
+                        description, usage = self.svc._gpt4_describe(
+                            f.read(), fname, pre["mime"], content_hash=pre["sha256"]
+                        )
+                except Exception as e:
+                    description = f"[LLM error: {e}]"
+                self.journal.record(fname, analyzer, "llm_done",
+                                    description=description, usage=usage)
+                job = self.journal.get(fname, analyzer)
+
+            if job["state"] == "llm_done":
+                raw, description = job["raw"], job["description"]
+                metrics = build_metrics(
+                    raw, fname, analyzer,
+                    time.time() - (job["submitted_at"] or time.time()),
+                    description, job["usage"],
+                )
+                enriched = dict(raw)
+                enriched["_extracted"] = {
+                    "document": fname,
+                    "field_values": metrics["field_values"],
+                    "description": description,
+                }
+                folder = os.path.join(self.output_folder, analyzer)
+                os.makedirs(folder, exist_ok=True)
+                out_path = os.path.join(folder, f"{os.path.splitext(fname)[0]}.json")
+                tmp_path = out_path + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(enriched, f, indent=2, ensure_ascii=False)
+                os.replace(tmp_path, out_path)
+                self.journal.record(fname, analyzer, "written",
+                                    output_path=out_path, metrics=metrics)
+                if self.index is not None:
+                    index_result(self.index, fname, analyzer, raw, metrics["field_values"], out_path)
+                print(
+                    f"  ✅ {fname}|{analyzer} {metrics['time_seconds']:.0f}s | "
+                    f"fields={metrics['num_fields_with_values']}/{metrics['num_fields']} | "
+                    f"{description[:80]}"
+                )
+        except Exception as e:
+            self.journal.record(fname, analyzer, "failed", error=str(e))
+            print(f"  ❌ {fname}|{analyzer} {str(e)[:80]}")
+
+    def _poll_job(self, path: str, analyzer: str, op_url: str, restart: bool = True) -> dict | None:
+        """
+        Poll a submitted job's operation. Returns the raw result, or None when
+        the job was left `submitted` (timeout / transient error: the next run
+        polls the same Operation-Location again) or recorded as failed.
+        """
+        fname = os.path.basename(path)
+        try:
+            return self.svc._poll(op_url)
+        except Exception as e:
+            if _is_transient(e):
+                self.journal.note(fname, analyzer, f"poll: {e}")
+                print(f"  ⏸ {fname}|{analyzer} still submitted ({str(e)[:80]}) — rerun to resume")
+                return None
+            if _is_expired(e) and restart:
+                # Operation gone (journal older than its retention): start over, once
+                self.journal.reset(fname, analyzer, f"expired: {e}")
+                self.submit(path, analyzer)
+                job = self.journal.get(fname, analyzer)
+                if job["state"] != "submitted":
+                    return None
+                return self._poll_job(path, analyzer, job["op_url"], restart=False)
+            # The operation failed (or vanished again): nothing left to poll
+            self.journal.record(fname, analyzer, "failed", error=str(e), op_url=None)
+            print(f"  ❌ {fname}|{analyzer} {str(e)[:80]}")
+            return None
+
+    def collect_metrics(self) -> dict:
+        """{analyzer: [metrics | error entry, ...]} from the journal."""
+        all_metrics = {}
+        for job in self.journal.jobs(["written", "failed"]):
+            entries = all_metrics.setdefault(job["analyzer"], [])
+            if job["state"] == "written":
+                entries.append(job["metrics"])
+            else:
+                entries.append({
+                    "document": job["document"],
+                    "analyzer": job["analyzer"],
+                    "error": job["error"],
+                    "time_seconds": 0,
+                })
+        return all_metrics
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# CLI
+# ═══════════════════════════════════════════════════════════════════════
+def main():
+    ap = argparse.ArgumentParser(description="Content Understanding batch runner (resumable)")
+    ap.add_argument("--input", help="folder of documents to analyze (not needed to search)")
+    ap.add_argument("--output", required=True, help="results folder")
+    ap.add_argument("--analyzer", action="append", choices=list(PREBUILT_ANALYZERS),
+                    help="analyzer id (repeatable, default: prebuilt-invoice)")
+    ap.add_argument("--journal", help="journal path (default: <output>/batch_journal.sqlite)")
+    ap.add_argument("--limit", type=int, help="only the first N documents")
+    ap.add_argument("--retry-failed", action="store_true",
+                    help="retry failed jobs from their last saved step before running")
+    ap.add_argument("--policy", choices=list(POLICIES), default=SCHEDULER_POLICY,
+                    help=f"document order (default: {SCHEDULER_POLICY})")
+    ap.add_argument("--workers", type=int, default=SCHEDULER_LANE_WORKERS,
+                    help="concurrent jobs per analyzer lane (starting limit when adaptive)")
+    ap.add_argument("--adaptive", action=argparse.BooleanOptionalAction, default=ADAPTIVE_CONCURRENCY,
+                    help="learn each lane's concurrency from latency and throttling (AIMD)")
+    tape = ap.add_mutually_exclusive_group()
+    tape.add_argument("--record", metavar="CASSETTE", help="record every HTTP exchange to a cassette")
+    tape.add_argument("--replay", metavar="CASSETTE", help="serve every HTTP exchange from a cassette")
+    ap.add_argument("--latency-scale", type=float, default=CASSETTE_LATENCY_SCALE,
+                    help="multiplier on replayed latencies (0 = instant)")
+    ap.add_argument("--search-index", help="search index path (default: <output>/search_index.sqlite)")
+    ap.add_argument("--search", metavar="QUERY", help="search the results written so far and exit")
+    ap.add_argument("--reindex", action="store_true",
+                    help="rebuild the search index from the result JSON in --output")
+    ap.add_argument("--top", type=int, default=20, help="hits shown by --search")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="  %(message)s")
+
+    index = SearchIndex(args.search_index or os.path.join(args.output, "search_index.sqlite"))
+    if args.reindex:
+        t0 = time.perf_counter()
+        count = reindex_folder(index, args.output)
+        print(f"🗃 indexed {count} results in {time.perf_counter() - t0:.1f}s — {index.stats()}")
+    if args.search:
+        print_search(index, args.search, args.top)
+    if args.search or (args.reindex and not args.input):
+        index.close()
+        return
+    if not args.input:
+        ap.error("--input is required to run a batch")
+
+    if args.record or args.replay:
+        cassette = install("record" if args.record else "replay",
+                           args.record or args.replay, args.latency_scale)
+    else:
+        cassette = install_from_config()
+
+    analyzers = args.analyzer or ["prebuilt-invoice"]
+    os.makedirs(args.output, exist_ok=True)
+    journal = JobJournal(args.journal or os.path.join(args.output, "batch_journal.sqlite"))
+
+    docs = list_documents(args.input, args.limit)
+    for path in docs:
+        for aid in analyzers:
+            journal.ensure(os.path.basename(path), aid)
+    if args.retry_failed:
+        for job in journal.jobs(["failed"]):
+            journal.retry(job["document"], job["analyzer"])
+
+    counts = journal.counts()
+    print(f"📂 {len(docs)} documents × {len(analyzers)} analyzer(s) | journal: {counts}")
+
+    from services.content_understanding import ContentUnderstandingService
+    runner = BatchRunner(ContentUnderstandingService(), journal, args.output, index)
+
+    def run_phase(phase, states, step):
+        """Run `step` on every job in `states`, one lane per analyzer."""
+        scheduler = BatchScheduler(policy=args.policy, workers_per_lane=args.workers,
+                                   adaptive=args.adaptive, scope=f"{phase}/")
+
+        def tracked(path, aid):
+            # The journaled job (with its error) is the outcome the limiter sees
+            step(path, aid)
+            return journal.get(os.path.basename(path), aid)
+
+        futures = []
+        for idx, path in enumerate(docs):
+            fname = os.path.basename(path)
+            for aid in analyzers:
+                if journal.get(fname, aid)["state"] in states:
+                    cost = estimate_cost(runner.inspect(path))
+                    futures.append(scheduler.submit(aid, idx, fname, cost, tracked, path, aid))
+        scheduler.start()
+        for future in futures:
+            future.result()
+        scheduler.shutdown()
+        for row in scheduler.stats():
+            print(f"  ⏱ {row['Lane']}: {row['Jobs']} jobs | mean queue "
+                  f"{row['Mean queue delay (s)']}s | mean completion "
+                  f"{row['Mean completion (s)']}s | makespan {row['Makespan (s)']}s | "
+                  f"concurrency {row['Concurrency limit']}")
+
+    # ── Phase 1: submit everything not yet submitted ────────────────────
+    print(f"\n📤 Submitting ({POLICIES[args.policy]})…")
+    run_phase("submit", ("pending", "uploaded"), runner.submit)
+
+    # ── Phase 2: poll / describe / write everything outstanding ─────────
+    print("\n📥 Collecting results…")
+    run_phase("collect", ("submitted", "polled", "llm_done"), runner.finish)
+
+    all_metrics = runner.collect_metrics()
+    with open(os.path.join(args.output, "all_metrics.json"), "w", encoding="utf-8") as f:
+        json.dump(all_metrics, f, indent=2, ensure_ascii=False)
+    with open(os.path.join(args.output, "model_comparison_summary.json"), "w", encoding="utf-8") as f:
+        json.dump(build_analyzer_summary(all_metrics), f, indent=2, ensure_ascii=False)
+    if args.adaptive:
+        with open(os.path.join(args.output, "concurrency.json"), "w", encoding="utf-8") as f:
+            json.dump({"lanes": limiter_states(), "decisions": decision_log()},
+                      f, indent=2, ensure_ascii=False)
+
+    tripped = [b for b in breaker_states() if b["state"] != "closed" or b["short_circuited"]]
+    for b in tripped:
+        print(f"\n⚡ Breaker {b['breaker']}: {b['state']}, {b['short_circuited']} documents "
+              f"fast-failed — last error: {(b['last_error'] or '')[:200]}")
+    if cassette is not None:
+        print(f"\n📼 Cassette {cassette.path}: {cassette.stats}")
+        cassette.close()
+    index.optimize()
+    print(f"\n🎉 Done! {journal.counts()} — results in {args.output} "
+          f"(search with --search QUERY)")
+    journal.close()
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
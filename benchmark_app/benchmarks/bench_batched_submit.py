@@ -0,0 +1,112 @@
+"""
+Benchmark: multi-input batched submits vs one submit per document.
+
+Runs the Content Understanding service layer against the local stand-in
+endpoint (``stand_in_server.py``, started in-process) and compares, for the
+same documents:
+  - singles: `analyze` per document (N submits, N poll loops)
+  - batched: `analyze_batch` with K documents per analyze call
+
+and reports requests sent per kind and per-document latency.
+
+Usage:
+    python benchmarks/bench_batched_submit.py --docs 20 --batch-size 5 \\
+        --latency 2 --latency-per-input 0.2
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from services.stand_in import StandInService
+from stand_in_server import serve
+
+
+def make_documents(n: int, tag: str) -> list[dict]:
+    """Distinct small fake PNGs (distinct bytes so LLM calls are not coalesced)."""
+    return [
+        {
+            "bytes": b"\x89PNG\r\n\x1a\n" + f"{tag}-{i}".encode() * 512,
+            "filename": f"{tag}-{i:03d}.png",
+            "mime": "image/png",
+        }
+        for i in range(n)
+    ]
+
+
+def _pct(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run_mode(svc, state, mode: str, docs: list[dict], analyzer: str,
+             batch_size: int, concurrency: int) -> dict:
+    before = dict(state.stats)
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        if mode == "singles":
+            results = list(pool.map(
+                lambda d: svc.analyze(d["bytes"], d["filename"], analyzer, d["mime"]), docs
+            ))
+        else:
+            groups = [docs[i:i + batch_size] for i in range(0, len(docs), batch_size)]
+            results = [
+                r for group in pool.map(
+                    lambda g: svc.analyze_batch(g, analyzer, batch_size=batch_size), groups
+                )
+                for r in group
+            ]
+    wall = time.perf_counter() - t0
+    sent = {k: state.stats[k] - before[k] for k in state.stats}
+    latencies = [r["time_seconds"] for r in results]
+    return {
+        "mode": mode if mode == "singles" else f"batched x{batch_size}",
+        "ok": sum(r["status"] != "error" for r in results),
+        "analyze": sent["analyze"],
+        "polls": sent["polls"],
+        "requests": sum(sent.values()),
+        "mean_s": sum(latencies) / len(latencies),
+        "p95_s": _pct(latencies, 0.95),
+        "wall_s": wall,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--docs", type=int, default=20)
+    ap.add_argument("--batch-size", type=int, default=5)
+    ap.add_argument("--analyzer", default="prebuilt-invoice")
+    ap.add_argument("--latency", type=float, default=2.0, help="stand-in seconds per analysis")
+    ap.add_argument("--latency-per-input", type=float, default=0.2,
+                    help="stand-in extra seconds per additional input of a batch")
+    ap.add_argument("--concurrency", type=int, default=8, help="concurrent submits / batches")
+    args = ap.parse_args()
+
+    server, state = serve(0, args.latency, llm_latency=0.2,
+                          latency_per_input=args.latency_per_input)
+    svc = StandInService(f"http://127.0.0.1:{server.server_port}")
+
+    rows = [
+        run_mode(svc, state, "singles", make_documents(args.docs, "single"),
+                 args.analyzer, 1, args.concurrency),
+        run_mode(svc, state, "batched", make_documents(args.docs, "batched"),
+                 args.analyzer, args.batch_size, args.concurrency),
+    ]
+    server.shutdown()
+
+    print(f"\n{args.docs} documents, stand-in latency {args.latency}s "
+          f"+ {args.latency_per_input}s per extra input\n")
+    print(f"{'mode':<12} {'ok':>4} {'analyze':>8} {'polls':>6} {'requests':>9} "
+          f"{'mean s':>8} {'p95 s':>7} {'wall s':>7}")
+    for r in rows:
+        print(f"{r['mode']:<12} {r['ok']:>4} {r['analyze']:>8} {r['polls']:>6} {r['requests']:>9} "
+              f"{r['mean_s']:>8.2f} {r['p95_s']:>7.2f} {r['wall_s']:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
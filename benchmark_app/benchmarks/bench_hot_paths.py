@@ -0,0 +1,291 @@
+"""
+Micro-benchmarks: CPU-bound result handling on synthetic batch_1 data.
+
+Scales the saved batch_1 results up to `--docs` documents (each a CU result
+with its raw JSON plus DocIntel- and Mistral-shaped results derived from it)
+and measures, per hot path:
+
+    cu_extract_field_values   ContentUnderstandingService._extract_field_values
+    cu_collect_confidences    ContentUnderstandingService._collect_confidences
+    mistral_parse_fields      MistralVisionService._parse_fields
+    comparison_table          build_comparison_table (per document)
+    field_comparison          build_field_comparison (per document)
+    summary_stats             compute_summary_stats (whole batch)
+    request_body              describe body → StreamingJSONBody, base64 included
+    result_json               json.dumps of a document's results (raw JSON included), as
+                              the job journal and distributed shards store them
+    spatial_index             SpatialIndex.from_result + the words behind every field
+    search_index              SearchIndex.add of every pipeline's result (in memory),
+                              then a field-scoped, a phrase and a prefix query
+
+Time is the best of `--repeat` runs (µs per document); peak allocations come
+from a separate tracemalloc run so tracing does not skew the timings.
+Results are compared with a stored baseline: a case slower, or allocating
+more, than `--tolerance` makes the exit status 1. Baselines are only
+comparable on the same machine.
+
+Usage:
+    python benchmarks/bench_hot_paths.py --save-baseline
+    python benchmarks/bench_hot_paths.py --docs 5000 --only cu_extract_field_values,result_json
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from services.content_understanding import ContentUnderstandingService
+from services.llm_describe import build_describe_body
+from services.mistral_vision import MistralVisionService
+from stand_in_server import FIXTURES
+from utils.comparison import build_comparison_table, build_field_comparison, compute_summary_stats
+from utils.search_index import SearchIndex
+from utils.spatial_index import SpatialIndex
+from utils.streaming_body import StreamingJSONBody
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "hot_paths.json")
+
+CU, DI, MISTRAL = "🔵 Content Understanding", "🟢 DocIntel + GPT-5", "🟠 Mistral Doc AI"
+
+
+def load_raws(folder: str = FIXTURES) -> list[dict]:
+    """Saved CU results (with markdown and fields), without the `_extracted` block."""
+    raws = []
+    for path in sorted(glob.glob(os.path.join(folder, "*", "*.json"))):
+        with open(path, encoding="utf-8") as f:
+            raw = json.load(f)
+        contents = raw.get("result", {}).get("contents") or []
+        if contents and contents[0].get("fields"):
+            raw.pop("_extracted", None)
+            raws.append(raw)
+    if not raws:
+        raise SystemExit(f"No fixtures with fields found in {folder}")
+    return raws
+
+
+def build_dataset(n_docs: int, doc_kb: int) -> list[dict]:
+    """
+    `n_docs` synthetic documents cycling through the fixtures. Each document
+    gets its own result dicts (timings and costs vary) around the shared raw
+    JSON, so per-document work is realistic without n copies of the raws.
+    """
+    raws = load_raws()
+    templates = []
+    for raw in raws:
+        block = raw["result"]["contents"][0]
+        flat = ContentUnderstandingService._extract_field_values(block["fields"])
+        templates.append({
+            "raw": raw,
+            "markdown": block.get("markdown", ""),
+            "fields": block["fields"],
+            "flat": flat,
+            "mistral_fields": MistralVisionService._parse_fields(block.get("markdown", "")),
+        })
+    docs = []
+    for i in range(n_docs):
+        t = templates[i % len(templates)]
+        filename = f"synthetic-{i:05d}.jpg"
+        vary = 1 + (i % 17) / 10
+        results = {
+            CU: {
+                "status": "success", "time_seconds": round(6.1 * vary, 2), "raw_result": t["raw"],
+                "markdown": t["markdown"], "fields": t["flat"], "field_count": len(t["fields"]),
+                "fields_with_values": len(t["flat"]), "tables_count": 1, "avg_confidence": 0.81,
+                "gpt_description": "Invoice from a vendor to a customer.",
+                "usage": {"pages": 1, "cost_usd": 0.0061 * vary}, "errors": None,
+            },
+            DI: {
+                "status": "success", "time_seconds": round(4.3 * vary, 2), "markdown": t["markdown"],
+                "fields": {k: str(v) for k, v in t["flat"].items()}, "field_count": len(t["flat"]),
+                "fields_with_values": len(t["flat"]), "tables_count": 1, "avg_confidence": 0.86,
+                "gpt_description": "Invoice from a vendor to a customer.",
+                "usage": {"pages": 1, "cost_usd": 0.0123 * vary}, "errors": None,
+            },
+            MISTRAL: {
+                "status": "partial" if i % 11 == 0 else "success", "time_seconds": round(2.9 * vary, 2),
+                "markdown": t["markdown"], "fields": t["mistral_fields"],
+                "field_count": len(t["mistral_fields"]), "fields_with_values": len(t["mistral_fields"]),
+                "tables_count": 1, "avg_confidence": None, "gpt_description": "An invoice.",
+                "usage": {"pages": 1, "cost_usd": 0.0032 * vary},
+                "errors": ["Mistral Summary: 429 Too Many Requests"] if i % 11 == 0 else None,
+            },
+        }
+        docs.append({
+            "filename": filename,
+            "raw": t["raw"],
+            "fields": t["fields"],
+            "markdown": t["markdown"],
+            "bytes": f"{i:08d}".encode() * (doc_kb * 128),
+            "results": results,
+        })
+    return docs
+
+
+# ── Cases: each runs one hot path over the whole dataset ────────────────
+def _extract_field_values(docs):
+    for d in docs:
+        ContentUnderstandingService._extract_field_values(d["fields"])
+
+
+def _collect_confidences(docs):
+    for d in docs:
+        ContentUnderstandingService._collect_confidences(d["fields"], [])
+
+
+def _parse_fields(docs):
+    for d in docs:
+        MistralVisionService._parse_fields(d["markdown"])
+
+
+def _comparison_table(docs):
+    for d in docs:
+        build_comparison_table(d["results"])
+
+
+def _field_comparison(docs):
+    for d in docs:
+        build_field_comparison(d["results"])
+
+
+def _summary_stats(docs):
+    compute_summary_stats(docs)
+
+
+def _request_body(docs):
+    for d in docs:
+        body = StreamingJSONBody(build_describe_body("image/jpeg"), d["bytes"])
+        for _ in body:
+            pass
+
+
+def _result_json(docs):
+    for d in docs:
+        json.dumps({"filename": d["filename"], "results": d["results"]}, ensure_ascii=False)
+
+
+def _spatial_index(docs):
+    for d in docs:
+        index = SpatialIndex.from_result(d["raw"])
+        for field in d["fields"].values():
+            index.field_words(field)
+
+
+def _search_index(docs):
+    index = SearchIndex(":memory:")
+    for d in docs:
+        for pipeline, res in zip(("cu", "di", "mistral"), d["results"].values()):
+            index.add(d["filename"], pipeline, res["markdown"], res["fields"])
+    for query in ('VendorName:"Andrews, Kirby"', '"Invoice no" pipeline:cu', "inv*"):
+        index.search(query)
+    index.close()
+
+
+CASES = {
+    "cu_extract_field_values": _extract_field_values,
+    "cu_collect_confidences": _collect_confidences,
+    "mistral_parse_fields": _parse_fields,
+    "comparison_table": _comparison_table,
+    "field_comparison": _field_comparison,
+    "summary_stats": _summary_stats,
+    "request_body": _request_body,
+    "result_json": _result_json,
+    "spatial_index": _spatial_index,
+    "search_index": _search_index,
+}
+
+
+def measure(fn, docs: list[dict], repeat: int) -> dict:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(docs)
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    fn(docs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "us_per_doc": round(best / len(docs) * 1e6, 2),
+        "total_ms": round(best * 1000, 2),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[dict]:
+    """Cases slower or allocating more than `tolerance` above the baseline."""
+    regressions = []
+    for case, current in results.items():
+        ref = baseline.get("cases", {}).get(case)
+        if not ref:
+            continue
+        for metric in ("us_per_doc", "peak_kb"):
+            old, new = ref.get(metric), current[metric]
+            if old and (new - old) / old > tolerance:
+                regressions.append({"case": case, "metric": metric, "baseline": old,
+                                    "current": new, "change": round((new - old) / old, 3)})
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--docs", type=int, default=2000, help="synthetic documents")
+    ap.add_argument("--doc-kb", type=int, default=64, help="document size for the request body case")
+    ap.add_argument("--repeat", type=int, default=5, help="timed runs per case (best is kept)")
+    ap.add_argument("--only", help="comma-separated cases to run")
+    ap.add_argument("--baseline", default=BASELINE, help="stored baseline to compare with")
+    ap.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown / growth")
+    args = ap.parse_args()
+
+    cases = CASES
+    if args.only:
+        names = [n.strip() for n in args.only.split(",") if n.strip()]
+        unknown = set(names) - set(CASES)
+        if unknown:
+            ap.error(f"unknown cases: {', '.join(sorted(unknown))}")
+        cases = {n: CASES[n] for n in names}
+
+    docs = build_dataset(args.docs, args.doc_kb)
+    print(f"📄 {len(docs)} synthetic documents, best of {args.repeat}\n")
+    print(f"  {'case':<25} {'µs/doc':>10} {'total ms':>10} {'peak KB':>10}")
+    results = {}
+    for name, fn in cases.items():
+        results[name] = r = measure(fn, docs, args.repeat)
+        print(f"  {name:<25} {r['us_per_doc']:>10.2f} {r['total_ms']:>10.2f} {r['peak_kb']:>10.1f}")
+
+    settings = {"docs": args.docs, "doc_kb": args.doc_kb}
+    if args.save_baseline:
+        stored = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as f:
+                stored = json.load(f).get("cases", {})
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"settings": settings, "cases": {**stored, **results}}, f, indent=2)
+        print(f"\n💾 baseline saved to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline} (run with --save-baseline to store one)")
+        return
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("settings") != settings:
+        print("\n⚠️ baseline was recorded with different settings; comparing anyway")
+    regressions = compare(results, baseline, args.tolerance)
+    if not regressions:
+        print(f"\n✅ no regressions beyond +{args.tolerance:.0%} against {args.baseline}")
+        return
+    print(f"\n❌ {len(regressions)} regressions beyond +{args.tolerance:.0%}:")
+    for r in regressions:
+        print(f"  {r['case']:<25} {r['metric']:<11} {r['baseline']} → {r['current']} ({r['change']:+.0%})")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
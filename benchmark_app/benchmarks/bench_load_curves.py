@@ -0,0 +1,292 @@
+"""
+Load sweep: throughput / latency curves of the three pipelines.
+
+Starts the stand-in (``stand_in_server.py``) in-process with configurable
+latency distributions, 429 rate and payload size, then drives the real
+service classes (``services.stand_in``) through a grid of
+
+    pipeline × concurrency × CU batch size
+
+Each sweep point runs in fresh worker processes (spawned, one per
+``--processes``) that split the documents and the concurrency between them
+and report their CPU seconds and peak RSS. Per point the sweep records
+throughput, p50 / p95 latency, errors, 429s, CPU per document and the
+largest worker RSS, writes them to ``curves.json`` / ``curves.csv`` (plus
+``curves.html`` when altair is installed) and compares them with a stored
+baseline: a throughput drop, or a p95 / CPU / RSS rise, beyond
+``--tolerance`` is a regression and makes the exit status 1.
+
+Usage:
+    python benchmarks/bench_load_curves.py --save-baseline
+    python benchmarks/bench_load_curves.py --pipelines cu,di --concurrency 1,4,16 \\
+        --jitter 0.5 --throttle-rate 0.05 --payload-scale 4
+"""
+
+import argparse
+import csv
+import json
+import os
+import resource
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from stand_in_server import serve
+from utils.concurrency import THROTTLED, classify_outcome
+
+PIPELINES = ("cu", "di", "mistral")
+BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "load_curves.json")
+OUTPUT = os.path.join(os.path.dirname(__file__), "results", "load_curves")
+
+# Compared with the baseline: (metric, higher is better)
+_REGRESSION_METRICS = (
+    ("docs_per_min", True),
+    ("p95_s", False),
+    ("cpu_ms_per_doc", False),
+    ("peak_rss_mb", False),
+)
+
+
+def make_documents(n: int, tag: str, size_kb: int) -> list[dict]:
+    """Distinct fake PNGs of ~`size_kb` KB (distinct bytes so LLM calls are not coalesced)."""
+    filler = (tag.encode() + b"-") * (size_kb * 1024 // (len(tag) + 1) + 1)
+    return [
+        {
+            "bytes": b"\x89PNG\r\n\x1a\n" + f"{i:06d}".encode() + filler[:size_kb * 1024],
+            "filename": f"{tag}-{i:04d}.png",
+            "mime": "image/png",
+        }
+        for i in range(n)
+    ]
+
+
+def _pct(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def _service(pipeline: str, endpoint: str, poll_interval: float):
+    from services.stand_in import StandInDocIntelService, StandInMistralService, StandInService
+    if pipeline == "cu":
+        return StandInService(endpoint, poll_interval)
+    if pipeline == "di":
+        return StandInDocIntelService(endpoint, poll_interval)
+    return StandInMistralService(endpoint)
+
+
+def run_worker(endpoint: str, pipeline: str, model: str, tag: str, n_docs: int,
+               size_kb: int, threads: int, batch_size: int, poll_interval: float) -> dict:
+    """One worker process of a sweep point: its share of the documents on `threads` threads."""
+    svc = _service(pipeline, endpoint, poll_interval)
+    docs = make_documents(n_docs, tag, size_kb)
+    usage0 = resource.getrusage(resource.RUSAGE_SELF)
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        if pipeline == "cu" and batch_size > 1:
+            groups = [docs[i:i + batch_size] for i in range(0, len(docs), batch_size)]
+            results = [r for group in pool.map(
+                lambda g: svc.analyze_batch(g, model, batch_size=batch_size), groups
+            ) for r in group]
+        elif pipeline in ("cu", "di"):
+            results = list(pool.map(lambda d: svc.analyze(d["bytes"], d["filename"], model, d["mime"]), docs))
+        else:
+            results = list(pool.map(lambda d: svc.analyze(d["bytes"], d["filename"], d["mime"]), docs))
+    wall = time.perf_counter() - t0
+    usage1 = resource.getrusage(resource.RUSAGE_SELF)
+    return {
+        "latencies": [r["time_seconds"] for r in results],
+        "ok": sum(r["status"] == "success" for r in results),
+        "errors": sum(r["status"] == "error" for r in results),
+        "throttled": sum(classify_outcome(r) == THROTTLED for r in results),
+        "cpu_s": (usage1.ru_utime - usage0.ru_utime) + (usage1.ru_stime - usage0.ru_stime),
+        "peak_rss_mb": usage1.ru_maxrss / 1024,          # KiB on Linux
+        "wall_s": wall,
+    }
+
+
+def run_point(endpoint: str, state, pipeline: str, model: str, concurrency: int,
+              batch_size: int, args) -> dict:
+    processes = max(1, min(args.processes, concurrency))
+    shares = [args.docs // processes + (i < args.docs % processes) for i in range(processes)]
+    threads = [concurrency // processes + (i < concurrency % processes) for i in range(processes)]
+    before = dict(state.stats)
+    ctx = get_context("spawn")
+    with ProcessPoolExecutor(max_workers=processes, mp_context=ctx, max_tasks_per_child=1) as pool:
+        futures = [
+            pool.submit(run_worker, endpoint, pipeline, model,
+                        f"{pipeline}-c{concurrency}-b{batch_size}-w{i}", shares[i], args.doc_kb,
+                        threads[i], batch_size, args.poll_interval)
+            for i in range(processes) if shares[i]
+        ]
+        workers = [f.result() for f in futures]
+    # Workers start together once imported; process start-up is not load
+    wall = max(w["wall_s"] for w in workers)
+    latencies = [lat for w in workers for lat in w["latencies"]]
+    cpu_s = sum(w["cpu_s"] for w in workers)
+    return {
+        "pipeline": pipeline,
+        "concurrency": concurrency,
+        "batch_size": batch_size,
+        "docs": len(latencies),
+        "ok": sum(w["ok"] for w in workers),
+        "errors": sum(w["errors"] for w in workers),
+        "throttled": sum(w["throttled"] for w in workers),
+        "requests_429": state.stats["throttled"] - before["throttled"],
+        "docs_per_min": round(len(latencies) / wall * 60, 2),
+        "p50_s": round(statistics.median(latencies), 3) if latencies else 0.0,
+        "p95_s": round(_pct(latencies, 0.95), 3),
+        "wall_s": round(wall, 2),
+        "cpu_ms_per_doc": round(cpu_s / max(len(latencies), 1) * 1000, 1),
+        "worker_cpu_s": [round(w["cpu_s"], 2) for w in workers],
+        "worker_rss_mb": [round(w["peak_rss_mb"], 1) for w in workers],
+        "peak_rss_mb": round(max(w["peak_rss_mb"] for w in workers), 1),
+    }
+
+
+def point_key(point: dict) -> str:
+    return f"{point['pipeline']}/c{point['concurrency']}/b{point['batch_size']}"
+
+
+def compare(points: list[dict], baseline: dict, tolerance: float) -> list[dict]:
+    """Metrics that moved beyond `tolerance` in the bad direction."""
+    stored = baseline.get("points", {})
+    regressions = []
+    for point in points:
+        ref = stored.get(point_key(point))
+        if not ref:
+            continue
+        for metric, higher_is_better in _REGRESSION_METRICS:
+            old, new = ref.get(metric), point.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append({"point": point_key(point), "metric": metric,
+                                    "baseline": old, "current": new, "change": round(change, 3)})
+    return regressions
+
+
+def write_outputs(points: list[dict], settings: dict, out_dir: str):
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, "curves.json"), "w", encoding="utf-8") as f:
+        json.dump({"settings": settings, "points": points}, f, indent=2)
+    columns = [k for k in points[0] if not k.startswith("worker_")]
+    with open(os.path.join(out_dir, "curves.csv"), "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(points)
+    try:
+        import altair as alt
+        import pandas as pd
+    except ImportError:
+        return
+    df = pd.DataFrame(points).drop(columns=["worker_cpu_s", "worker_rss_mb"])
+    df["series"] = df["pipeline"] + df["batch_size"].map(lambda b: f" ×{b}" if b > 1 else "")
+    base = alt.Chart(df).mark_line(point=True).encode(
+        x=alt.X("concurrency:Q", scale=alt.Scale(type="log", base=2)),
+        color="series:N",
+        tooltip=["series", "concurrency", "docs_per_min", "p50_s", "p95_s", "cpu_ms_per_doc", "peak_rss_mb"],
+    ).properties(width=320, height=240)
+    chart = alt.hconcat(
+        base.encode(y=alt.Y("docs_per_min:Q", title="docs / min")),
+        base.encode(y=alt.Y("p95_s:Q", title="p95 latency (s)")),
+        base.encode(y=alt.Y("cpu_ms_per_doc:Q", title="CPU ms / doc")),
+    )
+    chart.save(os.path.join(out_dir, "curves.html"))
+
+
+def _int_list(text: str) -> list[int]:
+    return [int(x) for x in text.split(",") if x.strip()]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--pipelines", default=",".join(PIPELINES), help="comma-separated: cu, di, mistral")
+    ap.add_argument("--model", default="prebuilt-invoice", help="CU analyzer / DI model")
+    ap.add_argument("--concurrency", type=_int_list, default=[1, 2, 4, 8, 16])
+    ap.add_argument("--batch-sizes", type=_int_list, default=[1, 4], help="CU documents per analyze call")
+    ap.add_argument("--docs", type=int, default=48, help="documents per sweep point")
+    ap.add_argument("--doc-kb", type=int, default=64, help="size of each fake document")
+    ap.add_argument("--processes", type=int, default=2, help="worker processes per sweep point")
+    ap.add_argument("--latency", type=float, default=1.0, help="stand-in median seconds per analysis")
+    ap.add_argument("--latency-per-input", type=float, default=0.1,
+                    help="stand-in extra seconds per additional input of a batch")
+    ap.add_argument("--llm-latency", type=float, default=0.3, help="stand-in median seconds per chat call")
+    ap.add_argument("--ocr-latency", type=float, default=0.6, help="stand-in median seconds per OCR call")
+    ap.add_argument("--jitter", type=float, default=0.3, help="log-normal sigma of stand-in latencies")
+    ap.add_argument("--throttle-rate", type=float, default=0.0, help="share of requests answered with 429")
+    ap.add_argument("--payload-scale", type=int, default=1, help="repeat result words / paragraphs N times")
+    ap.add_argument("--poll-interval", type=float, default=0.25,
+                    help="CU / DI poll interval (the services default to 5 s)")
+    ap.add_argument("--baseline", default=BASELINE, help="stored baseline to compare with")
+    ap.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    ap.add_argument("--tolerance", type=float, default=0.15, help="allowed relative change per metric")
+    ap.add_argument("--output", default=OUTPUT,
+                    help="folder for curves.json / .csv / .html")
+    args = ap.parse_args()
+
+    pipelines = [p.strip() for p in args.pipelines.split(",") if p.strip()]
+    unknown = set(pipelines) - set(PIPELINES)
+    if unknown:
+        ap.error(f"unknown pipelines: {', '.join(sorted(unknown))}")
+    settings = {k: getattr(args, k) for k in (
+        "model", "docs", "doc_kb", "processes", "latency", "latency_per_input", "llm_latency",
+        "ocr_latency", "jitter", "throttle_rate", "payload_scale", "poll_interval",
+    )}
+
+    server, state = serve(0, args.latency, args.llm_latency,
+                          latency_per_input=args.latency_per_input, jitter=args.jitter,
+                          throttle_rate=args.throttle_rate, payload_scale=args.payload_scale,
+                          ocr_latency=args.ocr_latency)
+    endpoint = f"http://127.0.0.1:{server.server_port}"
+
+    print(f"\n{args.docs} documents of {args.doc_kb} KB per point, {args.processes} worker processes, "
+          f"latency {args.latency}s (jitter {args.jitter}), 429 rate {args.throttle_rate}\n")
+    print(f"{'point':<16} {'ok':>4} {'err':>4} {'429':>4} {'docs/min':>9} {'p50 s':>7} "
+          f"{'p95 s':>7} {'CPU ms/doc':>11} {'RSS MB':>7}")
+    points = []
+    try:
+        for pipeline in pipelines:
+            for batch_size in (args.batch_sizes if pipeline == "cu" else [1]):
+                for concurrency in args.concurrency:
+                    p = run_point(endpoint, state, pipeline, args.model, concurrency, batch_size, args)
+                    points.append(p)
+                    print(f"{point_key(p):<16} {p['ok']:>4} {p['errors']:>4} {p['requests_429']:>4} "
+                          f"{p['docs_per_min']:>9.1f} {p['p50_s']:>7.2f} {p['p95_s']:>7.2f} "
+                          f"{p['cpu_ms_per_doc']:>11.1f} {p['peak_rss_mb']:>7.1f}")
+    finally:
+        server.shutdown()
+
+    write_outputs(points, settings, args.output)
+    print(f"\n📈 curves written to {args.output}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"settings": settings, "points": {point_key(p): p for p in points}}, f, indent=2)
+        print(f"💾 baseline saved to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline} (run with --save-baseline to store one)")
+        return
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("settings") != settings:
+        print("⚠️ baseline was recorded with different settings; comparing anyway")
+    regressions = compare(points, baseline, args.tolerance)
+    if not regressions:
+        print(f"✅ no regressions beyond ±{args.tolerance:.0%} against {args.baseline}")
+        return
+    print(f"\n❌ {len(regressions)} regressions beyond {args.tolerance:.0%}:")
+    for r in regressions:
+        print(f"  {r['point']:<16} {r['metric']:<15} {r['baseline']} → {r['current']} ({r['change']:+.0%})")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark: one-pass markdown structure parser vs the legacy regex path.
+
+Builds a large multi-page OCR output from the batch_1 invoice markdown and
+times, per document:
+  - legacy: multiline regex over the joined text + "<table>"/"| " counting
+  - parser: `parse_markdown` over the pages + `select_sections`
+
+Usage:
+    python benchmarks/bench_markdown_parser.py --pages 200 --repeat 20
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from utils.markdown_parser import parse_markdown, select_sections
+
+FIXTURES = os.path.join(
+    os.path.dirname(__file__), "..", "..", "batch_1", "docu_results_batch1_1", "prebuilt-invoice"
+)
+
+_LEGACY_RE = re.compile(
+    r"(?:^|\n)\s*[-•*]*\s*\*{0,2}([A-Za-z /]+?)\*{0,2}\s*:\s*(.+)",
+    re.MULTILINE,
+)
+
+
+def load_pages(n_pages: int) -> list[str]:
+    """Cycle through the fixture markdowns (plus a pipe-table variant) to build n pages."""
+    sources = []
+    for path in sorted(glob.glob(os.path.join(FIXTURES, "*.json"))):
+        with open(path, encoding="utf-8") as f:
+            contents = json.load(f).get("result", {}).get("contents", [])
+        if contents and contents[0].get("markdown"):
+            sources.append(contents[0]["markdown"])
+    if not sources:
+        raise SystemExit(f"No fixtures found in {FIXTURES}")
+    sources.append(
+        "## Summary\n\n| Item | Qty | Price |\n|---|---|---|\n"
+        + "".join(f"| Widget {i} | {i} | {i * 3},00 |\n" for i in range(40))
+        + "\nTotal: 2 460,00\n"
+    )
+    return [sources[i % len(sources)] for i in range(n_pages)]
+
+
+def legacy(pages: list[str]):
+    text = "\n\n".join(pages)
+    fields = {}
+    for m in _LEGACY_RE.finditer(text):
+        key, val = m.group(1).strip(), m.group(2).strip()
+        if key and val and len(key) < 40:
+            fields[key] = val
+    tables = text.count("<table>") + text.count("| ")
+    return fields, tables, text[:4000]
+
+
+def one_pass(pages: list[str]):
+    structure = parse_markdown(pages)
+    return structure["fields"], len(structure["tables"]), select_sections(structure, 4000)
+
+
+def bench(fn, pages, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(pages)
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--pages", type=int, default=200, help="pages per synthetic document")
+    ap.add_argument("--repeat", type=int, default=20, help="runs per variant (best is kept)")
+    args = ap.parse_args()
+
+    pages = load_pages(args.pages)
+    size_kb = sum(len(p) for p in pages) / 1024
+    print(f"📄 {args.pages} pages, {size_kb:.0f} KB of markdown\n")
+
+    for name, fn in (("legacy", legacy), ("one-pass", one_pass)):
+        dt, (fields, tables, summary) = bench(fn, pages, args.repeat)
+        print(
+            f"  {name:<9} {dt * 1000:8.2f} ms | {size_kb / 1024 / dt:6.1f} MB/s | "
+            f"fields={len(fields):<4} tables={tables:<6} summary={len(summary)} chars"
+        )
+
+
+if __name__ == "__main__":
+    main()
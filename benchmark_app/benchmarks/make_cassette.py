@@ -0,0 +1,147 @@
+"""
+Convert saved batch_1 Content Understanding results into a replay cassette.
+
+For every `<analyzer>/<document>.json` result the cassette gets the
+exchanges the Content Understanding pipeline would make for that document:
+
+    PUT  <container>/<document>                 blob upload          201
+    POST analyzers/<analyzer>:analyze           submit               202 + Operation-Location
+    GET  analyzerResults/<id>                   Running × n, then the saved result
+    POST <GPT-4 deployment>/chat/completions    the saved (or a canned) description,
+                                                or the saved LLM error status (429 …)
+
+plus one user delegation key for the blob SAS. The number of Running polls
+follows the document's `time_seconds` from `all_metrics.json` (else
+`--latency`), so replayed end-to-end times track the recorded ones.
+
+Usage:
+    python benchmarks/make_cassette.py --output cassettes/batch_1.jsonl
+    CASSETTE_MODE=replay CASSETTE_PATH=cassettes/batch_1.jsonl streamlit run app.py
+"""
+
+import argparse
+import base64
+import glob
+import json
+import os
+import re
+import sys
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from config import CU_API_VERSION, CU_ENDPOINT, GPT4_ENDPOINT, STORAGE_ACCOUNT, STORAGE_CONTAINER
+from stand_in_server import FIXTURES
+from utils.cassette import exchange
+
+# Poll interval of `ContentUnderstandingService._poll`
+POLL_INTERVAL_S = 5.0
+_LLM_ERROR_RE = re.compile(r"^\[LLM error: (\d{3})\b")
+
+_UDK_XML = (
+    '<?xml version="1.0" encoding="utf-8"?><UserDelegationKey>'
+    "<SignedOid>00000000-0000-0000-0000-000000000000</SignedOid>"
+    "<SignedTid>00000000-0000-0000-0000-000000000000</SignedTid>"
+    "<SignedStart>2025-01-01T00:00:00Z</SignedStart><SignedExpiry>2099-01-01T00:00:00Z</SignedExpiry>"
+    "<SignedService>b</SignedService><SignedVersion>2025-01-05</SignedVersion>"
+    f"<Value>{base64.b64encode(b'replay-user-delegation-key-0000').decode()}</Value>"
+    "</UserDelegationKey>"
+)
+
+
+def _json(obj) -> bytes:
+    return json.dumps(obj).encode("utf-8")
+
+
+def load_timings(folder: str) -> dict:
+    """{(analyzer, document stem): (filename, time_seconds)} from all_metrics.json."""
+    path = os.path.join(folder, "all_metrics.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        metrics = json.load(f)
+    return {
+        (analyzer, os.path.splitext(m["document"])[0]): (m["document"], m.get("time_seconds"))
+        for analyzer, rows in metrics.items() for m in rows
+    }
+
+
+def document_exchanges(raw: dict, analyzer: str, filename: str, seconds: float,
+                       endpoint: str, blob_base: str, chat_url: str) -> list[dict]:
+    extracted = raw.pop("_extracted", None) or {}
+    description = extracted.get("description") or f"Replayed {analyzer} result for {filename}."
+    blob_url = f"{blob_base}/{filename}"
+    op_url = f"{endpoint}/contentunderstanding/analyzerResults/{raw.get('id') or uuid.uuid4()}?api-version={CU_API_VERSION}"
+    submit_url = f"{endpoint}/contentunderstanding/analyzers/{analyzer}:analyze?api-version={CU_API_VERSION}"
+    running = max(0, round(seconds / POLL_INTERVAL_S) - 1)
+    llm_error = _LLM_ERROR_RE.match(description)
+    if llm_error:
+        # A description that failed when recorded (e.g. 429) fails again on replay
+        describe = exchange("POST", chat_url, int(llm_error.group(1)), {"Content-Type": "application/json"},
+                            _json({"error": {"code": llm_error.group(1), "message": description}}), 0.2)
+    else:
+        describe = exchange("POST", chat_url, 200, {"Content-Type": "application/json"}, _json({
+            "model": "gpt-4.1",
+            "choices": [{"message": {"role": "assistant", "content": description}}],
+            "usage": {"prompt_tokens": 1200, "completion_tokens": 90, "total_tokens": 1290},
+        }), 1.5)
+    return [
+        exchange("PUT", blob_url, 201, {
+            "ETag": f'"0x{uuid.uuid4().hex[:15].upper()}"',
+            "Last-Modified": "Wed, 01 Jan 2025 00:00:00 GMT",
+            "x-ms-request-server-encrypted": "true",
+        }, b"", 0.35),
+        exchange("POST", submit_url, 202, {"Operation-Location": op_url}, b"", 0.3,
+                 request_body=_json({"inputs": [{"url": blob_url}]})),
+        *[
+            exchange("GET", op_url, 200, {"Content-Type": "application/json"},
+                     _json({"id": raw.get("id"), "status": "Running"}), 0.15)
+            for _ in range(running)
+        ],
+        exchange("GET", op_url, 200, {"Content-Type": "application/json"}, _json(raw), 0.4),
+        describe,
+    ]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--fixtures", default=FIXTURES, help="batch results folder (<analyzer>/<doc>.json)")
+    ap.add_argument("--output", required=True, help="cassette file to write")
+    ap.add_argument("--extension", default=".jpg",
+                    help="document extension when all_metrics.json has no filename")
+    ap.add_argument("--latency", type=float, default=6.0,
+                    help="seconds per analysis when all_metrics.json has no timing")
+    args = ap.parse_args()
+
+    # Hosts are not part of the fingerprint; these only make the URLs valid
+    endpoint = (CU_ENDPOINT or "https://replay.cognitiveservices.azure.com").rstrip("/")
+    account_url = f"https://{STORAGE_ACCOUNT or 'replay'}.blob.core.windows.net"
+    blob_base = f"{account_url}/{STORAGE_CONTAINER}"
+    chat_url = GPT4_ENDPOINT or "https://replay.openai.azure.com/openai/deployments/gpt-4.1/chat/completions"
+
+    timings = load_timings(args.fixtures)
+    entries = [exchange("POST", f"{account_url}/?restype=service&comp=userdelegationkey", 200,
+                        {"Content-Type": "application/xml"}, _UDK_XML.encode(), 0.2)]
+    docs = 0
+    for path in sorted(glob.glob(os.path.join(args.fixtures, "*", "*.json"))):
+        with open(path, encoding="utf-8") as f:
+            raw = json.load(f)
+        if "result" not in raw:
+            continue
+        analyzer = os.path.basename(os.path.dirname(path))
+        stem = os.path.splitext(os.path.basename(path))[0]
+        filename, seconds = timings.get((analyzer, stem), (stem + args.extension, None))
+        entries += document_exchanges(raw, analyzer, filename, seconds or args.latency,
+                                      endpoint, blob_base, chat_url)
+        docs += 1
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    print(f"📼 {docs} documents → {len(entries)} exchanges in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
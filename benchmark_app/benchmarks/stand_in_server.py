@@ -0,0 +1,421 @@
+"""
+Local stand-in for the Content Understanding, Document Intelligence,
+chat completions and Mistral OCR endpoints.
+
+Serves just enough of each REST surface for the `services.stand_in` classes:
+
+    PUT  /blob/<name>                                       store a document
+    POST /contentunderstanding/analyzers/<id>:analyze       202 + Operation-Location
+    GET  /operations/<id>                                   Running → Succeeded
+    POST /documentintelligence/documentModels/<id>:analyze  202 + Operation-Location
+    GET  /documentintelligence/documentModels/<id>/analyzeResults/<op>
+    POST …/chat/completions                                 canned description
+    POST …/ocr                                              Mistral OCR pages
+
+Analyze results are the real batch_1 responses for the requested analyzer
+(~200 KB of JSON each; Document Intelligence and OCR answers are converted
+from them), returned after `--latency` seconds (plus `--latency-per-input`
+per extra document of a multi-input request), so workers pay realistic
+parsing costs. Each input gets its own `contents[]` entry with path
+"input<N>"; inputs whose blob was never uploaded are left out, as a partial
+failure.
+
+Load shaping: `--jitter` draws every latency from a log-normal around its
+median (p95 ≈ median × e^(1.645 × jitter)), `--throttle-rate` answers that
+share of analyze / chat / OCR requests with 429 + Retry-After, and
+`--payload-scale` repeats the markdown, paragraphs and words of every
+result.
+
+With `--cassette` the stand-in first answers from a recorded cassette
+(`utils/cassette.py`, e.g. built by `make_cassette.py`) with the recorded
+latencies × `--latency-scale`, and falls back to the routes above for
+requests the cassette does not cover.
+
+Usage:
+    python benchmarks/stand_in_server.py --port 8765 --latency 2
+    python benchmarks/stand_in_server.py --jitter 0.5 --throttle-rate 0.05 --payload-scale 4
+    python benchmarks/stand_in_server.py --cassette cassettes/batch_1.jsonl --latency-scale 0.5
+"""
+
+import argparse
+import glob
+import itertools
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from utils.cassette import Cassette, entry_body
+
+FIXTURES = os.path.join(
+    os.path.dirname(__file__), "..", "..", "batch_1", "docu_results_batch1_1"
+)
+
+_ANALYZE_RE = re.compile(r"^/contentunderstanding/analyzers/([^/:]+):analyze")
+_DI_ANALYZE_RE = re.compile(r"^/documentintelligence/documentModels/([^/:]+):analyze")
+_DI_RESULT_RE = re.compile(r"^/documentintelligence/documentModels/([^/]+)/analyzeResults/([^/]+)")
+_ABSOLUTE_URL_RE = re.compile(r"^https?://[^/]+")
+_SOURCE_RE = re.compile(r"^D\(\d+,([^)]*)\)")
+_THROTTLED_BODY = b'{"error": {"code": "429", "message": "Too Many Requests (stand-in)"}}'
+
+
+def scale_payload(raw: dict, factor: int) -> dict:
+    """Repeat the markdown, paragraphs and words of every content block `factor` times."""
+    if factor <= 1:
+        return raw
+    for block in raw["result"]["contents"]:
+        block["markdown"] = "\n\n".join([block.get("markdown", "")] * factor)
+        block["paragraphs"] = (block.get("paragraphs") or []) * factor
+        for page in block.get("pages") or []:
+            page["words"] = (page.get("words") or []) * factor
+    return raw
+
+
+def load_fixtures(folder: str = FIXTURES, payload_scale: int = 1) -> dict:
+    """{analyzer: [raw result bytes, ...]} without the `_extracted` block."""
+    fixtures = {}
+    for path in sorted(glob.glob(os.path.join(folder, "*", "*.json"))):
+        with open(path, encoding="utf-8") as f:
+            raw = json.load(f)
+        if "result" not in raw:
+            continue
+        raw.pop("_extracted", None)
+        analyzer = os.path.basename(os.path.dirname(path))
+        fixtures.setdefault(analyzer, []).append(
+            json.dumps(scale_payload(raw, payload_scale)).encode("utf-8")
+        )
+    return fixtures
+
+
+def _di_field(field: dict) -> dict | None:
+    """CU field → Document Intelligence field; None when nothing was extracted."""
+    out = {k: v for k, v in field.items() if k not in ("source", "valueObject", "valueArray")}
+    if "valueObject" in field:
+        children = {k: f for k, f in ((k, _di_field(v)) for k, v in field["valueObject"].items()) if f}
+        out["valueObject"] = children
+        text = " ".join(f["content"] for f in children.values())
+    elif "valueArray" in field:
+        items = [f for f in map(_di_field, field["valueArray"]) if f]
+        out["valueArray"] = items
+        text = "; ".join(f["content"] for f in items)
+    else:
+        text = " ".join(str(v) for k, v in field.items() if k.startswith("value"))
+    if not text:
+        return None
+    out["content"] = text
+    return out
+
+
+def di_result(raw: bytes, model_id: str) -> bytes:
+    """Succeeded Document Intelligence operation built from a CU result."""
+    content = json.loads(raw)["result"]["contents"][0]
+    pages = []
+    for page in content.get("pages") or []:
+        words = []
+        for w in page.get("words") or []:
+            m = _SOURCE_RE.match(w.get("source", ""))
+            words.append({
+                "content": w["content"],
+                "polygon": [float(x) for x in m.group(1).split(",")] if m else [],
+                "confidence": w.get("confidence"),
+                "span": w.get("span"),
+            })
+        pages.append({
+            "pageNumber": page.get("pageNumber", 1),
+            "angle": page.get("angle", 0),
+            "width": page.get("width"),
+            "height": page.get("height"),
+            "unit": "pixel",
+            "spans": page.get("spans") or [],
+            "words": words,
+        })
+    fields = content.get("fields") or {}
+    return json.dumps({
+        "status": "succeeded",
+        "analyzeResult": {
+            "apiVersion": "2024-11-30",
+            "modelId": model_id,
+            "content": content.get("markdown", ""),
+            "pages": pages,
+            "tables": [
+                {"rowCount": t.get("rowCount", 0), "columnCount": t.get("columnCount", 0),
+                 "cells": [{k: c[k] for k in ("rowIndex", "columnIndex", "content") if k in c}
+                           for c in t.get("cells") or []]}
+                for t in content.get("tables") or []
+            ],
+            "documents": [{
+                "docType": model_id.removeprefix("prebuilt-"),
+                "confidence": 0.9,
+                "spans": [],
+                "fields": {k: f for k, f in ((k, _di_field(v)) for k, v in fields.items()) if f},
+            }] if fields else [],
+        },
+    }).encode("utf-8")
+
+
+def ocr_result(raw: bytes, model: str, doc_size: int) -> bytes:
+    """Mistral OCR response carrying the markdown of a CU result."""
+    contents = json.loads(raw)["result"]["contents"]
+    return json.dumps({
+        "pages": [{"index": i, "markdown": c.get("markdown", ""), "images": []}
+                  for i, c in enumerate(contents)],
+        "model": model,
+        "usage_info": {"pages_processed": len(contents), "doc_size_bytes": doc_size},
+    }).encode("utf-8")
+
+
+class StandInState:
+    def __init__(self, latency: float, llm_latency: float, fixtures: dict,
+                 latency_per_input: float = 0.0, cassette: Cassette | None = None,
+                 latency_scale: float = 1.0, jitter: float = 0.0,
+                 throttle_rate: float = 0.0, ocr_latency: float | None = None):
+        self.cassette = cassette
+        self.latency_scale = latency_scale
+        self.latency = latency
+        self.latency_per_input = latency_per_input
+        self.llm_latency = llm_latency
+        self.ocr_latency = llm_latency if ocr_latency is None else ocr_latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.fixtures = fixtures
+        self.cycles = {a: itertools.cycle(v) for a, v in fixtures.items()}
+        self.blobs = {}
+        self.operations = {}      # op id → (ready_at, analyzer, [input present?] | None for DI)
+        self.lock = threading.Lock()
+        self.stats = {"uploads": 0, "analyze": 0, "di": 0, "polls": 0, "chat": 0,
+                      "ocr": 0, "throttled": 0, "replayed": 0}
+
+    def count(self, key: str):
+        with self.lock:
+            self.stats[key] += 1
+
+    def sample(self, median: float) -> float:
+        """One latency around `median` (log-normal with sigma `jitter`)."""
+        if self.jitter <= 0 or median <= 0:
+            return median
+        return median * math.exp(random.gauss(0.0, self.jitter))
+
+    def throttled(self) -> bool:
+        if self.throttle_rate > 0 and random.random() < self.throttle_rate:
+            self.count("throttled")
+            return True
+        return False
+
+    def next_fixture(self, analyzer: str) -> bytes:
+        with self.lock:
+            return next(self.cycles.get(analyzer) or next(iter(self.cycles.values())))
+
+
+def make_handler(state: StandInState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _body(self) -> bytes:
+            return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+        def _send(self, status: int, body: bytes = b"", headers: dict | None = None):
+            self.send_response(status)
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _throttle(self) -> bool:
+            """Answer 429 for a `throttle_rate` share of requests."""
+            if not state.throttled():
+                return False
+            self._send(429, _THROTTLED_BODY, {"Retry-After": "1"})
+            return True
+
+        def _replay(self, body: bytes = b"") -> bool:
+            """Answer from the cassette; False when it has no matching exchange."""
+            entry = state.cassette.match(self.command, self.path, body) if state.cassette else None
+            if entry is None:
+                return False
+            time.sleep(entry["latency_s"] * state.latency_scale)
+            state.count("replayed")
+            host = self.headers.get("Host")
+            headers = {
+                # Recorded operation URLs point at the original endpoint
+                k: _ABSOLUTE_URL_RE.sub(f"http://{host}", v) if k.lower() in ("operation-location", "location") else v
+                for k, v in entry["headers"].items() if k.lower() not in ("content-type", "server", "date")
+            }
+            self._send(entry["status"], entry_body(entry), headers)
+            return True
+
+        def do_PUT(self):
+            data = self._body()
+            if self._replay(data):
+                return
+            if not self.path.startswith("/blob/"):
+                return self._send(404)
+            with state.lock:
+                state.blobs[urlsplit(self.path).path] = len(data)
+            state.count("uploads")
+            self._send(201)
+
+        def do_POST(self):
+            body = self._body()
+            if self._replay(body):
+                return
+            path = urlsplit(self.path).path
+            host = self.headers.get("Host")
+            m = _ANALYZE_RE.match(path)
+            if m:
+                analyzer = m.group(1)
+                if analyzer not in state.fixtures:
+                    return self._send(404, json.dumps(
+                        {"error": {"code": "ModelNotFound", "message": analyzer}}).encode())
+                if self._throttle():
+                    return
+                inputs = json.loads(body or b"{}").get("inputs") or []
+                if not inputs:
+                    return self._send(400, b'{"error": {"code": "InvalidRequest"}}')
+                op_id = uuid.uuid4().hex
+                with state.lock:
+                    present = [urlsplit(i.get("url", "")).path in state.blobs for i in inputs]
+                    state.operations[op_id] = (
+                        time.monotonic() + state.sample(state.latency)
+                        + state.latency_per_input * (len(inputs) - 1),
+                        analyzer, present,
+                    )
+                state.count("analyze")
+                return self._send(202, b"", {"Operation-Location": f"http://{host}/operations/{op_id}"})
+            m = _DI_ANALYZE_RE.match(path)
+            if m:
+                if self._throttle():
+                    return
+                model_id, op_id = m.group(1), uuid.uuid4().hex
+                with state.lock:
+                    state.operations[op_id] = (time.monotonic() + state.sample(state.latency), model_id, None)
+                state.count("di")
+                return self._send(202, b"", {"Operation-Location": (
+                    f"http://{host}/documentintelligence/documentModels/{model_id}"
+                    f"/analyzeResults/{op_id}?api-version=2024-11-30"
+                )})
+            if path.endswith("/chat/completions"):
+                if self._throttle():
+                    return
+                time.sleep(state.sample(state.llm_latency))
+                state.count("chat")
+                body = {
+                    "model": json.loads(body or b"{}").get("model") or "gpt-4.1",
+                    "choices": [{"message": {"content": "Stand-in description of the document."}}],
+                    "usage": {"prompt_tokens": 1200, "completion_tokens": 90, "total_tokens": 1290},
+                }
+                return self._send(200, json.dumps(body).encode())
+            if path.endswith("/ocr"):
+                if self._throttle():
+                    return
+                time.sleep(state.sample(state.ocr_latency))
+                state.count("ocr")
+                model = json.loads(body or b"{}").get("model") or "mistral-document-ai-2505"
+                return self._send(200, ocr_result(state.next_fixture("prebuilt-invoice"), model, len(body)))
+            self._send(404)
+
+        def do_GET(self):
+            if self._replay():
+                return
+            path = urlsplit(self.path).path
+            di = _DI_RESULT_RE.match(path)
+            if not di and not path.startswith("/operations/"):
+                return self._send(404)
+            with state.lock:
+                op = state.operations.get(path.split("/")[-1])
+            if op is None:
+                return self._send(404)
+            state.count("polls")
+            ready_at, analyzer, present = op
+            if di:
+                if time.monotonic() < ready_at:
+                    # No Retry-After: the client's polling interval applies
+                    return self._send(200, b'{"status": "running"}')
+                return self._send(200, di_result(state.next_fixture(analyzer), analyzer))
+            if time.monotonic() < ready_at:
+                return self._send(200, b'{"status": "Running"}')
+            if not any(present):
+                return self._send(200, b'{"status": "Failed", "error": {"code": "InvalidContent"}}')
+            raws = [state.next_fixture(analyzer) for _ in present]
+            if len(present) == 1:
+                return self._send(200, raws[0])
+            merged = json.loads(raws[0])
+            merged["result"]["contents"] = []
+            for n, (ok, raw) in enumerate(zip(present, raws), 1):
+                if ok:
+                    for block in json.loads(raw)["result"]["contents"]:
+                        merged["result"]["contents"].append(dict(block, path=f"input{n}"))
+            self._send(200, json.dumps(merged).encode("utf-8"))
+
+    return Handler
+
+
+def serve(port: int = 0, latency: float = 2.0, llm_latency: float = 0.5,
+          fixtures: dict | None = None,
+          latency_per_input: float = 0.0,
+          cassette: str | None = None,
+          latency_scale: float = 1.0,
+          jitter: float = 0.0,
+          throttle_rate: float = 0.0,
+          payload_scale: int = 1,
+          ocr_latency: float | None = None) -> tuple[ThreadingHTTPServer, StandInState]:
+    """Start the stand-in in a background thread; returns (server, state)."""
+    state = StandInState(latency, llm_latency, fixtures or load_fixtures(payload_scale=payload_scale),
+                         latency_per_input, Cassette(cassette) if cassette else None, latency_scale,
+                         jitter, throttle_rate, ocr_latency)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Local Content Understanding / DI / chat / OCR stand-in")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency", type=float, default=2.0, help="median seconds until an analysis succeeds")
+    ap.add_argument("--latency-per-input", type=float, default=0.0,
+                    help="extra seconds per additional document in a multi-input request")
+    ap.add_argument("--llm-latency", type=float, default=0.5, help="median seconds per chat completion")
+    ap.add_argument("--ocr-latency", type=float, help="median seconds per OCR call (default: --llm-latency)")
+    ap.add_argument("--jitter", type=float, default=0.0,
+                    help="log-normal sigma of every latency (0 = fixed; 0.5 puts p95 at ~2.3 × median)")
+    ap.add_argument("--throttle-rate", type=float, default=0.0,
+                    help="share of analyze / chat / OCR requests answered with 429")
+    ap.add_argument("--payload-scale", type=int, default=1,
+                    help="repeat the markdown / paragraphs / words of every result N times")
+    ap.add_argument("--cassette", help="answer from this recorded cassette first")
+    ap.add_argument("--latency-scale", type=float, default=1.0,
+                    help="multiplier on the cassette's recorded latencies (0 = instant)")
+    args = ap.parse_args()
+
+    server, state = serve(args.port, args.latency, args.llm_latency,
+                          latency_per_input=args.latency_per_input,
+                          cassette=args.cassette, latency_scale=args.latency_scale,
+                          jitter=args.jitter, throttle_rate=args.throttle_rate,
+                          payload_scale=args.payload_scale, ocr_latency=args.ocr_latency)
+    print(f"Stand-in listening on http://127.0.0.1:{server.server_port} "
+          f"({', '.join(f'{a}: {len(v)}' for a, v in state.fixtures.items())} fixtures)")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"  {state.stats}")
+    except KeyboardInterrupt:
+        server.shutdown()
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,8 @@ load_dotenv()
 # ─── Azure Content Understanding ───────────────────────────────────────
 CU_ENDPOINT = os.getenv("AZURE_CU_ENDPOINT", "")
 CU_API_VERSION = os.getenv("AZURE_CU_API_VERSION", "2025-11-01")
+# Documents packed into one analyze call by `analyze_batch` (1 = single submits)
+CU_BATCH_SIZE = int(os.getenv("AZURE_CU_BATCH_SIZE", "1"))
 
 # ─── Azure Blob Storage (used by Content Understanding for URL-based input) ──
 STORAGE_ACCOUNT = os.getenv("AZURE_STORAGE_ACCOUNT", "")
@@ -29,6 +31,37 @@ GPT_KEY = os.getenv("GPT_KEY", "")
 GPT4_ENDPOINT = os.getenv("GPT4_ENDPOINT", "")  # full chat/completions URL
 GPT4_KEY = os.getenv("GPT4_KEY", "")
 
+# ─── LLM description coalescing ────────────────────────────────────────
+# Identical describe requests (same image, prompt, deployment) share one call.
+# INTERCHANGEABLE: treat the GPT-4 and GPT-5 deployments as one for this step.
+LLM_DESCRIBE_INTERCHANGEABLE = os.getenv("LLM_DESCRIBE_INTERCHANGEABLE", "false").lower() in ("1", "true", "yes")
+LLM_DESCRIBE_RESULT_TTL = float(os.getenv("LLM_DESCRIBE_RESULT_TTL", "600"))  # seconds, 0 = in-flight only
+
+# ─── Deadlines & hedging ───────────────────────────────────────────────
+# Each document gets DOC_DEADLINE_S; each stage is also capped by its own budget.
+DOC_DEADLINE_S = float(os.getenv("DOC_DEADLINE_S", "300"))
+STAGE_BUDGETS_S = {
+    "cu_upload": 60,
+    "cu_submit": 30,
+    "cu_poll": 300,
+    "llm_describe": 60,
+    "di_analyze": 180,
+    "mistral_ocr": 120,
+    "mistral_summary": 60,
+}
+# Hedging: once a call passes its stage p95, fire one duplicate (LLM / OCR only)
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "true").lower() in ("1", "true", "yes")
+HEDGE_BUDGET_RATIO = float(os.getenv("HEDGE_BUDGET_RATIO", "0.1"))  # max extra requests / call
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))      # before p95 is trusted
+# Per-page-billed calls (Mistral OCR) are not hedged: a hedge doubles their cost
+HEDGE_PAGE_BILLED = os.getenv("HEDGE_PAGE_BILLED", "false").lower() in ("1", "true", "yes")
+
+# ─── Circuit breakers (per endpoint + analyzer) ────────────────────────
+# Trip after N consecutive deterministic failures (400/401/403/404, quota…),
+# then let one probe through every BREAKER_RESET_TIMEOUT_S seconds.
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "3"))
+BREAKER_RESET_TIMEOUT_S = float(os.getenv("BREAKER_RESET_TIMEOUT_S", "30"))
+
 # ─── Mistral Doc AI (Azure-hosted OCR) ─────────────────────────────────
 MISTRAL_DOC_AI_ENDPOINT = os.getenv("MISTRAL_DOC_AI_ENDPOINT", "")
 MISTRAL_DOC_AI_KEY = os.getenv("MISTRAL_DOC_AI_KEY", "")
@@ -50,3 +83,72 @@ DOC_INTEL_MODELS = {
 
 # ─── Supported file types ──────────────────────────────────────────────
 SUPPORTED_EXTENSIONS = [".jpg", ".jpeg", ".png", ".bmp", ".tiff", ".tif", ".pdf"]
+
+# ─── Pre-flight limits per service (checked locally before any upload) ──
+_IMAGE_AND_PDF = ["jpeg", "png", "bmp", "tiff", "pdf"]
+SERVICE_LIMITS = {
+    "cu": {"formats": _IMAGE_AND_PDF, "max_bytes": 200 * 1024**2, "max_pages": 300,
+           "min_px": 50, "max_px": 10000},
+    "di": {"formats": _IMAGE_AND_PDF, "max_bytes": 500 * 1024**2, "max_pages": 2000,
+           "min_px": 50, "max_px": 10000},
+    "mistral": {"formats": _IMAGE_AND_PDF, "max_bytes": 50 * 1024**2, "max_pages": 1000},
+}
+
+# ─── Batch scheduling ──────────────────────────────────────────────────
+# fifo (upload order) | sjf (shortest job first) | ljf (longest job first)
+SCHEDULER_POLICY = os.getenv("SCHEDULER_POLICY", "sjf")
+SCHEDULER_LANE_WORKERS = int(os.getenv("SCHEDULER_LANE_WORKERS", "2"))  # per pipeline lane
+
+# ─── Adaptive concurrency (AIMD per lane) ──────────────────────────────
+# Lanes start at SCHEDULER_LANE_WORKERS, add one slot per healthy window of
+# CONCURRENCY_WINDOW completions and multiply by CONCURRENCY_BACKOFF on a
+# 429 / timeout / latency above baseline × (1 + tolerance).
+ADAPTIVE_CONCURRENCY = os.getenv("ADAPTIVE_CONCURRENCY", "true").lower() in ("1", "true", "yes")
+CONCURRENCY_MIN = int(os.getenv("CONCURRENCY_MIN", "1"))
+CONCURRENCY_MAX = int(os.getenv("CONCURRENCY_MAX", "16"))
+CONCURRENCY_WINDOW = int(os.getenv("CONCURRENCY_WINDOW", "4"))
+CONCURRENCY_BACKOFF = float(os.getenv("CONCURRENCY_BACKOFF", "0.5"))
+CONCURRENCY_LATENCY_TOLERANCE = float(os.getenv("CONCURRENCY_LATENCY_TOLERANCE", "0.5"))
+
+# ─── Record / replay of HTTP exchanges (offline benchmarking) ──────────
+# off | record (append every exchange to CASSETTE_PATH) | replay (serve
+# them back, sleeping the recorded latency × CASSETTE_LATENCY_SCALE)
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "off").lower()
+CASSETTE_PATH = os.getenv("CASSETTE_PATH", "cassettes/session.jsonl")
+CASSETTE_LATENCY_SCALE = float(os.getenv("CASSETTE_LATENCY_SCALE", "1.0"))
+
+# ─── Full-text search over processed documents ─────────────────────────
+# SQLite FTS5 index the app adds every result to as it completes
+# (empty = no index). The batch runner keeps its own in <output>.
+SEARCH_INDEX_PATH = os.getenv("SEARCH_INDEX_PATH", "search/index.sqlite")
+
+# ─── Price table (USD, estimates — override with PRICE_TABLE_FILE) ─────
+# "pages": per page billed; "tokens_per_million": per 1M input / output
+# tokens, matched by model name or its longest prefix.
+PRICE_TABLE = {
+    "pages": {
+        "cu:standard": 0.005,           # CU content extraction
+        "cu:basic": 0.001,
+        "cu:minimal": 0.0005,
+        "di:prebuilt-read": 0.0015,
+        "di:prebuilt-layout": 0.01,
+        "di:prebuilt-invoice": 0.01,
+        "mistral:ocr": 0.003,
+    },
+    "tokens_per_million": {
+        "gpt-4.1": {"input": 2.00, "output": 8.00},
+        "gpt-4o": {"input": 2.50, "output": 10.00},
+        "gpt-5": {"input": 1.25, "output": 10.00},
+        "text-embedding-3-large": {"input": 0.13, "output": 0.0},
+        "contextualization": {"input": 1.00, "output": 0.0},
+        "mistral": {"input": 0.40, "output": 2.00},
+        "default": {"input": 2.00, "output": 8.00},
+    },
+}
+PRICE_TABLE_FILE = os.getenv("PRICE_TABLE_FILE", "")
+if PRICE_TABLE_FILE:
+    import json
+
+    with open(PRICE_TABLE_FILE, encoding="utf-8") as _f:
+        for _section, _prices in json.load(_f).items():
+            PRICE_TABLE.setdefault(_section, {}).update(_prices)
@@ -0,0 +1,284 @@
+"""
+🧩 Distributed batch mode — N worker processes on one or more machines.
+
+A single Python process is bound by the GIL (JSON parsing of ~200 KB
+responses, base64 encoding) well below the service quotas. Here a shared
+work queue (SQLite file, see `utils/work_queue.py`) hands out leased
+(document, analyzer) tasks to any number of worker processes. Workers
+heartbeat their leases; tasks of a dead worker are stolen once the lease
+expires. Each worker appends its metrics to its own shard file and the
+coordinator merges the shards into `all_metrics.json` and
+`model_comparison_summary.json`.
+
+Usage:
+    # 1. Coordinator: fill the queue (sizes from the local pre-flight)
+    python distributed_runner.py enqueue --input ../batch_1/batch1_1 \\
+        --queue /shared/queue.sqlite --analyzer prebuilt-invoice
+
+    # 2. On each machine: start workers (documents must be reachable at
+    #    the same path, results go to the shared --output folder)
+    python distributed_runner.py worker --queue /shared/queue.sqlite \\
+        --output /shared/results --processes 4
+
+    # 3. Coordinator: merge the worker shards
+    python distributed_runner.py merge --queue /shared/queue.sqlite --output /shared/results
+
+    # Local test against the stand-in endpoint:
+    python benchmarks/stand_in_server.py --port 8765 &
+    python distributed_runner.py worker ... --stand-in http://127.0.0.1:8765
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from config import CASSETTE_MODE, CASSETTE_PATH, PREBUILT_ANALYZERS
+from utils.cassette import install, install_from_config
+from utils.comparison import build_analyzer_summary
+from utils.job_journal import JobJournal
+from utils.preflight import inspect_document
+from utils.scheduler import estimate_cost
+from utils.work_queue import Heartbeat, WorkQueue
+
+SHARDS = "shards"
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# Coordinator
+# ═══════════════════════════════════════════════════════════════════════
+def enqueue(args):
+    from batch_runner import list_documents
+
+    queue = WorkQueue(args.queue)
+    if args.retry_failed:
+        print(f"↩️  {queue.requeue_failed()} failed tasks requeued")
+    added = 0
+    for path in list_documents(args.input, args.limit):
+        fname = os.path.basename(path)
+        with open(path, "rb") as f:
+            cost = estimate_cost(inspect_document(f.read(), fname))
+        for aid in args.analyzer or ["prebuilt-invoice"]:
+            # Shortest job first across the whole fleet
+            added += queue.enqueue(fname, aid, os.path.abspath(path), priority=cost)
+    print(f"📥 {added} tasks added | queue: {queue.counts()}")
+    queue.close()
+
+
+def merge(args):
+    """Merge worker shards (+ failed tasks) into the batch summary files."""
+    latest = {}
+    shard_dir = os.path.join(args.output, SHARDS)
+    shards = sorted(f for f in os.listdir(shard_dir) if f.endswith(".jsonl")) if os.path.isdir(shard_dir) else []
+    for name in shards:
+        with open(os.path.join(shard_dir, name), encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue        # torn last line of a killed worker
+                key = (entry["document"], entry["analyzer"])
+                # A stolen task may have been finished twice: keep the latest
+                if key not in latest or entry.get("_finished_at", 0) >= latest[key].get("_finished_at", 0):
+                    latest[key] = entry
+
+    queue = WorkQueue(args.queue)
+    for task in queue.tasks(["failed"]):
+        latest.setdefault((task["document"], task["analyzer"]), {
+            "document": task["document"],
+            "analyzer": task["analyzer"],
+            "error": task["error"],
+            "time_seconds": 0,
+        })
+    counts = queue.counts()
+    queue.close()
+
+    all_metrics = {}
+    for (_, analyzer), entry in sorted(latest.items()):
+        entry.pop("_finished_at", None)
+        entry.pop("_worker", None)
+        all_metrics.setdefault(analyzer, []).append(entry)
+
+    with open(os.path.join(args.output, "all_metrics.json"), "w", encoding="utf-8") as f:
+        json.dump(all_metrics, f, indent=2, ensure_ascii=False)
+    with open(os.path.join(args.output, "model_comparison_summary.json"), "w", encoding="utf-8") as f:
+        json.dump(build_analyzer_summary(all_metrics), f, indent=2, ensure_ascii=False)
+    print(f"🧩 Merged {len(shards)} shards → {sum(len(v) for v in all_metrics.values())} "
+          f"results | queue: {counts}")
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# Workers
+# ═══════════════════════════════════════════════════════════════════════
+def _make_service(stand_in: str | None):
+    if stand_in:
+        from services.stand_in import StandInService
+        return StandInService(stand_in)
+    from services.content_understanding import ContentUnderstandingService
+    return ContentUnderstandingService()
+
+
+def _resume(journal: JobJournal, task: dict, worker_id: str) -> bool:
+    """
+    Seed a fresh journal job from the queue row's checkpoint (a task stolen
+    from, or requeued by, another worker): poll its operation, or submit its
+    uploaded blob, instead of paying again. True if the job was seeded.
+    """
+    fname, analyzer = task["document"], task["analyzer"]
+    if journal.get(fname, analyzer)["state"] != "pending":
+        return False
+    if task.get("op_url"):
+        journal.record(fname, analyzer, "submitted", blob_url=task["blob_url"],
+                       op_url=task["op_url"], submitted_at=task["submitted_at"] or time.time())
+    elif task.get("blob_url"):
+        journal.record(fname, analyzer, "uploaded", blob_url=task["blob_url"])
+    else:
+        return False
+    print(f"  [{worker_id}] ⏯  resuming {fname}|{analyzer} "
+          f"from {'its operation' if task.get('op_url') else 'its upload'}")
+    return True
+
+
+def _run_task(runner, journal: JobJournal, queue: WorkQueue, task: dict, worker_id: str, hb: Heartbeat):
+    """Submit and finish one task, checkpointing its upload / operation on the queue row."""
+    fname, analyzer = task["document"], task["analyzer"]
+    runner.submit(task["path"], analyzer)
+    job = journal.get(fname, analyzer)
+    queue.checkpoint(task["id"], worker_id, job["blob_url"], job["op_url"], job["submitted_at"])
+    if not hb.lost:
+        runner.finish(task["path"], analyzer)
+        # A failed operation clears its op_url: the next holder must not resume it
+        job = journal.get(fname, analyzer)
+        queue.checkpoint(task["id"], worker_id, job["blob_url"], job["op_url"], job["submitted_at"])
+
+
+def run_worker(worker_id: str, args: dict):
+    """Lease → process → record loop of one worker process."""
+    from batch_runner import BatchRunner
+
+    logging.basicConfig(level=logging.WARNING, format=f"  [{worker_id}] %(message)s")
+    if CASSETTE_MODE == "record":
+        # One cassette per worker process: concurrent appends would interleave
+        root, ext = os.path.splitext(CASSETTE_PATH)
+        install("record", f"{root}.{worker_id}{ext}")
+    else:
+        install_from_config()   # CASSETTE_MODE=replay: offline workers
+    queue = WorkQueue(args["queue"], lease_s=args["lease"], max_attempts=args["max_attempts"])
+    shard_dir = os.path.join(args["output"], SHARDS)
+    os.makedirs(shard_dir, exist_ok=True)
+    # Per-worker journal: a restarted worker with the same id resumes its jobs
+    journal = JobJournal(os.path.join(shard_dir, f"{worker_id}.journal.sqlite"))
+    runner = BatchRunner(_make_service(args["stand_in"]), journal, args["output"])
+    shard = open(os.path.join(shard_dir, f"{worker_id}.jsonl"), "a", encoding="utf-8")
+    done = 0
+
+    while True:
+        task = queue.lease(worker_id)
+        if task is None:
+            if queue.outstanding() == 0:
+                break
+            time.sleep(args["idle"])       # others' leases may still expire
+            continue
+        fname, analyzer = task["document"], task["analyzer"]
+        if task["stolen_from"]:
+            print(f"  [{worker_id}] ♻️  stole {fname}|{analyzer} from {task['stolen_from']}")
+        journal.ensure(fname, analyzer)
+        if journal.get(fname, analyzer)["state"] == "failed":
+            journal.reset(fname, analyzer, "re-leased")
+        resumed = _resume(journal, task, worker_id)
+
+        with Heartbeat(queue, task["id"], worker_id) as hb:
+            _run_task(runner, journal, queue, task, worker_id, hb)
+            if resumed and not hb.lost and journal.get(fname, analyzer)["state"] == "failed":
+                # The previous holder's operation is gone or failed: start over
+                journal.reset(fname, analyzer, "resume failed")
+                _run_task(runner, journal, queue, task, worker_id, hb)
+
+        job = journal.get(fname, analyzer)
+        if job["state"] == "written":
+            # Only the lease holder reports: a worker whose task was stolen
+            # meanwhile leaves the shard row to the thief
+            if queue.complete(task["id"], worker_id):
+                entry = dict(job["metrics"], _worker=worker_id, _finished_at=time.time())
+                shard.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                shard.flush()
+                os.fsync(shard.fileno())
+                done += 1
+            else:
+                print(f"  [{worker_id}] ⚠️  lost the lease on {fname}|{analyzer} — not reported")
+        elif not hb.lost:
+            queue.fail(task["id"], worker_id, job["error"] or "unknown error",
+                       retry=not (job["error"] or "").startswith("pre-flight"))
+
+    shard.close()
+    journal.close()
+    queue.close()
+    print(f"  [{worker_id}] 🏁 {done} tasks done")
+
+
+def worker(args):
+    prefix = args.worker_id or socket.gethostname()
+    config = {
+        "queue": args.queue, "output": args.output, "stand_in": args.stand_in,
+        "lease": args.lease, "max_attempts": args.max_attempts, "idle": args.idle,
+    }
+    t0 = time.time()
+    procs = [
+        multiprocessing.Process(target=run_worker, args=(f"{prefix}-{i}", config))
+        for i in range(args.processes)
+    ]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    queue = WorkQueue(args.queue)
+    print(f"\n🎉 {args.processes} workers finished in {time.time() - t0:.1f}s | queue: {queue.counts()}")
+    queue.close()
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# CLI
+# ═══════════════════════════════════════════════════════════════════════
+def main():
+    ap = argparse.ArgumentParser(description="Distributed Content Understanding batch")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("enqueue", help="fill the shared work queue")
+    p.add_argument("--input", required=True, help="folder of documents to analyze")
+    p.add_argument("--queue", required=True, help="work queue file (shared by all workers)")
+    p.add_argument("--analyzer", action="append", choices=list(PREBUILT_ANALYZERS),
+                   help="analyzer id (repeatable, default: prebuilt-invoice)")
+    p.add_argument("--limit", type=int, help="only the first N documents")
+    p.add_argument("--retry-failed", action="store_true", help="requeue failed tasks")
+    p.set_defaults(func=enqueue)
+
+    p = sub.add_parser("worker", help="run worker processes until the queue is drained")
+    p.add_argument("--queue", required=True)
+    p.add_argument("--output", required=True, help="results folder (shared)")
+    p.add_argument("--processes", type=int, default=os.cpu_count() or 2)
+    p.add_argument("--worker-id", help="worker id prefix (default: hostname)")
+    p.add_argument("--lease", type=float, default=120.0, help="lease length in seconds")
+    p.add_argument("--max-attempts", type=int, default=3)
+    p.add_argument("--idle", type=float, default=2.0, help="seconds between polls when idle")
+    p.add_argument("--stand-in", help="local stand-in endpoint instead of Azure")
+    p.set_defaults(func=worker)
+
+    p = sub.add_parser("merge", help="merge worker shards into the summary files")
+    p.add_argument("--queue", required=True)
+    p.add_argument("--output", required=True)
+    p.set_defaults(func=merge)
+
+    args = ap.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
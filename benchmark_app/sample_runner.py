@@ -0,0 +1,253 @@
+"""
+🎲 Sampling runner — compare pipelines on a random sample, stop when settled.
+
+Running every pipeline on every document of a large corpus is slow and
+costly when the question is only "which one is faster / extracts more?".
+This draws documents at random, stratified by size (or type), runs the
+selected pipelines on each round of `--step` documents and recomputes
+confidence intervals on p50 / p90 latency and fields extracted — per
+pipeline and as paired differences (see `utils/sequential.py`). It stops as
+soon as every comparison is settled, or when a budget (documents, estimated
+cost, minutes) is hit.
+
+Outputs in --output:
+    model_comparison_summary.json   per pipeline, with sample size and intervals
+    sampling.json                   comparisons, verdicts, stop reason, every look
+    samples.jsonl                   per-document results (without raw JSON)
+
+Usage:
+    python sample_runner.py --input ../batch_1/batch1_1 --output out_sample \\
+        --pipeline cu --pipeline di --max-cost 5
+
+    # Local test against the stand-in endpoint:
+    python benchmarks/stand_in_server.py --port 8765 --jitter 0.3 &
+    python sample_runner.py ... --stand-in http://127.0.0.1:8765
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from config import ADAPTIVE_CONCURRENCY, PREBUILT_ANALYZERS, SCHEDULER_LANE_WORKERS
+from batch_runner import list_documents
+from utils.comparison import build_analyzer_summary
+from utils.preflight import inspect_document
+from utils.scheduler import BatchScheduler, estimate_cost
+from utils.sequential import METRICS, SequentialComparison, StratifiedSampler, size_strata
+
+PIPELINES = {
+    "cu": "🔵 Content Understanding",
+    "di": "🟢 DocIntel + GPT-5",
+    "mistral": "🟠 Mistral Doc AI",
+}
+
+
+def make_services(pipelines: list[str], stand_in: str | None,
+                  poll_interval: float | None = None) -> dict:
+    """pipeline → service with an `analyze(bytes, filename, …)` method."""
+    services = {}
+    for p in pipelines:
+        if stand_in:
+            from services.stand_in import StandInDocIntelService, StandInMistralService, StandInService
+            if p == "mistral":
+                services[p] = StandInMistralService(stand_in)
+            else:
+                cls = StandInService if p == "cu" else StandInDocIntelService
+                services[p] = cls(stand_in, poll_interval)
+        elif p == "cu":
+            from services.content_understanding import ContentUnderstandingService
+            services[p] = ContentUnderstandingService()
+        elif p == "di":
+            from services.doc_intel_gpt import DocIntelGPTService
+            services[p] = DocIntelGPTService()
+        else:
+            from services.mistral_vision import MistralVisionService
+            services[p] = MistralVisionService()
+    return services
+
+
+def to_metrics(res: dict, document: str, pipeline: str) -> dict:
+    """Pipeline result → batch-runner style metrics for `build_analyzer_summary`."""
+    if res.get("status") not in ("success", "partial"):
+        return {"document": document, "analyzer": pipeline,
+                "error": res.get("error") or "; ".join(res.get("errors") or []), "time_seconds": 0}
+    return {
+        "document": document,
+        "analyzer": pipeline,
+        "time_seconds": res.get("time_seconds", 0),
+        "num_fields": res.get("field_count", 0),
+        "num_fields_with_values": res.get("fields_with_values", 0),
+        "num_tables": res.get("tables_count", 0),
+        "markdown_len": len(res.get("markdown") or ""),
+        "avg_confidence": res.get("avg_confidence"),
+        "cost_usd": (res.get("usage") or {}).get("cost_usd"),
+    }
+
+
+def _fmt(ci: list[float]) -> str:
+    return f"[{ci[0]:.2f}, {ci[1]:.2f}]"
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# CLI
+# ═══════════════════════════════════════════════════════════════════════
+def main():
+    ap = argparse.ArgumentParser(description="Sequential sampling comparison of pipelines")
+    ap.add_argument("--input", required=True, help="folder of documents to sample from")
+    ap.add_argument("--output", required=True, help="results folder")
+    ap.add_argument("--pipeline", action="append", choices=list(PIPELINES),
+                    help="pipeline to compare (repeatable, default: cu and di)")
+    ap.add_argument("--analyzer", choices=list(PREBUILT_ANALYZERS), default="prebuilt-invoice",
+                    help="CU analyzer / DI model")
+    ap.add_argument("--stratify", choices=["size", "type", "none"], default="size",
+                    help="strata the sample keeps in proportion (size terciles or file type)")
+    ap.add_argument("--step", type=int, default=8, help="documents drawn per round (one look per round)")
+    ap.add_argument("--min-docs", type=int, default=10, help="documents before the first stopping check")
+    ap.add_argument("--min-pairs", type=int, default=10,
+                    help="documents both pipelines completed before a comparison gets a verdict")
+    ap.add_argument("--max-docs", type=int, help="document budget (default: the whole folder)")
+    ap.add_argument("--max-cost", type=float, help="estimated cost budget in USD")
+    ap.add_argument("--max-minutes", type=float, help="wall-clock budget")
+    ap.add_argument("--alpha", type=float, default=0.05, help="error rate (reported intervals are 1 − alpha)")
+    ap.add_argument("--latency-margin", type=float, default=0.5,
+                    help="latency difference (s) treated as equivalent")
+    ap.add_argument("--fields-margin", type=float, default=0.5,
+                    help="difference in fields extracted treated as equivalent")
+    ap.add_argument("--bootstrap", type=int, default=500, help="bootstrap resamples per interval")
+    ap.add_argument("--seed", type=int, help="sampling / bootstrap seed")
+    ap.add_argument("--workers", type=int, default=SCHEDULER_LANE_WORKERS, help="concurrent jobs per pipeline")
+    ap.add_argument("--stand-in", help="local stand-in endpoint instead of Azure")
+    ap.add_argument("--poll-interval", type=float, help="CU / DI polling interval against the stand-in")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.WARNING, format="  %(message)s")
+
+    pipelines = list(dict.fromkeys(args.pipeline or ["cu", "di"]))
+    if len(pipelines) < 2:
+        ap.error("compare at least two pipelines")
+    os.makedirs(args.output, exist_ok=True)
+
+    # ── Sampling frame: every document all selected pipelines accept ───
+    frame, rejected = [], 0
+    for path in list_documents(args.input):
+        with open(path, "rb") as f:
+            pre = inspect_document(f.read(), os.path.basename(path))
+        if all(pre["accepted_by"][p] for p in pipelines):
+            frame.append((path, pre))
+        else:
+            rejected += 1
+    if not frame:
+        raise SystemExit(f"❌ No documents in {args.input} accepted by {', '.join(pipelines)}")
+    if args.stratify == "size":
+        strata = size_strata([estimate_cost(pre) for _, pre in frame])
+    elif args.stratify == "type":
+        strata = [pre["format"] for _, pre in frame]
+    else:
+        strata = ["all"] * len(frame)
+    n_max = min(args.max_docs or len(frame), len(frame))
+    sampler = StratifiedSampler(frame, strata, seed=args.seed)
+    comparison = SequentialComparison(
+        pipelines, n_max, alpha=args.alpha, latency_margin=args.latency_margin,
+        fields_margin=args.fields_margin, min_docs=args.min_docs, min_pairs=args.min_pairs,
+        n_boot=args.bootstrap, seed=args.seed,
+    )
+    shares = ", ".join(f"{s} {share:.0%}" for s, share in sorted(sampler.shares.items()))
+    print(f"🎲 {len(frame)} documents ({rejected} rejected by pre-flight) | strata: {shares} | "
+          f"budget {n_max} documents"
+          + (f", ${args.max_cost}" if args.max_cost else "")
+          + (f", {args.max_minutes} min" if args.max_minutes else ""))
+
+    services = make_services(pipelines, args.stand_in, args.poll_interval)
+    all_metrics = {p: [] for p in pipelines}
+    spent_usd, t0, look, stop_reason = 0.0, time.time(), None, None
+    with open(os.path.join(args.output, "samples.jsonl"), "w", encoding="utf-8") as samples:
+        while stop_reason is None:
+            batch = sampler.draw(min(args.step, n_max - len(comparison.docs)))
+            scheduler = BatchScheduler(workers_per_lane=args.workers, adaptive=ADAPTIVE_CONCURRENCY,
+                                       scope="sample/")
+            futures = []
+            for i, (stratum, (path, pre)) in enumerate(batch):
+                with open(path, "rb") as f:
+                    data = f.read()
+                fname = os.path.basename(path)
+                for p in pipelines:
+                    args_ = (args.analyzer, pre["mime"]) if p != "mistral" else (pre["mime"],)
+                    kwargs = {"content_hash": pre["sha256"]} if p != "mistral" else {}
+                    futures.append((fname, stratum, p, scheduler.submit(
+                        p, len(comparison.docs) + i, fname, estimate_cost(pre),
+                        services[p].analyze, data, fname, *args_, **kwargs,
+                    )))
+            scheduler.start()
+            per_doc = {}
+            for fname, stratum, p, future in futures:
+                try:
+                    res = future.result()
+                except Exception as e:
+                    res = {"status": "error", "error": str(e), "time_seconds": 0}
+                per_doc.setdefault((fname, stratum), {})[p] = res
+                all_metrics[p].append(to_metrics(res, fname, p))
+                spent_usd += (res.get("usage") or {}).get("cost_usd") or 0
+            scheduler.shutdown()
+            for (fname, stratum), results in per_doc.items():
+                comparison.add(fname, stratum, results)
+                samples.write(json.dumps({
+                    "document": fname, "stratum": stratum,
+                    **{p: {k: v for k, v in to_metrics(r, fname, p).items() if k not in ("document", "analyzer")}
+                       for p, r in results.items()},
+                }, ensure_ascii=False) + "\n")
+            samples.flush()
+
+            look = comparison.look()
+            open_rows = [r for r in look["comparisons"] if r["verdict"] == "open"]
+            print(f"\n  n={look['sample_size']} | ${spent_usd:.2f} | {time.time() - t0:.0f}s | "
+                  f"{len(look['comparisons']) - len(open_rows)}/{len(look['comparisons'])} settled")
+            for r in look["comparisons"]:
+                if "ci" in r:
+                    print(f"    {r['comparison']:<16} {r['metric']:<17} {r['difference']:>+8.2f} "
+                          f"{_fmt(r['ci'])}  {r['verdict']}")
+
+            if look["settled"]:
+                stop_reason = "settled"
+            elif len(comparison.docs) >= n_max or not len(sampler):
+                stop_reason = "document budget" if len(comparison.docs) < len(frame) else "sample exhausted"
+            elif args.max_cost is not None and spent_usd >= args.max_cost:
+                stop_reason = "cost budget"
+            elif args.max_minutes is not None and time.time() - t0 >= args.max_minutes * 60:
+                stop_reason = "time budget"
+
+    # ── Summary files ───────────────────────────────────────────────────
+    summary = build_analyzer_summary(all_metrics)
+    for entry in summary:
+        stats = look["pipelines"][entry["analyzer"]]
+        entry["pipeline"] = PIPELINES[entry["analyzer"]]
+        entry["sample_size"] = stats["sample_size"]
+        for metric in METRICS:
+            if metric in stats:
+                entry[metric] = stats[metric]["value"]
+                entry[f"{metric}_ci"] = stats[metric]["ci"]
+    with open(os.path.join(args.output, "model_comparison_summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+    with open(os.path.join(args.output, "sampling.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "stop_reason": stop_reason,
+            "sample_size": look["sample_size"],
+            "population": len(frame),
+            "confidence": 1 - args.alpha,
+            "cost_usd": round(spent_usd, 4),
+            "elapsed_s": round(time.time() - t0, 1),
+            "strata": {s: {"share": round(share, 4), "drawn": sampler.drawn[s]}
+                       for s, share in sampler.shares.items()},
+            "comparisons": look["comparisons"],
+            "looks": comparison.looks,
+        }, f, indent=2, ensure_ascii=False)
+
+    print(f"\n🏁 Stopped ({stop_reason}) after {look['sample_size']}/{len(frame)} documents, "
+          f"${spent_usd:.2f} — results in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
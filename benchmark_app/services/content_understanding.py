@@ -4,29 +4,42 @@ Uses Azure AD (DefaultAzureCredential) + Blob Storage for URL-based input.
 After extraction, sends image to GPT-4 for a structured LLM summary.
 """
 
+import logging
 import os
+import re
 import time
 import json
-import base64
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from azure.identity import DefaultAzureCredential
 from azure.storage.blob import (
     BlobServiceClient,
     generate_blob_sas,
     BlobSasPermissions,
 )
 from config import CU_ENDPOINT, CU_API_VERSION, STORAGE_ACCOUNT, STORAGE_CONTAINER
-from config import GPT4_ENDPOINT
+from config import GPT4_ENDPOINT, DOC_DEADLINE_S, STAGE_BUDGETS_S, CU_BATCH_SIZE
+from services.llm_describe import describe
+from utils.cassette import azure_credential
+from utils.circuit_breaker import get_breaker
+from utils.deadline import Deadline
+from utils.usage import cu_usage, summarize_usage
+
+log = logging.getLogger(__name__)
+
+_INPUT_PATH_RE = re.compile(r"^input(\d+)$")
 
 
 class ContentUnderstandingService:
     """Wraps Azure Content Understanding REST API with blob-based input."""
 
+    # Seconds between operation polls
+    POLL_INTERVAL_S = 5.0
+
     def __init__(self):
         self.endpoint = CU_ENDPOINT
         self.api_version = CU_API_VERSION
-        self.credential = DefaultAzureCredential()
+        self.credential = azure_credential()
         self._token = self.credential.get_token(
             "https://cognitiveservices.azure.com/.default"
         )
@@ -50,9 +63,14 @@ class ContentUnderstandingService:
         return {"Authorization": f"Bearer {self._token.token}"}
 
     # ── Upload to blob and return SAS URL ───────────────────────────────
-    def _upload_blob(self, file_bytes: bytes, filename: str) -> str:
+    def _upload_blob(self, file_bytes: bytes, filename: str,
+                     deadline: Deadline | None = None) -> str:
+        stage = (deadline or Deadline(DOC_DEADLINE_S)).stage("cu_upload", STAGE_BUDGETS_S["cu_upload"])
         blob_client = self.blob_service.get_blob_client(STORAGE_CONTAINER, filename)
-        blob_client.upload_blob(file_bytes, overwrite=True)
+        get_breaker(f"https://{STORAGE_ACCOUNT}.blob.core.windows.net", "blob-upload").call(
+            blob_client.upload_blob,
+            file_bytes, overwrite=True, timeout=max(1, int(stage.timeout())),
+        )
         sas = generate_blob_sas(
             account_name=STORAGE_ACCOUNT,
             container_name=STORAGE_CONTAINER,
@@ -64,23 +82,45 @@ class ContentUnderstandingService:
         return f"https://{STORAGE_ACCOUNT}.blob.core.windows.net/{STORAGE_CONTAINER}/{filename}?{sas}"
 
     # ── Submit analysis ─────────────────────────────────────────────────
-    def _submit(self, file_bytes: bytes, filename: str, analyzer_id: str) -> str:
-        blob_url = self._upload_blob(file_bytes, filename)
+    def _submit(self, file_bytes: bytes, filename: str, analyzer_id: str,
+                deadline: Deadline | None = None) -> str:
+        # Don't pay for an upload if the analyzer is known to be failing
+        get_breaker(self.endpoint, analyzer_id).raise_if_open()
+        blob_url = self._upload_blob(file_bytes, filename, deadline)
+        return self._submit_url(blob_url, analyzer_id, deadline)
+
+    def _submit_url(self, blob_url: str | list[str], analyzer_id: str,
+                    deadline: Deadline | None = None) -> str:
+        """
+        Submit already-uploaded document(s) — one URL or a list packed into
+        the `inputs` array; returns the Operation-Location URL.
+        """
+        stage = (deadline or Deadline(DOC_DEADLINE_S)).stage("cu_submit", STAGE_BUDGETS_S["cu_submit"])
         url = f"{self.endpoint}/contentunderstanding/analyzers/{analyzer_id}:analyze?api-version={self.api_version}"
-        r = requests.post(
-            url,
-            headers={**self._auth(), "Content-Type": "application/json"},
-            json={"inputs": [{"url": blob_url}]},
-        )
-        if r.status_code != 202:
-            raise RuntimeError(f"{r.status_code}: {r.text[:500]}")
-        return r.headers["Operation-Location"]
+        urls = [blob_url] if isinstance(blob_url, str) else list(blob_url)
+
+        def _post():
+            r = requests.post(
+                url,
+                headers={**self._auth(), "Content-Type": "application/json"},
+                json={"inputs": [{"url": u} for u in urls]},
+                timeout=stage.timeout(),
+            )
+            if r.status_code != 202:
+                raise RuntimeError(f"{r.status_code}: {r.text[:500]}")
+            return r.headers["Operation-Location"]
+
+        # Trips on repeated 400/401/quota errors so the rest of a batch fails fast
+        return get_breaker(self.endpoint, analyzer_id).call(_post)
 
     # ── Poll for result ─────────────────────────────────────────────────
-    def _poll(self, op_url: str, timeout: int = 300) -> dict:
-        for i in range(timeout // 5):
-            time.sleep(5)
-            r = requests.get(op_url, headers=self._auth())
+    def _poll(self, op_url: str, timeout: int = 300,
+              deadline: Deadline | None = None) -> dict:
+        """Poll until done; gives up when `deadline` (or `timeout` s) runs out."""
+        stage = (deadline or Deadline(timeout)).stage("cu_poll", STAGE_BUDGETS_S["cu_poll"])
+        while True:
+            time.sleep(min(self.POLL_INTERVAL_S, stage.remaining()))
+            r = requests.get(op_url, headers=self._auth(), timeout=stage.timeout(30))
             r.raise_for_status()
             res = r.json()
             status = res.get("status", "")
@@ -88,59 +128,31 @@ class ContentUnderstandingService:
                 return res
             if status in ("Failed", "Canceled"):
                 raise RuntimeError(json.dumps(res.get("error", res), indent=2))
-        raise TimeoutError("Content Understanding timed out")
 
     # ── GPT-4 LLM summary (vision) ─────────────────────────────────────
-    def _gpt4_describe(self, file_bytes: bytes, filename: str, mime: str) -> str:
-        """Send the document image to GPT-4 Vision for a structured summary."""
-        b64 = base64.b64encode(file_bytes).decode("utf-8")
-        body = {
-            "messages": [
-                {
-                    "role": "system",
-                    "content": (
-                        "You are an expert document analysis assistant. "
-                        "You analyse scanned documents (invoices, quotes, purchase orders, etc.) "
-                        "and provide a concise structured description."
-                    ),
-                },
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": (
-                                f'Analyse this document image "{filename}". '
-                                "Provide: document type, issuer, recipient, total amount, "
-                                "date, and any key information. Be concise (3-5 sentences)."
-                            ),
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:{mime};base64,{b64}",
-                                "detail": "high",
-                            },
-                        },
-                    ],
-                },
-            ],
-            "max_tokens": 400,
-            "temperature": 0.3,
-        }
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self._auth()['Authorization'].split(' ')[1]}",
-        }
-        r = requests.post(GPT4_ENDPOINT, headers=headers, json=body, timeout=120)
-        r.raise_for_status()
-        return r.json()["choices"][0]["message"]["content"].strip()
+    def _gpt4_describe(self, file_bytes: bytes, filename: str, mime: str,
+                       deadline: Deadline | None = None,
+                       content_hash: str | None = None) -> tuple[str, dict]:
+        """
+        Send the document image to GPT-4 Vision for a structured summary.
+        Returns (description, usage stage record).
+        """
+        return describe(
+            file_bytes, filename, mime,
+            endpoint=GPT4_ENDPOINT,
+            bearer_token=self._auth()["Authorization"].split(" ")[1],
+            deadline=deadline,
+            content_hash=content_hash,
+        )
 
     # ── Public API ──────────────────────────────────────────────────────
     def analyze(self, file_bytes: bytes, filename: str, analyzer_id: str,
-                mime: str = "image/jpeg") -> dict:
+                mime: str = "image/jpeg", deadline: Deadline | None = None,
+                content_hash: str | None = None) -> dict:
         """
         Full pipeline: upload → submit → poll → return result dict.
+        `deadline` bounds the whole document (default: DOC_DEADLINE_S);
+        `content_hash` is the pre-flight sha256, reused as the LLM cache key.
         Returns:
             {
                 "status": "success" | "error",
@@ -154,45 +166,11 @@ class ContentUnderstandingService:
             }
         """
         t0 = time.time()
+        deadline = deadline or Deadline(DOC_DEADLINE_S)
         try:
-            op_url = self._submit(file_bytes, filename, analyzer_id)
-            raw = self._poll(op_url)
-
-            contents = raw.get("result", {}).get("contents", [])
-            block = contents[0] if contents else {}
-            fields = block.get("fields", {})
-            md = block.get("markdown", "")
-
-            # Flatten field values
-            flat = self._extract_field_values(fields)
-
-            # Compute average confidence
-            confs = []
-            self._collect_confidences(fields, confs)
-            avg_conf = round(sum(confs) / len(confs), 4) if confs else None
-
-            # GPT-4 LLM summary
-            gpt_description = ""
-            gpt_errors = []
-            try:
-                gpt_description = self._gpt4_describe(file_bytes, filename, mime)
-            except Exception as e:
-                gpt_errors.append(f"GPT-4 Summary: {e}")
-
-            dt = round(time.time() - t0, 2)
-            return {
-                "status": "success" if not gpt_errors else "partial",
-                "time_seconds": dt,
-                "raw_result": raw,
-                "markdown": md,
-                "fields": flat,
-                "field_count": len(fields),
-                "fields_with_values": len(flat),
-                "tables_count": len(block.get("tables", [])),
-                "avg_confidence": avg_conf,
-                "gpt_description": gpt_description,
-                "errors": gpt_errors if gpt_errors else None,
-            }
+            op_url = self._submit(file_bytes, filename, analyzer_id, deadline)
+            raw = self._poll(op_url, deadline=deadline)
+            return self._build_result(raw, file_bytes, filename, mime, deadline, content_hash, t0)
         except Exception as e:
             return {
                 "status": "error",
@@ -200,6 +178,137 @@ class ContentUnderstandingService:
                 "error": str(e),
             }
 
+    def analyze_batch(self, documents: list[dict], analyzer_id: str,
+                      batch_size: int = CU_BATCH_SIZE,
+                      deadline: Deadline | None = None) -> list[dict]:
+        """
+        Analyze several documents with one submit + one poll per group of
+        `batch_size` (the analyze request takes an `inputs` list).
+
+        `documents` are {"bytes", "filename", "mime", "content_hash"?} dicts;
+        returns one result dict per document, in order, in the same shape as
+        `analyze`. Documents missing from a batch result — or a whole batch
+        whose submit / poll failed — fall back to single submits.
+        """
+        results = [None] * len(documents)
+        for start in range(0, len(documents), max(1, batch_size)):
+            group = list(range(start, min(start + max(1, batch_size), len(documents))))
+            t0 = time.time()
+            group_deadline = deadline or Deadline(DOC_DEADLINE_S)
+            try:
+                raws = self._analyze_group([documents[i] for i in group], analyzer_id, group_deadline)
+            except Exception as e:
+                log.warning("batched submit of %d documents failed (%s); falling back to singles",
+                            len(group), str(e)[:200])
+                raws = [None] * len(group)
+
+            def finish(doc: dict, raw: dict | None, share: float = 1 / len(group), t0: float = t0) -> dict:
+                # Past the shared poll each document has its own budget, so a
+                # slow describe / fallback never eats into its neighbours'
+                if raw is None:
+                    return self.analyze(
+                        doc["bytes"], doc["filename"], analyzer_id, doc.get("mime", "image/jpeg"),
+                        deadline=deadline, content_hash=doc.get("content_hash"),
+                    )
+                try:
+                    return self._build_result(
+                        raw, doc["bytes"], doc["filename"], doc.get("mime", "image/jpeg"),
+                        deadline or Deadline(DOC_DEADLINE_S), doc.get("content_hash"), t0,
+                        usage_share=share,
+                    )
+                except Exception as e:
+                    return {"status": "error", "time_seconds": round(time.time() - t0, 2),
+                            "error": str(e)}
+
+            with ThreadPoolExecutor(max_workers=len(group)) as pool:
+                done = pool.map(finish, [documents[i] for i in group], raws)
+                for i, res in zip(group, done):
+                    results[i] = res
+        return results
+
+    def _analyze_group(self, docs: list[dict], analyzer_id: str, deadline: Deadline) -> list:
+        """Upload + one multi-input submit + one poll; per-document raw results (None = missing)."""
+        get_breaker(self.endpoint, analyzer_id).raise_if_open()
+        with ThreadPoolExecutor(max_workers=len(docs)) as pool:
+            blob_urls = list(pool.map(
+                lambda d: self._upload_blob(d["bytes"], d["filename"], deadline), docs
+            ))
+        op_url = self._submit_url(blob_urls, analyzer_id, deadline)
+        raw = self._poll(op_url, deadline=deadline)
+        return self.split_batch_result(raw, len(docs))
+
+    @staticmethod
+    def split_batch_result(raw: dict, n_inputs: int) -> list:
+        """
+        Fan a multi-input analyze result out to one single-input-shaped raw
+        result per input, matched by `contents[].path` ("input1", …) or by
+        position. Inputs without any content are None.
+        """
+        contents = raw.get("result", {}).get("contents", [])
+        per_input = [[] for _ in range(n_inputs)]
+        for pos, block in enumerate(contents):
+            m = _INPUT_PATH_RE.match(block.get("path") or "")
+            idx = int(m.group(1)) - 1 if m else (pos if len(contents) == n_inputs else None)
+            if idx is not None and 0 <= idx < n_inputs:
+                per_input[idx].append(block)
+        split = []
+        for blocks in per_input:
+            if not blocks:
+                split.append(None)
+                continue
+            single = dict(raw)
+            single["result"] = dict(raw.get("result", {}), contents=blocks)
+            split.append(single)
+        return split
+
+    def _build_result(self, raw: dict, file_bytes: bytes, filename: str, mime: str,
+                      deadline: Deadline, content_hash: str | None, t0: float,
+                      usage_share: float = 1.0) -> dict:
+        """
+        Result dict for one document's raw analyze result (+ GPT-4 summary).
+        `usage_share` is this document's part of a multi-input call's usage.
+        """
+        contents = raw.get("result", {}).get("contents", [])
+        block = contents[0] if contents else {}
+        fields = block.get("fields", {})
+        md = block.get("markdown", "")
+
+        # Flatten field values
+        flat = self._extract_field_values(fields)
+
+        # Compute average confidence
+        confs = []
+        self._collect_confidences(fields, confs)
+        avg_conf = round(sum(confs) / len(confs), 4) if confs else None
+
+        # GPT-4 LLM summary
+        gpt_description = ""
+        gpt_errors = []
+        usage = cu_usage(raw, usage_share)
+        try:
+            gpt_description, describe_usage = self._gpt4_describe(
+                file_bytes, filename, mime, deadline, content_hash
+            )
+            usage.append(describe_usage)
+        except Exception as e:
+            gpt_errors.append(f"GPT-4 Summary: {e}")
+
+        dt = round(time.time() - t0, 2)
+        return {
+            "status": "success" if not gpt_errors else "partial",
+            "time_seconds": dt,
+            "raw_result": raw,
+            "markdown": md,
+            "fields": flat,
+            "field_count": len(fields),
+            "fields_with_values": len(flat),
+            "tables_count": len(block.get("tables", [])),
+            "avg_confidence": avg_conf,
+            "gpt_description": gpt_description,
+            "usage": summarize_usage(usage),
+            "errors": gpt_errors if gpt_errors else None,
+        }
+
     # ── Helpers ──────────────────────────────────────────────────────────
     @staticmethod
     def _extract_field_values(fields_dict: dict) -> dict:
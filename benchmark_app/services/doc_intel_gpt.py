@@ -8,16 +8,20 @@ Auth: Doc Intelligence uses API key; GPT-5 uses DefaultAzureCredential
 
 import io
 import time
-import base64
-import requests
-from azure.identity import DefaultAzureCredential
 from azure.ai.documentintelligence import DocumentIntelligenceClient
 from azure.core.credentials import AzureKeyCredential
 from config import (
     DOC_INTEL_ENDPOINT,
     DOC_INTEL_KEY,
     GPT_ENDPOINT,
+    DOC_DEADLINE_S,
+    STAGE_BUDGETS_S,
 )
+from services.llm_describe import describe
+from utils.cassette import azure_credential
+from utils.circuit_breaker import get_breaker
+from utils.deadline import Deadline, DeadlineExceeded
+from utils.usage import page_usage, summarize_usage
 
 
 class DocIntelGPTService:
@@ -29,7 +33,7 @@ class DocIntelGPTService:
             credential=AzureKeyCredential(DOC_INTEL_KEY),
         )
         # Entra ID auth for GPT-5 (key auth disabled on this resource)
-        self.credential = DefaultAzureCredential()
+        self.credential = azure_credential()
         self._token = self.credential.get_token(
             "https://cognitiveservices.azure.com/.default"
         )
@@ -42,49 +46,16 @@ class DocIntelGPTService:
         return self._token.token
 
     # ── GPT-5-chat Vision call ──────────────────────────────────────────
-    def _gpt_describe(self, file_bytes: bytes, filename: str, mime: str) -> str:
-        b64 = base64.b64encode(file_bytes).decode("utf-8")
-        body = {
-            "messages": [
-                {
-                    "role": "system",
-                    "content": (
-                        "You are an expert document analysis assistant. "
-                        "You analyse scanned documents (invoices, quotes, purchase orders, etc.) "
-                        "and provide a concise structured description."
-                    ),
-                },
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": (
-                                f'Analyse this document image "{filename}". '
-                                "Provide: document type, issuer, recipient, total amount, "
-                                "date, and any key information. Be concise (3-5 sentences)."
-                            ),
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:{mime};base64,{b64}",
-                                "detail": "high",
-                            },
-                        },
-                    ],
-                },
-            ],
-            "max_tokens": 400,
-            "temperature": 0.3,
-        }
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self._get_bearer_token()}",
-        }
-        r = requests.post(GPT_ENDPOINT, headers=headers, json=body, timeout=120)
-        r.raise_for_status()
-        return r.json()["choices"][0]["message"]["content"].strip()
+    def _gpt_describe(self, file_bytes: bytes, filename: str, mime: str,
+                      deadline: Deadline | None = None,
+                      content_hash: str | None = None) -> tuple[str, dict]:
+        return describe(
+            file_bytes, filename, mime,
+            endpoint=GPT_ENDPOINT,
+            bearer_token=self._get_bearer_token(),
+            deadline=deadline,
+            content_hash=content_hash,
+        )
 
     # ── Public API ──────────────────────────────────────────────────────
     def analyze(
@@ -93,13 +64,18 @@ class DocIntelGPTService:
         filename: str,
         model_id: str = "prebuilt-invoice",
         mime: str = "image/jpeg",
+        deadline: Deadline | None = None,
+        content_hash: str | None = None,
     ) -> dict:
         """
         Run Doc Intelligence + GPT-5 Vision on a document.
+        `deadline` bounds the whole document (default: DOC_DEADLINE_S);
+        `content_hash` is the pre-flight sha256, reused as the LLM cache key.
         Returns a result dict similar to Content Understanding's output.
         """
         t0 = time.time()
         errors = []
+        deadline = deadline or Deadline(DOC_DEADLINE_S)
 
         # ── Step 1: Document Intelligence ───────────────────────────────
         di_result = {}
@@ -107,16 +83,27 @@ class DocIntelGPTService:
         di_markdown = ""
         di_tables = 0
         di_confidence = None
+        usage = []
         try:
-            poller = self.di_client.begin_analyze_document(
-                model_id,
-                body=io.BytesIO(file_bytes),
-                content_type="application/octet-stream",
-            )
-            result = poller.result()
+            stage = deadline.stage("di_analyze", STAGE_BUDGETS_S["di_analyze"])
+
+            def _analyze():
+                poller = self.di_client.begin_analyze_document(
+                    model_id,
+                    body=io.BytesIO(file_bytes),
+                    content_type="application/octet-stream",
+                    read_timeout=stage.timeout(),
+                )
+                result = poller.result(timeout=stage.timeout())
+                if not poller.done():
+                    raise DeadlineExceeded(f"di_analyze deadline ({stage.budget_s}s) exceeded")
+                return result
+
+            result = get_breaker(DOC_INTEL_ENDPOINT, model_id).call(_analyze)
 
             # Extract markdown / content
             di_markdown = result.content or ""
+            usage.append(page_usage("di_analyze", f"di:{model_id}", len(result.pages or [])))
 
             # Extract fields
             if result.documents:
@@ -155,7 +142,10 @@ class DocIntelGPTService:
         # ── Step 2: GPT-5-chat Vision ───────────────────────────────────
         gpt_description = ""
         try:
-            gpt_description = self._gpt_describe(file_bytes, filename, mime)
+            gpt_description, describe_usage = self._gpt_describe(
+                file_bytes, filename, mime, deadline, content_hash
+            )
+            usage.append(describe_usage)
         except Exception as e:
             errors.append(f"GPT Vision: {e}")
 
@@ -170,6 +160,7 @@ class DocIntelGPTService:
             "tables_count": di_tables,
             "avg_confidence": di_confidence,
             "gpt_description": gpt_description,
+            "usage": summarize_usage(usage),
             "errors": errors if errors else None,
             "di_detail": di_result,
         }
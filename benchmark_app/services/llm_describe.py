@@ -0,0 +1,130 @@
+"""
+Shared GPT Vision "describe this document" step.
+
+Content Understanding (GPT-4) and Document Intelligence (GPT-5) both send the
+document image with the same system / user prompt. Requests are coalesced
+through a process-wide single-flight group keyed by
+(image hash, request body, deployment): identical concurrent requests — and
+duplicates within `LLM_DESCRIBE_RESULT_TTL` seconds — share one LLM call.
+The prompt does not name the file, so a renamed copy of an image sends the
+same request and shares its description.
+With `LLM_DESCRIBE_INTERCHANGEABLE` the GPT-4 and GPT-5 deployments share a
+key, so whichever pipeline asks first pays for the description.
+"""
+
+import hashlib
+import json
+import requests
+from config import LLM_DESCRIBE_INTERCHANGEABLE, LLM_DESCRIBE_RESULT_TTL
+from config import DOC_DEADLINE_S, STAGE_BUDGETS_S
+from utils.circuit_breaker import get_breaker
+from utils.deadline import Deadline
+from utils.hedging import hedged_call
+from utils.preflight import image_size
+from utils.singleflight import SingleFlight
+from utils.streaming_body import StreamingJSONBody, data_url
+from utils.usage import chat_usage, image_tokens
+
+SYSTEM_PROMPT = (
+    "You are an expert document analysis assistant. "
+    "You analyse scanned documents (invoices, quotes, purchase orders, etc.) "
+    "and provide a concise structured description."
+)
+
+_flight = SingleFlight(result_ttl=LLM_DESCRIBE_RESULT_TTL)
+
+
+def build_describe_body(mime: str) -> dict:
+    """Chat-completions body with a placeholder data URL for the image."""
+    return {
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": (
+                            "Analyse this document image. "
+                            "Provide: document type, issuer, recipient, total amount, "
+                            "date, and any key information. Be concise (3-5 sentences)."
+                        ),
+                    },
+                    {
+                        "type": "image_url",
+                        "image_url": {"url": data_url(mime), "detail": "high"},
+                    },
+                ],
+            },
+        ],
+        "max_tokens": 400,
+        "temperature": 0.3,
+    }
+
+
+def describe_key(file_bytes: bytes, body: dict, deployment: str,
+                 content_hash: str | None = None) -> tuple:
+    """
+    Coalescing key: (image hash, prompt + parameters hash, deployment) — the
+    hash of the body actually sent. `content_hash` is the pre-flight sha256,
+    when already computed.
+    """
+    image_hash = content_hash or hashlib.sha256(file_bytes).hexdigest()
+    body_hash = hashlib.sha256(
+        json.dumps(body, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+    if LLM_DESCRIBE_INTERCHANGEABLE:
+        deployment = "vision-describe"
+    return image_hash, body_hash, deployment
+
+
+def describe(file_bytes: bytes, filename: str, mime: str,
+             endpoint: str, bearer_token: str,
+             deadline: Deadline | None = None,
+             content_hash: str | None = None) -> tuple[str, dict]:
+    """
+    Describe a document with a GPT Vision deployment, sharing the call with
+    any identical in-flight request. The call is bounded by the
+    "llm_describe" stage budget and hedged past its observed p95.
+
+    Returns (description, usage stage record); the record is marked
+    ``shared`` when the answer came from another caller's request.
+    """
+    body = build_describe_body(mime)
+    stage = (deadline or Deadline(DOC_DEADLINE_S)).stage(
+        "llm_describe", STAGE_BUDGETS_S["llm_describe"]
+    )
+
+    def _post(timeout):
+        r = requests.post(
+            endpoint,
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {bearer_token}",
+            },
+            data=StreamingJSONBody(body, file_bytes),
+            timeout=timeout,
+        )
+        r.raise_for_status()
+        response = r.json()
+        return (
+            response["choices"][0]["message"]["content"].strip(),
+            chat_usage(response, "llm_describe", endpoint,
+                       image_tokens(*image_size(file_bytes))),
+        )
+
+    def _call():
+        return get_breaker(endpoint, "vision-describe").call(
+            hedged_call, f"llm_describe:{endpoint}", stage, _post
+        )
+
+    # Waiting on another caller's request is bounded by this call's own stage budget
+    (description, usage), shared = _flight.do(
+        describe_key(file_bytes, body, endpoint, content_hash), _call, deadline=stage
+    )
+    return description, dict(usage, shared=shared)
+
+
+def coalescing_stats() -> dict:
+    """{"executed": int, "shared": int} since process start."""
+    return dict(_flight.stats)
@@ -6,12 +6,20 @@ Auth: DefaultAzureCredential (key auth disabled on this resource).
 """
 
 import time
-import base64
-import re
 import requests
 from urllib.parse import urlparse
-from azure.identity import DefaultAzureCredential
 from config import MISTRAL_DOC_AI_ENDPOINT, MISTRAL_DOC_AI_KEY, MISTRAL_DOC_AI_MODEL
+from config import DOC_DEADLINE_S, STAGE_BUDGETS_S
+from utils.cassette import azure_credential
+from utils.circuit_breaker import get_breaker
+from utils.deadline import Deadline
+from utils.hedging import hedged_call
+from utils.markdown_parser import parse_markdown, select_sections
+from utils.streaming_body import StreamingJSONBody, data_url
+from utils.usage import chat_usage, page_usage, summarize_usage
+
+# Max characters of OCR text sent to the summarizer
+SUMMARY_CHAR_BUDGET = 4000
 
 
 class MistralVisionService:
@@ -29,7 +37,7 @@ class MistralVisionService:
         )
 
         # Entra ID auth (key auth is disabled on this resource)
-        self.credential = DefaultAzureCredential()
+        self.credential = azure_credential()
         self._token = self.credential.get_token(
             "https://cognitiveservices.azure.com/.default"
         )
@@ -42,8 +50,13 @@ class MistralVisionService:
             )
         return self._token.token
 
-    def _mistral_summarize(self, ocr_text: str, filename: str) -> str:
-        """Send OCR-extracted text back to Mistral Doc AI (chat) for a summary."""
+    def _mistral_summarize(self, ocr_text: str, filename: str,
+                           deadline: Deadline | None = None) -> tuple[str, dict]:
+        """
+        Send OCR-extracted text back to Mistral Doc AI (chat) for a summary.
+        `ocr_text` should already be condensed with `select_sections`.
+        Returns (summary, usage stage record).
+        """
         body = {
             "model": self.model,
             "messages": [
@@ -59,7 +72,7 @@ class MistralVisionService:
                     "role": "user",
                     "content": (
                         f'Here is the OCR text extracted from "{filename}":\n\n'
-                        f"{ocr_text[:4000]}\n\n"
+                        f"{ocr_text[:SUMMARY_CHAR_BUDGET]}\n\n"
                         "Provide: document type, issuer, recipient, total amount, "
                         "date, and any key information. Be concise (3-5 sentences)."
                     ),
@@ -72,31 +85,48 @@ class MistralVisionService:
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self._get_bearer_token()}",
         }
-        r = requests.post(
-            self.chat_endpoint, headers=headers, json=body, timeout=120
+        stage = (deadline or Deadline(DOC_DEADLINE_S)).stage(
+            "mistral_summary", STAGE_BUDGETS_S["mistral_summary"]
+        )
+
+        def _post(timeout):
+            r = requests.post(
+                self.chat_endpoint, headers=headers, json=body, timeout=timeout
+            )
+            r.raise_for_status()
+            response = r.json()
+            return (
+                response["choices"][0]["message"]["content"].strip(),
+                chat_usage(dict(response, model=response.get("model") or self.model),
+                           "mistral_summary"),
+            )
+
+        return get_breaker(self.chat_endpoint, self.model).call(
+            hedged_call, "mistral_summary", stage, _post
         )
-        r.raise_for_status()
-        return r.json()["choices"][0]["message"]["content"].strip()
 
     def analyze(
         self,
         file_bytes: bytes,
         filename: str,
         mime: str = "image/jpeg",
+        deadline: Deadline | None = None,
     ) -> dict:
         """
         Send the document to Mistral Doc AI OCR, then GPT-5 for summary.
+        `deadline` bounds the whole document (default: DOC_DEADLINE_S).
         Returns a result dict consistent with the other services.
         """
         t0 = time.time()
+        deadline = deadline or Deadline(DOC_DEADLINE_S)
         errors = []
         full_markdown = ""
         fields = {}
+        structure = None
+        usage = []
 
         # ── Step 1: Mistral OCR ─────────────────────────────────────────
         try:
-            b64 = base64.b64encode(file_bytes).decode("utf-8")
-
             headers = {
                 "Content-Type": "application/json",
                 "Authorization": f"Bearer {self._get_bearer_token()}",
@@ -106,23 +136,41 @@ class MistralVisionService:
                 "model": self.model,
                 "document": {
                     "type": "document_url",
-                    "document_url": f"data:{mime};base64,{b64}",
+                    "document_url": data_url(mime),
                 },
             }
 
-            r = requests.post(
-                self.ocr_endpoint, headers=headers, json=body, timeout=120
+            # Base64 is encoded on the fly while the body is being sent
+            def _post(timeout):
+                r = requests.post(
+                    self.ocr_endpoint,
+                    headers=headers,
+                    data=StreamingJSONBody(body, file_bytes),
+                    timeout=timeout,
+                )
+                r.raise_for_status()
+                return r.json()
+
+            result = get_breaker(self.ocr_endpoint, self.model).call(
+                hedged_call,
+                "mistral_ocr",
+                deadline.stage("mistral_ocr", STAGE_BUDGETS_S["mistral_ocr"]),
+                _post,
+                billed_per_page=True,
             )
-            r.raise_for_status()
-            result = r.json()
 
             # Extract markdown from pages
             pages = result.get("pages", [])
+            usage.append(page_usage(
+                "mistral_ocr", "mistral:ocr",
+                (result.get("usage_info") or {}).get("pages_processed", len(pages)),
+            ))
             markdown_parts = [p.get("markdown", "") for p in pages]
             full_markdown = "\n\n".join(markdown_parts)
 
-            # Parse structured fields from the OCR markdown
-            fields = self._parse_fields(full_markdown)
+            # One pass over the pages: fields, tables, headings, sections
+            structure = parse_markdown(markdown_parts)
+            fields = structure["fields"]
 
         except Exception as e:
             errors.append(f"Mistral OCR: {e}")
@@ -131,7 +179,10 @@ class MistralVisionService:
         gpt_description = ""
         if full_markdown:
             try:
-                gpt_description = self._mistral_summarize(full_markdown, filename)
+                gpt_description, summary_usage = self._mistral_summarize(
+                    select_sections(structure, SUMMARY_CHAR_BUDGET), filename, deadline
+                )
+                usage.append(summary_usage)
             except Exception as e:
                 errors.append(f"Mistral Summary: {e}")
 
@@ -143,9 +194,10 @@ class MistralVisionService:
             "fields": fields,
             "field_count": len(fields),
             "fields_with_values": len(fields),
-            "tables_count": full_markdown.count("<table>") + full_markdown.count("| "),
+            "tables_count": len(structure["tables"]) if structure else 0,
             "avg_confidence": None,
             "gpt_description": gpt_description,
+            "usage": summarize_usage(usage),
             "errors": errors if errors else None,
         }
 
@@ -154,14 +206,4 @@ class MistralVisionService:
         """
         Best-effort extraction of key-value pairs from OCR markdown.
         """
-        fields = {}
-        pattern = re.compile(
-            r"(?:^|\n)\s*[-•*]*\s*\*{0,2}([A-Za-z /]+?)\*{0,2}\s*:\s*(.+)",
-            re.MULTILINE,
-        )
-        for m in pattern.finditer(text):
-            key = m.group(1).strip()
-            val = m.group(2).strip()
-            if key and val and len(key) < 40:
-                fields[key] = val
-        return fields
+        return parse_markdown(text)["fields"]
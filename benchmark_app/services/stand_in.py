@@ -0,0 +1,101 @@
+"""
+The three pipeline services pointed at a local stand-in endpoint.
+
+Same submit / poll / describe code paths as the real services, but without
+Azure AD or Blob Storage: documents are PUT to the stand-in's
+``/blob/<name>`` route, Document Intelligence goes through the SDK client
+with a placeholder key, and descriptions / summaries / OCR go to the
+stand-in's ``…/chat/completions`` and ``…/ocr`` routes. Used to exercise the
+distributed batch mode and the load sweeps on one machine (see
+``benchmarks/stand_in_server.py``).
+"""
+
+import time
+from types import SimpleNamespace
+from urllib.parse import quote
+
+import requests
+from azure.ai.documentintelligence import DocumentIntelligenceClient
+from azure.core.credentials import AzureKeyCredential
+from config import CU_API_VERSION, DOC_DEADLINE_S, MISTRAL_DOC_AI_MODEL, STAGE_BUDGETS_S
+from services.content_understanding import ContentUnderstandingService
+from services.doc_intel_gpt import DocIntelGPTService
+from services.llm_describe import describe
+from services.mistral_vision import MistralVisionService
+from utils.deadline import Deadline
+
+_STAND_IN_TOKEN = SimpleNamespace(token="stand-in", expires_on=float("inf"))
+
+
+class StandInService(ContentUnderstandingService):
+    """`ContentUnderstandingService` against a local stand-in endpoint."""
+
+    def __init__(self, endpoint: str, poll_interval: float | None = None):
+        self.endpoint = endpoint.rstrip("/")
+        self.api_version = CU_API_VERSION
+        self._token = _STAND_IN_TOKEN
+        if poll_interval is not None:
+            self.POLL_INTERVAL_S = poll_interval
+
+    def _auth(self):
+        return {"Authorization": f"Bearer {self._token.token}"}
+
+    def _upload_blob(self, file_bytes: bytes, filename: str,
+                     deadline: Deadline | None = None) -> str:
+        stage = (deadline or Deadline(DOC_DEADLINE_S)).stage("cu_upload", STAGE_BUDGETS_S["cu_upload"])
+        url = f"{self.endpoint}/blob/{quote(filename)}?t={time.time_ns()}"
+        r = requests.put(url, data=file_bytes, timeout=stage.timeout())
+        r.raise_for_status()
+        return url
+
+    def _gpt4_describe(self, file_bytes: bytes, filename: str, mime: str,
+                       deadline: Deadline | None = None,
+                       content_hash: str | None = None) -> tuple[str, dict]:
+        return describe(
+            file_bytes, filename, mime,
+            endpoint=f"{self.endpoint}/chat/completions",
+            bearer_token=self._token.token,
+            deadline=deadline,
+            content_hash=content_hash,
+        )
+
+
+class StandInDocIntelService(DocIntelGPTService):
+    """`DocIntelGPTService` against a local stand-in endpoint."""
+
+    def __init__(self, endpoint: str, poll_interval: float | None = None):
+        self.endpoint = endpoint.rstrip("/")
+        kwargs = {} if poll_interval is None else {"polling_interval": poll_interval}
+        self.di_client = DocumentIntelligenceClient(
+            endpoint=self.endpoint, credential=AzureKeyCredential("stand-in"), **kwargs
+        )
+        self._token = _STAND_IN_TOKEN
+
+    def _get_bearer_token(self) -> str:
+        return self._token.token
+
+    def _gpt_describe(self, file_bytes: bytes, filename: str, mime: str,
+                      deadline: Deadline | None = None,
+                      content_hash: str | None = None) -> tuple[str, dict]:
+        return describe(
+            file_bytes, filename, mime,
+            endpoint=f"{self.endpoint}/openai/deployments/gpt-5-chat/chat/completions",
+            bearer_token=self._token.token,
+            deadline=deadline,
+            content_hash=content_hash,
+        )
+
+
+class StandInMistralService(MistralVisionService):
+    """`MistralVisionService` against a local stand-in endpoint."""
+
+    def __init__(self, endpoint: str):
+        endpoint = endpoint.rstrip("/")
+        self.ocr_endpoint = f"{endpoint}/providers/mistral/azure/ocr"
+        self.chat_endpoint = f"{endpoint}/models/chat/completions"
+        self.api_key = "stand-in"
+        self.model = MISTRAL_DOC_AI_MODEL
+        self._token = _STAND_IN_TOKEN
+
+    def _get_bearer_token(self) -> str:
+        return self._token.token
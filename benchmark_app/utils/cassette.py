@@ -0,0 +1,277 @@
+"""
+Record / replay of HTTP exchanges ("cassettes") for offline benchmarking.
+
+Every request the three services make — `requests` calls and the Azure SDK
+clients (azure-core sends through `requests` too) — goes through
+`requests.adapters.HTTPAdapter.send`, which `install` wraps:
+
+    record   forward the request, then append the exchange to the cassette:
+             request fingerprint, status, headers, body, observed latency
+    replay   never touch the network: answer from the cassette after the
+             recorded latency × `latency_scale`
+
+A cassette is a JSON-lines file, one exchange per line. Fingerprints ignore
+the host and volatile query parameters (SAS tokens, timeouts), and URLs
+inside JSON bodies are reduced to their path, so a recording made against
+one resource replays against another. Replay matches on method + path +
+body hash first, then on method + path alone (e.g. a document whose bytes
+differ from the recording), then on method + parent path (a blob name or
+operation id that was never recorded); exchanges with the same key are
+served in recorded order and cycle, so repeated polls see Running …
+Succeeded again. Token endpoints are never recorded, and request headers are not stored.
+"""
+
+import base64
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import threading
+import time
+from types import SimpleNamespace
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPResponse
+
+from config import CASSETTE_LATENCY_SCALE, CASSETTE_MODE, CASSETTE_PATH
+
+log = logging.getLogger(__name__)
+
+MODES = ("off", "record", "replay")
+
+# SAS / request-scoped query parameters that differ between runs
+_VOLATILE_QUERY = {
+    "sv", "ss", "srt", "sp", "se", "st", "spr", "sig", "sr", "skoid", "sktid",
+    "skt", "ske", "sks", "skv", "saoid", "suoid", "scid", "timeout", "t",
+}
+_URL_IN_BODY_RE = re.compile(rb'https?://[^/"\s]+(/[^"\s?]*)?(\?[^"\s]*)?')
+_NO_RECORD_RE = re.compile(r"login\.microsoftonline\.com|login\.windows\.net|169\.254\.169\.254|/oauth2/")
+# Stored bodies are decoded; length / encoding headers are rebuilt on replay
+_DROP_HEADERS = {"content-encoding", "transfer-encoding", "content-length", "set-cookie", "connection"}
+
+
+class CassetteMiss(requests.ConnectionError):
+    """Replay found no recorded exchange for a request."""
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# Fingerprints
+# ═══════════════════════════════════════════════════════════════════════
+def request_path(url: str) -> str:
+    """Host-less path + stable query parameters of a URL."""
+    parts = urlsplit(url)
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                   if k.lower() not in _VOLATILE_QUERY)
+    return parts.path + (f"?{urlencode(query)}" if query else "")
+
+
+def body_hash(body) -> str:
+    """SHA-256 of a request body (bytes, str, or a re-iterable streaming body)."""
+    if body is None:
+        return ""
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    if hasattr(body, "read"):
+        return "stream"           # file-like: would be consumed by hashing
+    h = hashlib.sha256()
+    if isinstance(body, (bytes, bytearray, memoryview)):
+        h.update(_URL_IN_BODY_RE.sub(rb"\1", bytes(body)))
+    else:
+        # Re-iterable streaming body: hash the chunks (URLs cannot span the
+        # base64 chunks of `StreamingJSONBody`, only its JSON prefix / suffix)
+        for chunk in body:
+            h.update(_URL_IN_BODY_RE.sub(rb"\1", chunk if isinstance(chunk, bytes) else chunk.encode()))
+    return h.hexdigest()
+
+
+def exchange(method: str, url: str, status: int, headers: dict, body: bytes,
+             latency_s: float, request_body=None) -> dict:
+    """One cassette entry (also used to build cassettes from saved results)."""
+    entry = {
+        "method": method.upper(),
+        "path": request_path(url),
+        "body_sha256": body_hash(request_body),
+        "status": status,
+        "headers": {k: v for k, v in headers.items() if k.lower() not in _DROP_HEADERS},
+        "latency_s": round(latency_s, 4),
+        "recorded_at": time.time(),
+    }
+    try:
+        entry["body"] = body.decode("utf-8")
+    except UnicodeDecodeError:
+        entry["body_b64"] = base64.b64encode(body).decode("ascii")
+    return entry
+
+
+def entry_body(entry: dict) -> bytes:
+    if "body_b64" in entry:
+        return base64.b64decode(entry["body_b64"])
+    return entry.get("body", "").encode("utf-8")
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# Cassette file
+# ═══════════════════════════════════════════════════════════════════════
+class Cassette:
+    """Exchanges of one cassette file, indexed for replay."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._exact = {}          # (method, path, body hash) → [entry, …]
+        self._loose = {}          # (method, path without query) → [entry, …]
+        self._parent = {}         # (method, parent path) → [entry, …]
+        self._cursors = {}
+        self._lock = threading.Lock()
+        self._file = None
+        self.stats = {"recorded": 0, "replayed": 0, "path_only": 0, "parent_only": 0, "misses": 0}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._index(json.loads(line))
+
+    def __len__(self) -> int:
+        return sum(len(v) for v in self._loose.values())
+
+    @staticmethod
+    def _keys(method: str, path: str, sha: str) -> tuple:
+        bare = path.split("?")[0]
+        return (method, path, sha), (method, bare), (method, bare.rsplit("/", 1)[0])
+
+    def _index(self, entry: dict):
+        exact, loose, parent = self._keys(entry["method"], entry["path"], entry["body_sha256"])
+        self._exact.setdefault(exact, []).append(entry)
+        self._loose.setdefault(loose, []).append(entry)
+        self._parent.setdefault(parent, []).append(entry)
+
+    def append(self, entry: dict):
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._file.flush()
+            self._index(entry)
+            self.stats["recorded"] += 1
+
+    def _next(self, key, entries: list) -> dict:
+        i = self._cursors.get(key, 0)
+        self._cursors[key] = (i + 1) % len(entries)
+        return entries[i]
+
+    def match(self, method: str, url: str, body=None) -> dict | None:
+        """Next recorded exchange for a request (exact, then path, then parent path)."""
+        exact, loose, parent = self._keys(method.upper(), request_path(url), body_hash(body))
+        with self._lock:
+            for key, index, stat in ((exact, self._exact, None),
+                                     (loose, self._loose, "path_only"),
+                                     (parent, self._parent, "parent_only")):
+                if key in index:
+                    self.stats["replayed"] += 1
+                    if stat:
+                        self.stats[stat] += 1
+                    return self._next((stat, key), index[key])
+            self.stats["misses"] += 1
+            return None
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# Transport hook
+# ═══════════════════════════════════════════════════════════════════════
+_original_send = HTTPAdapter.send
+_active = SimpleNamespace(mode="off", cassette=None, latency_scale=1.0)
+
+
+def _record_send(adapter, request, **kwargs):
+    t0 = time.perf_counter()
+    response = _original_send(adapter, request, **kwargs)
+    if _NO_RECORD_RE.search(request.url):
+        return response
+    body = response.content          # cached on the response for the caller
+    _active.cassette.append(exchange(
+        request.method, request.url, response.status_code, dict(response.headers),
+        body, time.perf_counter() - t0, request.body,
+    ))
+    return response
+
+
+def _replay_send(adapter, request, **kwargs):
+    entry = _active.cassette.match(request.method, request.url, request.body)
+    if entry is None:
+        log.warning("📼 no recorded exchange for %s %s", request.method, request_path(request.url))
+        raise CassetteMiss(f"Cassette miss: {request.method} {request_path(request.url)}", request=request)
+    if _active.latency_scale > 0:
+        time.sleep(entry["latency_s"] * _active.latency_scale)
+    body = entry_body(entry)
+    headers = dict(entry["headers"], **{"Content-Length": str(len(body))})
+    raw = HTTPResponse(body=io.BytesIO(body), headers=headers, status=entry["status"],
+                       preload_content=False, decode_content=False)
+    return adapter.build_response(request, raw)
+
+
+def _send(adapter, request, **kwargs):
+    if _active.mode == "record":
+        return _record_send(adapter, request, **kwargs)
+    if _active.mode == "replay":
+        return _replay_send(adapter, request, **kwargs)
+    return _original_send(adapter, request, **kwargs)
+
+
+def install(mode: str, path: str = CASSETTE_PATH,
+            latency_scale: float = CASSETTE_LATENCY_SCALE) -> Cassette | None:
+    """Route all HTTP traffic of this process through a cassette (`off` restores it)."""
+    if mode not in MODES:
+        raise ValueError(f"Unknown cassette mode: {mode}")
+    if _active.cassette is not None:
+        _active.cassette.close()
+    if mode == "off":
+        _active.mode, _active.cassette = "off", None
+        HTTPAdapter.send = _original_send
+        return None
+    cassette = Cassette(path)
+    if mode == "replay" and not len(cassette):
+        raise FileNotFoundError(f"Cassette {path} is missing or empty")
+    _active.mode, _active.cassette, _active.latency_scale = mode, cassette, latency_scale
+    HTTPAdapter.send = _send
+    log.info("📼 cassette %s: %s (%d exchanges)", mode, path, len(cassette))
+    return cassette
+
+
+def install_from_config() -> Cassette | None:
+    """Apply `CASSETTE_MODE` once per process (no-op when off or already active)."""
+    if CASSETTE_MODE == "off" or _active.mode != "off":
+        return _active.cassette
+    return install(CASSETTE_MODE)
+
+
+def active() -> Cassette | None:
+    return _active.cassette
+
+
+def replaying() -> bool:
+    return _active.mode == "replay"
+
+
+class _ReplayCredential:
+    """Static token: replayed exchanges never check it."""
+
+    def get_token(self, *scopes, **kwargs):
+        return SimpleNamespace(token="replay", expires_on=time.time() + 86400)
+
+
+def azure_credential():
+    """`DefaultAzureCredential`, or a static one while replaying (no token endpoint)."""
+    if replaying():
+        return _ReplayCredential()
+    from azure.identity import DefaultAzureCredential
+    return DefaultAzureCredential()
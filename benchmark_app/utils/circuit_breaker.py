@@ -0,0 +1,181 @@
+"""
+Circuit breakers per (endpoint, analyzer).
+
+A breaker trips after `BREAKER_FAILURE_THRESHOLD` consecutive *deterministic*
+failures — errors that will not go away by retrying the next document
+(400 Bad Request, 401/403 auth, 404 unknown analyzer, 429 quota exhausted…).
+While open, calls fail immediately with `CircuitOpenError` carrying the last
+error, so a misconfigured batch costs seconds instead of N round trips.
+After `BREAKER_RESET_TIMEOUT_S` a single half-open probe is let through:
+success closes the breaker, another deterministic failure re-opens it.
+Transient errors (timeouts, 5xx, rate limiting) never trip it.
+"""
+
+import logging
+import re
+import threading
+import time
+
+from config import BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT_S
+
+log = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+DETERMINISTIC_STATUS = {400, 401, 403, 404, 405, 409, 413, 415, 422}
+_STATUS_RE = re.compile(r"^\s*(\d{3})\b")
+_QUOTA_RE = re.compile(r"quota|insufficient|billing|exceeded.*limit", re.IGNORECASE)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a dependency whose breaker is open."""
+
+
+def failure_status(exc: Exception) -> int | None:
+    """Best-effort HTTP status of an exception (requests, azure-core or "400: …")."""
+    response = getattr(exc, "response", None)
+    status = getattr(response, "status_code", None) or getattr(exc, "status_code", None)
+    if isinstance(status, int):
+        return status
+    m = _STATUS_RE.match(str(exc))
+    return int(m.group(1)) if m else None
+
+
+def is_deterministic(exc: Exception) -> bool:
+    """True when retrying another document against the same target would fail the same way."""
+    if isinstance(exc, CircuitOpenError):
+        return False
+    status = failure_status(exc)
+    if status in DETERMINISTIC_STATUS:
+        return True
+    if status == 429:
+        response = getattr(exc, "response", None)
+        body = getattr(response, "text", "") or ""
+        return bool(_QUOTA_RE.search(body) or _QUOTA_RE.search(str(exc)))
+    return False
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a single half-open probe."""
+
+    def __init__(self, name: str,
+                 failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout: float = BREAKER_RESET_TIMEOUT_S):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.last_error = None
+        self.short_circuited = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def _transition(self, state: str):
+        if state != self.state:
+            log.warning("⚡ circuit %s: %s → %s%s", self.name, self.state, state,
+                        f" ({self.last_error[:120]})" if state == OPEN and self.last_error else "")
+            self.state = state
+
+    def raise_if_open(self):
+        """Cheap pre-check (no probe slot taken) before expensive preparation work."""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at < self.reset_timeout:
+                self.short_circuited += 1
+                raise CircuitOpenError(
+                    f"Circuit open for {self.name} after {self.failures} consecutive "
+                    f"failures — last error: {self.last_error}"
+                )
+
+    def before_call(self):
+        """Raise `CircuitOpenError` unless a call may go through now."""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            self.short_circuited += 1
+            raise CircuitOpenError(
+                f"Circuit open for {self.name} after {self.failures} consecutive "
+                f"failures — last error: {self.last_error}"
+            )
+
+    def on_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probe_in_flight = False
+            self._transition(CLOSED)
+
+    def on_failure(self, exc: Exception):
+        with self._lock:
+            self._probe_in_flight = False
+            if not is_deterministic(exc):
+                if self.state == HALF_OPEN:
+                    # Probe inconclusive: go back to open and try again later
+                    self.opened_at = time.monotonic()
+                    self._transition(OPEN)
+                return
+            self.failures += 1
+            self.last_error = str(exc)[:500]
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._transition(OPEN)
+
+    def call(self, fn, *args, **kwargs):
+        """Run `fn` through the breaker."""
+        self.before_call()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self.on_failure(e)
+            raise
+        self.on_success()
+        return result
+
+    def reset(self):
+        with self._lock:
+            self.failures = 0
+            self._probe_in_flight = False
+            self._transition(CLOSED)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "breaker": self.name,
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "short_circuited": self.short_circuited,
+                "last_error": self.last_error,
+            }
+
+
+_breakers = {}
+_registry_lock = threading.Lock()
+
+
+def get_breaker(endpoint: str, analyzer: str) -> CircuitBreaker:
+    """Process-wide breaker for one (endpoint, analyzer) pair."""
+    key = (endpoint, analyzer)
+    with _registry_lock:
+        if key not in _breakers:
+            host = re.sub(r"^https?://", "", endpoint or "?").split("/")[0]
+            _breakers[key] = CircuitBreaker(f"{host} / {analyzer}")
+        return _breakers[key]
+
+
+def breaker_states() -> list[dict]:
+    """Snapshot of every breaker, for the sidebar and batch logs."""
+    with _registry_lock:
+        breakers = list(_breakers.values())
+    return [b.snapshot() for b in breakers]
+
+
+def reset_all():
+    with _registry_lock:
+        breakers = list(_breakers.values())
+    for b in breakers:
+        b.reset()
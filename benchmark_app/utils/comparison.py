@@ -28,6 +28,7 @@ def build_comparison_table(results: dict) -> list[dict]:
             "Tables Detected": res.get("tables_count", 0),
             "Avg Confidence": res.get("avg_confidence", "N/A"),
             "Markdown Length": len(res.get("markdown", "")),
+            "Est. Cost ($)": (res.get("usage") or {}).get("cost_usd", "N/A"),
         }
         rows.append(row)
     return rows
@@ -82,6 +83,7 @@ def compute_summary_stats(all_results: list[dict]) -> dict:
                     "successes": 0,
                     "total": 0,
                     "confidences": [],
+                    "costs": [],
                 }
             stats = pipeline_stats[pipeline]
             stats["total"] += 1
@@ -91,6 +93,8 @@ def compute_summary_stats(all_results: list[dict]) -> dict:
                 stats["fields"].append(res.get("fields_with_values", 0))
                 if res.get("avg_confidence") is not None:
                     stats["confidences"].append(res["avg_confidence"])
+                if res.get("usage"):
+                    stats["costs"].append(res["usage"]["cost_usd"])
 
     summary = {}
     for pipeline, s in pipeline_stats.items():
@@ -103,10 +107,22 @@ def compute_summary_stats(all_results: list[dict]) -> dict:
                 if s["confidences"]
                 else "N/A"
             ),
+            **cost_stats(s["costs"]),
         }
     return summary
 
 
+def cost_stats(costs: list[float]) -> dict:
+    """Average estimated cost per document and documents per dollar."""
+    if not costs:
+        return {"avg_cost_usd": "N/A", "docs_per_dollar": "N/A"}
+    avg = sum(costs) / len(costs)
+    return {
+        "avg_cost_usd": round(avg, 5),
+        "docs_per_dollar": round(1 / avg, 1) if avg else "N/A",
+    }
+
+
 def get_mime_type(filename: str) -> str:
     """Return MIME type based on file extension."""
     ext = filename.lower().rsplit(".", 1)[-1] if "." in filename else ""
@@ -120,3 +136,36 @@ def get_mime_type(filename: str) -> str:
         "pdf": "application/pdf",
     }
     return mime_map.get(ext, "application/octet-stream")
+
+
+def build_analyzer_summary(all_metrics: dict) -> list[dict]:
+    """
+    Aggregate batch-runner metrics per analyzer, in the
+    `model_comparison_summary.json` format.
+
+    Args:
+        all_metrics: { analyzer_id: [per-document metrics dict, ...] }
+    """
+    def _avg(values, digits):
+        return round(sum(values) / len(values), digits) if values else 0
+
+    summary = []
+    for analyzer, docs in all_metrics.items():
+        ok = [m for m in docs if "error" not in m]
+        confs = [m["avg_confidence"] for m in ok if m.get("avg_confidence") is not None]
+        word_confs = [m["avg_word_confidence"] for m in ok
+                      if m.get("avg_word_confidence") is not None]
+        summary.append({
+            "analyzer": analyzer,
+            "success_rate": f"{len(ok)}/{len(docs)}",
+            "errors": len(docs) - len(ok),
+            "avg_time_s": _avg([m.get("time_seconds", 0) for m in ok], 2),
+            "avg_fields_extracted": _avg([m.get("num_fields_with_values", 0) for m in ok], 1),
+            "avg_tables_detected": _avg([m.get("num_tables", 0) for m in ok], 1),
+            "avg_words_ocr": _avg([m.get("num_words", 0) for m in ok], 0),
+            "avg_markdown_chars": _avg([m.get("markdown_len", 0) for m in ok], 0),
+            "avg_field_confidence": _avg(confs, 4) if confs else "N/A",
+            "avg_word_confidence": _avg(word_confs, 4) if word_confs else "N/A",
+            **cost_stats([m["cost_usd"] for m in ok if m.get("cost_usd") is not None]),
+        })
+    return summary
@@ -0,0 +1,243 @@
+"""
+Adaptive concurrency limits per pipeline lane (AIMD).
+
+The right number of in-flight documents changes with the load on the shared
+Azure deployments, so each lane's limit is learned instead of fixed:
+
+    additive increase        +1 after a window of completions in which the
+                             limit was reached, latency stayed within
+                             `CONCURRENCY_LATENCY_TOLERANCE` of the baseline
+                             and throughput did not drop
+    multiplicative decrease  × `CONCURRENCY_BACKOFF` on a 429 / throttling
+                             error, a timeout, or latency inflation
+
+Latency is normalized by the job's cost estimate (pages, MiB) so larger
+documents late in a shortest-first batch do not read as congestion. A
+congestion signal only backs off once per round trip: completions of jobs
+that started before the last decrease are not counted again, nor sampled
+for the next window. Limiters live
+for the whole process, so later batches start from what earlier ones learned.
+"""
+
+import logging
+import re
+import statistics
+import threading
+import time
+from collections import deque
+
+from config import (
+    CONCURRENCY_BACKOFF,
+    CONCURRENCY_LATENCY_TOLERANCE,
+    CONCURRENCY_MAX,
+    CONCURRENCY_MIN,
+    CONCURRENCY_WINDOW,
+    SCHEDULER_LANE_WORKERS,
+)
+from utils.circuit_breaker import failure_status
+
+log = logging.getLogger(__name__)
+
+OK, THROTTLED, TIMEOUT, ERROR = "ok", "throttled", "timeout", "error"
+
+_THROTTLE_RE = re.compile(r"\b429\b|too many requests|rate.?limit|throttl", re.IGNORECASE)
+_TIMEOUT_RE = re.compile(r"timed? ?out|timeout|deadline", re.IGNORECASE)
+_SEVERITY = {OK: 0, ERROR: 1, TIMEOUT: 2, THROTTLED: 3}
+
+# Baseline latency drifts towards recent windows so a slower service later
+# in the day becomes the new normal instead of a permanent back-off.
+_BASELINE_DRIFT = 0.05
+
+
+def _classify_text(text: str) -> str:
+    if _THROTTLE_RE.search(text):
+        return THROTTLED
+    if _TIMEOUT_RE.search(text):
+        return TIMEOUT
+    return ERROR
+
+
+def classify_outcome(result=None, exc: BaseException | None = None) -> str:
+    """
+    Congestion signal of one finished job: an exception, a pipeline result
+    dict (``error`` / ``errors``), a journal job, or a list of those (batched
+    submits — the worst one counts).
+    """
+    if exc is not None:
+        if isinstance(exc, TimeoutError):
+            return TIMEOUT
+        if failure_status(exc) in (429, 503):
+            return THROTTLED
+        return _classify_text(str(exc))
+    if isinstance(result, list):
+        return max((classify_outcome(r) for r in result), key=_SEVERITY.get, default=OK)
+    if not isinstance(result, dict):
+        return OK
+    messages = [result.get("error") or ""] + list(result.get("errors") or [])
+    outcomes = [_classify_text(m) for m in messages if m]
+    if result.get("status") == "error" and not outcomes:
+        outcomes.append(ERROR)
+    return max(outcomes, key=_SEVERITY.get, default=OK)
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit for one lane.
+
+    Workers `acquire` a slot (blocks while at the limit), `begin` once they
+    hold a job and `release` the slot with the job's latency and outcome.
+    """
+
+    def __init__(self, name: str, initial: int = SCHEDULER_LANE_WORKERS,
+                 min_limit: int = CONCURRENCY_MIN, max_limit: int = CONCURRENCY_MAX,
+                 window: int = CONCURRENCY_WINDOW, backoff: float = CONCURRENCY_BACKOFF,
+                 tolerance: float = CONCURRENCY_LATENCY_TOLERANCE):
+        self.name = name
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = min(self.max_limit, max(self.min_limit, initial))
+        self.window = max(1, window)
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.in_flight = 0          # slots taken (a worker may still be waiting for a job)
+        self.running = 0            # jobs actually running
+        self.baseline = None        # seconds per cost unit
+        self.decisions = deque(maxlen=200)
+        self.totals = {OK: 0, THROTTLED: 0, TIMEOUT: 0, ERROR: 0}
+        self._samples = []          # (start token, seconds per cost unit)
+        self._peak = 0
+        self._prev_throughput = None
+        self._last_decrease = float("-inf")
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """Wait for a free slot."""
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+
+    def begin(self) -> float:
+        """A job starts in an acquired slot; returns the token for `release`."""
+        with self._cond:
+            self.running += 1
+            self._peak = max(self._peak, self.running)
+            return time.monotonic()
+
+    def release(self, token: float | None = None, latency: float | None = None,
+                cost: float = 1.0, outcome: str | None = None):
+        """Free a slot; with an `outcome`, feed the finished job into the controller."""
+        with self._cond:
+            self.in_flight -= 1
+            if outcome is not None:
+                self.running -= 1
+                self._observe(token, latency, cost, outcome)
+            self._cond.notify_all()
+
+    # ── Controller (called with the lock held) ─────────────────────────
+    def _observe(self, token: float, latency: float | None, cost: float, outcome: str):
+        self.totals[outcome] += 1
+        if outcome in (THROTTLED, TIMEOUT):
+            if token > self._last_decrease:
+                self._decrease(outcome)
+            return
+        if outcome == OK and latency is not None and token > self._last_decrease:
+            self._samples.append((token, latency / max(cost, 0.1)))
+        if len(self._samples) >= self.window:
+            self._adjust()
+
+    def _decide(self, limit: int, decision: str, reason: str,
+                throughput: float | None = None, latency: float | None = None):
+        before, self.limit = self.limit, limit
+        self.decisions.append({
+            "lane": self.name,
+            "at": time.time(),
+            "decision": decision,
+            "reason": reason,
+            "limit_before": before,
+            "limit": limit,
+            "docs_per_min": None if throughput is None else round(throughput, 2),
+            "latency_per_cost_s": None if latency is None else round(latency, 3),
+        })
+        if limit != before:
+            log.info("🎚 %s: concurrency %d → %d (%s)", self.name, before, limit, reason)
+        self._samples = []
+        self._peak = self.running
+
+    def _decrease(self, reason: str, throughput: float | None = None,
+                  latency: float | None = None):
+        self._last_decrease = time.monotonic()
+        self._decide(max(self.min_limit, int(self.limit * self.backoff)),
+                     "decrease", reason, throughput, latency)
+
+    def _adjust(self):
+        # From the start of the oldest job: completions of jobs started
+        # together would otherwise read as a burst of throughput
+        elapsed = max(time.monotonic() - min(t for t, _ in self._samples), 1e-6)
+        throughput = len(self._samples) / elapsed * 60
+        latency = statistics.median(lat for _, lat in self._samples)
+        prev, self._prev_throughput = self._prev_throughput, throughput
+
+        if self.baseline is None or latency < self.baseline:
+            self.baseline = latency
+        inflation = latency / self.baseline if self.baseline else 1.0
+        self.baseline += (latency - self.baseline) * _BASELINE_DRIFT
+
+        if inflation > 1 + self.tolerance:
+            return self._decrease(f"latency ×{inflation:.1f}", throughput, latency)
+        if self._peak < self.limit:
+            return self._decide(self.limit, "hold", "limit not reached", throughput, latency)
+        if prev is not None and throughput < prev * 0.9:
+            return self._decide(self.limit, "hold", "throughput dropped", throughput, latency)
+        if self.limit >= self.max_limit:
+            return self._decide(self.limit, "hold", "at max", throughput, latency)
+        self._decide(self.limit + 1, "increase", "latency flat", throughput, latency)
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            last = self.decisions[-1] if self.decisions else {}
+            return {
+                "lane": self.name,
+                "limit": self.limit,
+                "running": self.running,
+                "min": self.min_limit,
+                "max": self.max_limit,
+                "completed": sum(self.totals.values()),
+                "throttled": self.totals[THROTTLED],
+                "timeouts": self.totals[TIMEOUT],
+                "errors": self.totals[ERROR],
+                "increases": sum(d["decision"] == "increase" for d in self.decisions),
+                "decreases": sum(d["decision"] == "decrease" for d in self.decisions),
+                "docs_per_min": last.get("docs_per_min"),
+                "last_decision": f"{last['decision']} ({last['reason']})" if last else None,
+            }
+
+
+_limiters = {}
+_registry_lock = threading.Lock()
+
+
+def get_limiter(name: str, initial: int = SCHEDULER_LANE_WORKERS) -> AdaptiveLimiter:
+    """Process-wide limiter for one lane (`initial` only applies on first use)."""
+    with _registry_lock:
+        if name not in _limiters:
+            _limiters[name] = AdaptiveLimiter(name, initial=initial)
+        return _limiters[name]
+
+
+def limiter_states() -> list[dict]:
+    """Snapshot of every lane limiter, for the sidebar and batch logs."""
+    with _registry_lock:
+        limiters = list(_limiters.values())
+    return [lim.snapshot() for lim in limiters]
+
+
+def decision_log(names: list[str] | None = None) -> list[dict]:
+    """Every recorded decision (oldest first), optionally for some lanes only."""
+    with _registry_lock:
+        limiters = [lim for n, lim in _limiters.items() if names is None or n in names]
+    rows = []
+    for lim in limiters:
+        with lim._cond:
+            rows.extend(lim.decisions)
+    return sorted(rows, key=lambda d: d["at"])
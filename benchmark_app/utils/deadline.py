@@ -0,0 +1,55 @@
+"""
+Deadline budgets propagated through a document's pipeline.
+
+A `Deadline` is created once per document (`DOC_DEADLINE_S`) and every stage
+derives a child capped by its own budget (`STAGE_BUDGETS_S`). Each outbound
+call uses `deadline.timeout()` instead of a hard-coded timeout, so a stuck
+request can never hold a document longer than what is left of its budget.
+"""
+
+import time
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a stage or document runs out of time budget."""
+
+
+class Deadline:
+    """Absolute point in (monotonic) time by which work must be done."""
+
+    def __init__(self, budget_s: float | None, name: str = "document"):
+        self.name = name
+        self.budget_s = budget_s
+        self.expires_at = None if budget_s is None else time.monotonic() + budget_s
+
+    def remaining(self) -> float:
+        """Seconds left (inf when unbounded, never negative)."""
+        if self.expires_at is None:
+            return float("inf")
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def check(self):
+        if self.expired():
+            raise DeadlineExceeded(f"{self.name} deadline ({self.budget_s}s) exceeded")
+
+    def timeout(self, cap: float | None = None) -> float:
+        """Timeout to pass to a blocking call; raises if nothing is left."""
+        self.check()
+        left = self.remaining()
+        if cap is not None:
+            left = min(left, cap)
+        return left if left != float("inf") else None
+
+    def stage(self, name: str, budget_s: float | None) -> "Deadline":
+        """Child deadline for one stage: its own budget, capped by this one."""
+        child = Deadline(None, name)
+        child.budget_s = budget_s
+        candidates = [t for t in (
+            self.expires_at,
+            None if budget_s is None else time.monotonic() + budget_s,
+        ) if t is not None]
+        child.expires_at = min(candidates) if candidates else None
+        return child
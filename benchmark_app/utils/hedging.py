@@ -0,0 +1,155 @@
+"""
+Hedged requests for idempotent, latency-critical calls (LLM, OCR).
+
+Latencies are tracked per stage. Once a call has been running longer than
+its stage's observed p95, one duplicate is fired and the first successful
+answer wins; the other is abandoned (its own timeout still bounds it). If
+one attempt fails (read timeout, 5xx, dropped connection) the other's
+answer is still used. The primary of a hedgeable call runs on its own
+thread and only hedges use a small pool, so hedging never limits how many
+calls are in flight.
+Hedges are paid from a budget that refills by `HEDGE_BUDGET_RATIO` tokens per
+primary call, so at most ~that fraction of extra requests is ever sent.
+Per-page-billed stages (OCR) are not hedged unless `HEDGE_PAGE_BILLED`.
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from config import (
+    CONCURRENCY_MAX,
+    HEDGE_BUDGET_RATIO,
+    HEDGE_ENABLED,
+    HEDGE_MIN_SAMPLES,
+    HEDGE_PAGE_BILLED,
+)
+from utils.deadline import Deadline, DeadlineExceeded
+
+# Hedges only: at most one per in-flight call of the three pipeline lanes
+_executor = ThreadPoolExecutor(max_workers=CONCURRENCY_MAX * 3, thread_name_prefix="hedge")
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies for one stage."""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> float | None:
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class HedgeBudget:
+    """Token bucket: each primary call earns `ratio` tokens, a hedge costs one."""
+
+    def __init__(self, ratio: float, burst: float = 5.0):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = burst
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "hedges": 0, "hedge_wins": 0}
+
+    def earn(self):
+        with self._lock:
+            self.stats["calls"] += 1
+            self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self.stats["hedges"] += 1
+                return True
+            return False
+
+    def win(self):
+        with self._lock:
+            self.stats["hedge_wins"] += 1
+
+
+def _start(fn, timeout: float | None) -> Future:
+    """Run `fn(timeout)` on a thread of its own (unbounded, unlike the hedge pool)."""
+    future = Future()
+    future.set_running_or_notify_cancel()
+
+    def run():
+        try:
+            future.set_result(fn(timeout))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name="hedge-primary", daemon=True).start()
+    return future
+
+
+_trackers = {}
+_trackers_lock = threading.Lock()
+budget = HedgeBudget(HEDGE_BUDGET_RATIO)
+
+
+def tracker(stage: str) -> LatencyTracker:
+    with _trackers_lock:
+        if stage not in _trackers:
+            _trackers[stage] = LatencyTracker()
+        return _trackers[stage]
+
+
+def hedged_call(stage: str, deadline: Deadline, fn, billed_per_page: bool = False):
+    """
+    Run `fn(timeout)` within `deadline`, hedging once past the stage p95.
+
+    `fn` must be idempotent: it may run twice concurrently and only one
+    successful result is used. `billed_per_page` stages are only hedged
+    with `HEDGE_PAGE_BILLED` (a hedge doubles their cost).
+    """
+    t = tracker(stage)
+    budget.earn()
+    hedgeable = HEDGE_ENABLED and (HEDGE_PAGE_BILLED or not billed_per_page)
+    p95 = t.percentile(0.95) if hedgeable else None
+    t0 = time.monotonic()
+
+    if p95 is None:
+        result = fn(deadline.timeout())
+        t.record(time.monotonic() - t0)
+        return result
+
+    primary = _start(fn, deadline.timeout())
+    attempts, hedge = [primary], None
+    if not wait(attempts, timeout=min(p95, deadline.remaining()))[0]:
+        if not deadline.expired() and budget.try_spend():
+            hedge = _executor.submit(fn, deadline.timeout())
+            attempts.append(hedge)
+
+    # First successful answer wins; a failed attempt falls back to the other one
+    pending = set(attempts)
+    while pending:
+        done, pending = wait(pending, timeout=deadline.remaining(), return_when=FIRST_COMPLETED)
+        if not done:
+            raise DeadlineExceeded(f"{stage}: {deadline.name} deadline exceeded")
+        for future in sorted(done, key=attempts.index):
+            if future.exception() is None:
+                if future is hedge:
+                    budget.win()
+                # Latency as the caller saw it: a beaten straggler is not recorded
+                t.record(time.monotonic() - t0)
+                return future.result()
+    raise primary.exception()      # every attempt failed
+
+
+def hedging_stats() -> dict:
+    """Hedge counters and current p95 per stage."""
+    return {
+        **budget.stats,
+        "p95_s": {s: tr.percentile(0.95) for s, tr in _trackers.items()},
+    }
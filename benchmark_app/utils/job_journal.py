@@ -0,0 +1,223 @@
+"""
+Crash-safe job journal for long batch runs (SQLite, WAL mode).
+
+Every (document, analyzer) job moves through:
+
+    pending → uploaded → submitted → polled → llm_done → written
+                                   ↘ failed
+
+Each transition is committed before the next network call, together with
+what is needed to resume from it (blob URL, Operation-Location, raw result,
+description). After a crash the batch runner reopens the journal, resumes
+polling outstanding operations and skips completed work instead of
+resubmitting (and paying for) the whole batch.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+
+STATES = ("pending", "uploaded", "submitted", "polled", "llm_done", "written", "failed")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    document     TEXT NOT NULL,
+    analyzer     TEXT NOT NULL,
+    state        TEXT NOT NULL,
+    blob_url     TEXT,
+    op_url       TEXT,
+    submitted_at REAL,
+    raw_json     TEXT,
+    description  TEXT,
+    output_path  TEXT,
+    metrics_json TEXT,
+    usage_json   TEXT,
+    error        TEXT,
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    updated_at   REAL NOT NULL,
+    PRIMARY KEY (document, analyzer)
+);
+CREATE TABLE IF NOT EXISTS transitions (
+    id        INTEGER PRIMARY KEY AUTOINCREMENT,
+    document  TEXT NOT NULL,
+    analyzer  TEXT NOT NULL,
+    state     TEXT NOT NULL,
+    at        REAL NOT NULL,
+    detail    TEXT
+);
+"""
+
+_COLUMNS = ("blob_url", "op_url", "submitted_at", "raw_json", "description",
+            "output_path", "metrics_json", "usage_json", "error")
+
+
+class JobJournal:
+    """Durable per-document state machine backed by a SQLite file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.executescript(_SCHEMA)
+        # Journals created before usage tracking
+        columns = {r["name"] for r in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "usage_json" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN usage_json TEXT")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ── Writes ──────────────────────────────────────────────────────────
+    def ensure(self, document: str, analyzer: str):
+        """Register a job as pending unless it is already known."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO jobs (document, analyzer, state, updated_at) "
+                "VALUES (?, ?, 'pending', ?)",
+                (document, analyzer, time.time()),
+            )
+
+    def record(self, document: str, analyzer: str, state: str, **data):
+        """
+        Commit a state transition and its resume data atomically.
+
+        Keyword args map to journal columns; ``raw``, ``metrics`` and ``usage``
+        are stored as JSON.
+        """
+        if state not in STATES:
+            raise ValueError(f"Unknown job state: {state}")
+        if "raw" in data:
+            data["raw_json"] = json.dumps(data.pop("raw"), ensure_ascii=False)
+        if "metrics" in data:
+            data["metrics_json"] = json.dumps(data.pop("metrics"), ensure_ascii=False)
+        if "usage" in data:
+            data["usage_json"] = json.dumps(data.pop("usage"), ensure_ascii=False)
+        unknown = set(data) - set(_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown journal columns: {sorted(unknown)}")
+
+        now = time.time()
+        sets = ", ".join(f"{k} = ?" for k in data)
+        params = list(data.values())
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute(
+                "INSERT OR IGNORE INTO jobs (document, analyzer, state, updated_at) "
+                "VALUES (?, ?, 'pending', ?)",
+                (document, analyzer, now),
+            )
+            self._conn.execute(
+                f"UPDATE jobs SET state = ?, updated_at = ?"
+                f"{', ' + sets if sets else ''}"
+                f"{', attempts = attempts + 1' if state == 'submitted' else ''} "
+                "WHERE document = ? AND analyzer = ?",
+                [state, now, *params, document, analyzer],
+            )
+            self._conn.execute(
+                "INSERT INTO transitions (document, analyzer, state, at, detail) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (document, analyzer, state, now, data.get("error") or data.get("op_url")),
+            )
+
+    def reset(self, document: str, analyzer: str, reason: str = ""):
+        """Send a job back to pending (e.g. its operation expired server-side)."""
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute(
+                "UPDATE jobs SET state = 'pending', blob_url = NULL, op_url = NULL, "
+                "raw_json = NULL, usage_json = NULL, error = ?, updated_at = ? "
+                "WHERE document = ? AND analyzer = ?",
+                (reason or None, time.time(), document, analyzer),
+            )
+            self._conn.execute(
+                "INSERT INTO transitions (document, analyzer, state, at, detail) "
+                "VALUES (?, ?, 'pending', ?, ?)",
+                (document, analyzer, time.time(), reason or "reset"),
+            )
+
+    def note(self, document: str, analyzer: str, detail: str):
+        """Log a transient error against a job without changing its state."""
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            row = self._conn.execute(
+                "SELECT state FROM jobs WHERE document = ? AND analyzer = ?", (document, analyzer)
+            ).fetchone()
+            if row is None:
+                return
+            self._conn.execute(
+                "UPDATE jobs SET error = ?, updated_at = ? WHERE document = ? AND analyzer = ?",
+                (detail, time.time(), document, analyzer),
+            )
+            self._conn.execute(
+                "INSERT INTO transitions (document, analyzer, state, at, detail) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (document, analyzer, row["state"], time.time(), detail),
+            )
+
+    def retry(self, document: str, analyzer: str, reason: str = "retry") -> str:
+        """
+        Send a failed job back to the furthest state its saved data allows
+        (raw result → polled, Operation-Location → submitted, blob → uploaded,
+        else pending), so retrying never pays for a completed step twice.
+        Returns the new state.
+        """
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            row = self._conn.execute(
+                "SELECT raw_json, op_url, blob_url FROM jobs WHERE document = ? AND analyzer = ?",
+                (document, analyzer),
+            ).fetchone()
+            if row is None:
+                return "pending"
+            state = ("polled" if row["raw_json"] else "submitted" if row["op_url"]
+                     else "uploaded" if row["blob_url"] else "pending")
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, error = ?, updated_at = ? WHERE document = ? AND analyzer = ?",
+                (state, reason, time.time(), document, analyzer),
+            )
+            self._conn.execute(
+                "INSERT INTO transitions (document, analyzer, state, at, detail) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (document, analyzer, state, time.time(), reason),
+            )
+        return state
+
+    # ── Reads ───────────────────────────────────────────────────────────
+    def get(self, document: str, analyzer: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM jobs WHERE document = ? AND analyzer = ?",
+                (document, analyzer),
+            ).fetchone()
+        return self._decode(row) if row else None
+
+    def jobs(self, states=None) -> list[dict]:
+        """All jobs, optionally filtered to the given states."""
+        query, params = "SELECT * FROM jobs", ()
+        if states:
+            query += f" WHERE state IN ({', '.join('?' * len(states))})"
+            params = tuple(states)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY document, analyzer", params).fetchall()
+        return [self._decode(r) for r in rows]
+
+    def counts(self) -> dict:
+        """{state: number_of_jobs}"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT state, COUNT(*) AS n FROM jobs GROUP BY state"
+            ).fetchall()
+        return {r["state"]: r["n"] for r in rows}
+
+    @staticmethod
+    def _decode(row) -> dict:
+        job = dict(row)
+        job["raw"] = json.loads(job.pop("raw_json")) if job.get("raw_json") else None
+        job["metrics"] = json.loads(job.pop("metrics_json")) if job.get("metrics_json") else None
+        job["usage"] = json.loads(job.pop("usage_json")) if job.get("usage_json") else None
+        return job
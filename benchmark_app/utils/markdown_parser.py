@@ -0,0 +1,241 @@
+"""
+One-pass structure parser for OCR markdown (Mistral OCR page output).
+
+Walks the markdown line by line exactly once and extracts:
+  - key / value pairs ("Invoice no: 51109338", or "Date of issue:" followed
+    by the value on the next line),
+  - real tables (HTML <table> blocks and pipe tables) as rows of cells,
+  - headings, and the sections they delimit.
+
+Pages can be fed one at a time, so the full document never has to be joined
+into a single string before parsing.
+"""
+
+import re
+
+# ─── Line patterns ─────────────────────────────────────────────────────
+_KV_RE = re.compile(r"^\s*[-•*]*\s*\*{0,2}([A-Za-z /]+?)\*{0,2}\s*:\s*(.*)$")
+_HEADING_RE = re.compile(r"^\s{0,3}(#{1,6})\s+(.+?)\s*#*\s*$")
+_PIPE_SEP_RE = re.compile(r"^\s*\|?\s*:?-{2,}:?\s*(\|\s*:?-{2,}:?\s*)*\|?\s*$")
+_ROW_RE = re.compile(r"<tr\b[^>]*>(.*?)</tr>", re.IGNORECASE | re.DOTALL)
+_CELL_RE = re.compile(r"<t[hd]\b[^>]*>(.*?)</t[hd]>", re.IGNORECASE | re.DOTALL)
+_TAG_RE = re.compile(r"<[^>]+>")
+_BR_RE = re.compile(r"<br\s*/?>", re.IGNORECASE)
+_NUMBER_RE = re.compile(r"\d")
+
+MAX_KEY_LEN = 40
+
+# Words that make a section worth sending to the summarizer
+_KEYWORDS = (
+    "invoice", "facture", "total", "amount", "due", "date", "seller", "client",
+    "vendor", "customer", "tax", "vat", "tva", "iban", "order", "quote", "summary",
+)
+
+
+def _clean_cell(html: str) -> str:
+    if "<" in html:
+        html = _TAG_RE.sub(" ", _BR_RE.sub(" ", html))
+    return " ".join(html.split())
+
+
+def _html_rows(block: str) -> list:
+    rows = []
+    for row_html in _ROW_RE.findall(block):
+        cells = [_clean_cell(c) for c in _CELL_RE.findall(row_html)]
+        if cells:
+            rows.append(cells)
+    return rows
+
+
+class MarkdownStructureParser:
+    """Incremental parser: call `feed()` with each page, then `close()`."""
+
+    def __init__(self):
+        self.fields = {}
+        self.tables = []
+        self.headings = []
+        self.sections = []
+
+        self._section = {"heading": "", "level": 0, "lines": [], "fields": 0, "tables": 0}
+        self._pending_key = None      # "Key:" waiting for its value on a later line
+        self._pipe_table = None       # rows of the pipe table being read
+
+    # ── Public API ──────────────────────────────────────────────────────
+    def feed(self, text: str):
+        # HTML tables are consumed as whole blocks (one regex pass each);
+        # everything between them is walked line by line.
+        lower = text.lower()
+        pos = 0
+        while True:
+            start = lower.find("<table", pos)
+            end = len(text) if start == -1 else start
+            for line in text[pos:end].splitlines():
+                self._line(line)
+            if start == -1:
+                break
+            close = lower.find("</table>", start)
+            stop = len(text) if close == -1 else close + len("</table>")
+            self._end_pipe_table()
+            self._pending_key = None
+            self._add_table(_html_rows(text[start:stop]))
+            pos = stop
+        # Page boundary: a dangling key never takes its value from the next page
+        self._pending_key = None
+        self._end_pipe_table()
+
+    def close(self) -> dict:
+        """
+        Finish parsing and return the document structure.
+
+        Returns:
+            {
+                "fields": {key: value},
+                "tables": [{"rows": [[cell, ...], ...], "section": int}],
+                "headings": [{"level": int, "text": str}],
+                "sections": [{"heading": str, "level": int, "text": str,
+                              "fields": int, "tables": int}],
+            }
+        """
+        self._end_pipe_table()
+        self._end_section()
+        return {
+            "fields": self.fields,
+            "tables": self.tables,
+            "headings": self.headings,
+            "sections": self.sections,
+        }
+
+    # ── Line dispatch ───────────────────────────────────────────────────
+    def _line(self, line: str):
+        stripped = line.strip()
+        if stripped.startswith("|"):
+            self._pipe_line(stripped)
+            return
+        self._end_pipe_table()
+
+        if not stripped:
+            return
+
+        m = _HEADING_RE.match(line)
+        if m:
+            self._pending_key = None
+            self._end_section()
+            level, text = len(m.group(1)), m.group(2).strip()
+            self.headings.append({"level": level, "text": text})
+            self._section = {"heading": text, "level": level, "lines": [],
+                             "fields": 0, "tables": 0}
+            return
+
+        self._section["lines"].append(stripped)
+
+        if self._pending_key is not None:
+            self._add_field(self._pending_key, stripped)
+            self._pending_key = None
+            return
+
+        m = _KV_RE.match(line)
+        if m:
+            key, val = m.group(1).strip(), m.group(2).strip()
+            if val:
+                self._add_field(key, val)
+            elif key and len(key) < MAX_KEY_LEN:
+                self._pending_key = key
+
+    def _add_field(self, key: str, val: str):
+        if key and val and len(key) < MAX_KEY_LEN:
+            self.fields[key] = val
+            self._section["fields"] += 1
+
+    # ── Pipe tables ─────────────────────────────────────────────────────
+    def _pipe_line(self, stripped: str):
+        self._pending_key = None
+        if _PIPE_SEP_RE.match(stripped):
+            if self._pipe_table is None:
+                self._pipe_table = []
+            return
+        cells = [c.strip() for c in stripped.strip("|").split("|")]
+        if self._pipe_table is None:
+            self._pipe_table = []
+        self._pipe_table.append(cells)
+
+    def _end_pipe_table(self):
+        if self._pipe_table is None:
+            return
+        rows, self._pipe_table = self._pipe_table, None
+        # A lone "| foo" line is text, not a table
+        if len(rows) >= 2 or (rows and len(rows[0]) >= 2):
+            self._add_table(rows)
+        else:
+            self._section["lines"].extend(" | ".join(r) for r in rows)
+
+    def _add_table(self, rows: list):
+        if not rows:
+            return
+        self.tables.append({"rows": rows, "section": len(self.sections)})
+        self._section["tables"] += 1
+        self._section["lines"].extend(" | ".join(r) for r in rows)
+
+    # ── Sections ────────────────────────────────────────────────────────
+    def _end_section(self):
+        s = self._section
+        if s["heading"] or s["lines"]:
+            self.sections.append({
+                "heading": s["heading"],
+                "level": s["level"],
+                "text": "\n".join(s["lines"]),
+                "fields": s["fields"],
+                "tables": s["tables"],
+            })
+        self._section = {"heading": "", "level": 0, "lines": [], "fields": 0, "tables": 0}
+
+
+def parse_markdown(pages) -> dict:
+    """
+    Parse OCR markdown in one pass.
+
+    Args:
+        pages: A markdown string or an iterable of per-page markdown strings.
+
+    Returns:
+        See `MarkdownStructureParser.close`.
+    """
+    parser = MarkdownStructureParser()
+    if isinstance(pages, str):
+        pages = [pages]
+    for page in pages:
+        parser.feed(page)
+    return parser.close()
+
+
+def _section_score(section: dict) -> float:
+    text = section["text"]
+    if not text:
+        return 0.0
+    head = (section["heading"] + " " + text[:400]).lower()
+    keywords = sum(1 for k in _KEYWORDS if k in head)
+    digits = len(_NUMBER_RE.findall(text))
+    density = (section["fields"] * 40 + keywords * 25 + min(digits, 200)) / (len(text) + 50)
+    return density + section["tables"] * 0.2
+
+
+def select_sections(structure: dict, budget: int = 4000) -> str:
+    """
+    Pick the most informative sections that fit in `budget` characters and
+    return them in document order (key/value-dense and table sections first,
+    boilerplate last). Sections larger than the remaining budget are cut.
+    """
+    sections = structure["sections"]
+    ranked = sorted(range(len(sections)), key=lambda i: -_section_score(sections[i]))
+
+    chosen, used = {}, 0
+    for i in ranked:
+        s = sections[i]
+        block = (f"{'#' * s['level']} {s['heading']}\n" if s["heading"] else "") + s["text"]
+        remaining = budget - used
+        if remaining <= 80:
+            break
+        if len(block) > remaining:
+            block = block[:remaining - 1] + "…"
+        chosen[i] = block
+        used += len(block) + 2
+    return "\n\n".join(chosen[i] for i in sorted(chosen))
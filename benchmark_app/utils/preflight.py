@@ -0,0 +1,231 @@
+"""
+Local pre-flight inspection of documents — before any network call.
+
+Sniffs the real format from magic bytes (not the extension), reads page
+count and pixel dimensions from the file headers without decoding the
+image, flags corrupt / truncated / encrypted PDFs, computes the content
+hash once, and checks every service's size / page / dimension limits.
+Invalid files are rejected in milliseconds instead of after a blob upload
+and a submit round trip; the metadata also feeds batch scheduling.
+"""
+
+import hashlib
+import re
+import struct
+
+from config import SERVICE_LIMITS
+
+# ─── Magic bytes → (format, MIME type) ─────────────────────────────────
+_MAGIC = [
+    (b"%PDF-", "pdf", "application/pdf"),
+    (b"\xff\xd8\xff", "jpeg", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "png", "image/png"),
+    (b"II*\x00", "tiff", "image/tiff"),
+    (b"MM\x00*", "tiff", "image/tiff"),
+    (b"BM", "bmp", "image/bmp"),
+    (b"GIF8", "gif", "image/gif"),
+    (b"PK\x03\x04", "zip", "application/zip"),
+]
+
+_PDF_COUNT_RE = re.compile(rb"/Type\s*/Pages\b[^>]*?/Count\s+(\d+)|/Count\s+(\d+)[^>]*?/Type\s*/Pages\b", re.DOTALL)
+_PDF_PAGE_RE = re.compile(rb"/Type\s*/Page\b(?!s)")
+
+
+def sniff_format(data: bytes) -> tuple[str, str]:
+    """(format, mime) from the leading bytes; ("unknown", octet-stream) otherwise."""
+    head = bytes(data[:16])
+    # Some PDFs carry junk before the header; the spec allows it within 1 KB
+    if b"%PDF-" in bytes(data[:1024]):
+        return "pdf", "application/pdf"
+    for magic, fmt, mime in _MAGIC:
+        if head.startswith(magic):
+            return fmt, mime
+    if head[4:8] == b"ftyp":
+        return "heif", "image/heif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp", "image/webp"
+    return "unknown", "application/octet-stream"
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# Header readers (no full decode)
+# ═══════════════════════════════════════════════════════════════════════
+def _png_info(data: bytes) -> dict:
+    if len(data) < 24 or data[12:16] != b"IHDR":
+        return {"errors": ["PNG header truncated or corrupt"]}
+    width, height = struct.unpack(">II", data[16:24])
+    return {"width": width, "height": height, "pages": 1}
+
+
+def _jpeg_info(data: bytes) -> dict:
+    i, n = 2, len(data)
+    while i + 9 < n:
+        if data[i] != 0xFF:
+            i += 1
+            continue
+        marker = data[i + 1]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7 or marker == 0xFF:
+            i += 1 if marker == 0xFF else 2
+            continue
+        seg_len = struct.unpack(">H", data[i + 2:i + 4])[0]
+        # SOF0..SOF15 except DHT (C4), JPG (C8) and DAC (CC)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            info = {"width": width, "height": height, "pages": 1}
+            if not data.rstrip(b"\x00").endswith(b"\xff\xd9"):
+                info["warnings"] = ["JPEG end marker missing (file may be truncated)"]
+            return info
+        if marker == 0xDA:      # start of scan without a frame header
+            break
+        i += 2 + seg_len
+    return {"errors": ["JPEG frame header not found (corrupt file)"]}
+
+
+def _bmp_info(data: bytes) -> dict:
+    if len(data) < 26:
+        return {"errors": ["BMP header truncated"]}
+    width, height = struct.unpack("<ii", data[18:26])
+    return {"width": abs(width), "height": abs(height), "pages": 1}
+
+
+def _tiff_info(data: bytes) -> dict:
+    if len(data) < 8:
+        return {"errors": ["TIFF header truncated"]}
+    endian = "<" if data[:2] == b"II" else ">"
+    offset = struct.unpack(endian + "I", data[4:8])[0]
+    pages, width, height = 0, None, None
+    seen = set()
+    while offset and offset + 2 <= len(data) and offset not in seen and pages < 10000:
+        seen.add(offset)
+        count = struct.unpack(endian + "H", data[offset:offset + 2])[0]
+        end = offset + 2 + count * 12
+        if end + 4 > len(data):
+            return {"pages": pages or None, "width": width, "height": height,
+                    "errors": ["TIFF directory truncated (corrupt file)"]}
+        if pages == 0:
+            for k in range(count):
+                entry = data[offset + 2 + k * 12: offset + 14 + k * 12]
+                tag, typ = struct.unpack(endian + "HH", entry[:4])
+                if tag in (256, 257):
+                    fmt = "H" if typ == 3 else "I"
+                    value = struct.unpack(endian + fmt, entry[8:8 + struct.calcsize(fmt)])[0]
+                    if tag == 256:
+                        width = value
+                    else:
+                        height = value
+        pages += 1
+        offset = struct.unpack(endian + "I", data[end:end + 4])[0]
+    return {"pages": pages, "width": width, "height": height}
+
+
+def _pdf_info(data: bytes) -> dict:
+    info = {"errors": [], "warnings": []}
+    tail = bytes(data[-2048:])
+    if b"%%EOF" not in tail:
+        info["errors"].append("PDF end-of-file marker missing (truncated or corrupt)")
+    if b"/Encrypt" in tail or b"/Encrypt" in bytes(data[-65536:]):
+        info["encrypted"] = True
+        info["errors"].append("PDF is encrypted / password-protected")
+
+    counts = [int(a or b) for a, b in _PDF_COUNT_RE.findall(data)]
+    if counts:
+        info["pages"] = max(counts)      # the root /Pages node holds the total
+    else:
+        leaves = len(_PDF_PAGE_RE.findall(data))
+        info["pages"] = leaves or None
+        if not leaves:
+            info["warnings"].append("page count unknown (compressed object streams)")
+    return info
+
+
+_READERS = {"png": _png_info, "jpeg": _jpeg_info, "bmp": _bmp_info,
+            "tiff": _tiff_info, "pdf": _pdf_info}
+_EXTENSIONS = {"jpeg": ("jpg", "jpeg"), "png": ("png",), "bmp": ("bmp",),
+               "tiff": ("tif", "tiff"), "pdf": ("pdf",)}
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# Public API
+# ═══════════════════════════════════════════════════════════════════════
+def inspect_document(file_bytes: bytes, filename: str) -> dict:
+    """
+    Inspect a document locally.
+
+    Returns:
+        {
+            "filename": str, "size_bytes": int, "format": str, "mime": str,
+            "pages": int | None, "width": int | None, "height": int | None,
+            "encrypted": bool, "sha256": str,
+            "errors": [str], "warnings": [str],
+            "accepted_by": {service: bool}, "rejections": {service: [str]},
+        }
+    """
+    fmt, mime = sniff_format(file_bytes)
+    info = {
+        "filename": filename,
+        "size_bytes": len(file_bytes),
+        "format": fmt,
+        "mime": mime,
+        "pages": None,
+        "width": None,
+        "height": None,
+        "encrypted": False,
+        "sha256": hashlib.sha256(file_bytes).hexdigest(),
+        "errors": [],
+        "warnings": [],
+    }
+    if not file_bytes:
+        info["errors"].append("empty file")
+    elif fmt in _READERS:
+        try:
+            details = _READERS[fmt](file_bytes)
+        except (struct.error, IndexError) as e:
+            details = {"errors": [f"{fmt.upper()} header unreadable: {e}"]}
+        info["errors"] += details.pop("errors", [])
+        info["warnings"] += details.pop("warnings", [])
+        info.update({k: v for k, v in details.items() if v is not None})
+    else:
+        info["errors"].append(f"unsupported format ({fmt})")
+
+    ext = filename.lower().rsplit(".", 1)[-1] if "." in filename else ""
+    if fmt in _READERS and ext and ext not in _EXTENSIONS.get(fmt, ()):
+        info["warnings"].append(f"extension .{ext} does not match content ({fmt})")
+
+    info["rejections"] = {svc: check_limits(info, svc) for svc in SERVICE_LIMITS}
+    info["accepted_by"] = {svc: not errs for svc, errs in info["rejections"].items()}
+    return info
+
+
+def image_size(file_bytes: bytes) -> tuple[int | None, int | None]:
+    """(width, height) from the image header, (None, None) for PDFs / unknown."""
+    fmt, _ = sniff_format(file_bytes)
+    if fmt == "pdf" or fmt not in _READERS:
+        return None, None
+    try:
+        details = _READERS[fmt](file_bytes)
+    except (struct.error, IndexError):
+        return None, None
+    return details.get("width"), details.get("height")
+
+
+def check_limits(info: dict, service: str) -> list[str]:
+    """Reasons `service` would reject this document (empty list = OK)."""
+    limits = SERVICE_LIMITS[service]
+    reasons = list(info["errors"])
+    if info["format"] in _READERS and info["format"] not in limits["formats"]:
+        reasons.append(f"format {info['format']} not supported")
+    if info["size_bytes"] > limits["max_bytes"]:
+        reasons.append(
+            f"{info['size_bytes'] / 1e6:.1f} MB exceeds {limits['max_bytes'] / 1e6:.0f} MB"
+        )
+    if info["pages"] and info["pages"] > limits["max_pages"]:
+        reasons.append(f"{info['pages']} pages exceeds {limits['max_pages']}")
+    for dim in ("width", "height"):
+        px = info.get(dim)
+        if px is None:
+            continue
+        if px < limits.get("min_px", 0):
+            reasons.append(f"{dim} {px}px below {limits['min_px']}px")
+        if px > limits.get("max_px", float("inf")):
+            reasons.append(f"{dim} {px}px above {limits['max_px']}px")
+    return reasons
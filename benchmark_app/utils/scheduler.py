@@ -0,0 +1,233 @@
+"""
+Size-aware batch scheduling.
+
+Documents are ordered by a cheap cost estimate taken from the pre-flight
+metadata (page count, bytes) instead of upload order:
+
+    fifo  — upload order (previous behaviour)
+    sjf   — shortest job first: minimizes mean completion time, a 300-page
+            PDF no longer delays every small invoice behind it
+    ljf   — longest job first: starts big documents early to shorten the
+            makespan of the whole batch
+
+With per-pipeline lanes each pipeline (or analyzer) drains its own queue with
+its own workers, so a slow pipeline never blocks a fast one. Jobs keep their
+original document index so results are reported in upload order, and the
+queueing delay of every job is logged. With `adaptive` the number of jobs a
+lane runs at once is an AIMD limit learned from latency and throttling
+(`utils/concurrency.py`) instead of a fixed worker count.
+"""
+
+import itertools
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from config import ADAPTIVE_CONCURRENCY, SCHEDULER_LANE_WORKERS, SCHEDULER_POLICY
+from utils.concurrency import classify_outcome, get_limiter
+
+log = logging.getLogger(__name__)
+
+POLICIES = {
+    "fifo": "Upload order",
+    "sjf": "Shortest job first (mean latency)",
+    "ljf": "Longest job first (makespan)",
+}
+
+# Relative weight of one page vs one MiB of payload in the cost estimate
+PAGE_COST = 1.0
+MIB_COST = 0.5
+
+
+def estimate_cost(meta: dict) -> float:
+    """Cheap size estimate from pre-flight metadata (pages dominate)."""
+    pages = meta.get("pages") or 1
+    return pages * PAGE_COST + meta.get("size_bytes", 0) / 2**20 * MIB_COST
+
+
+def order_key(policy: str, cost: float, seq: int) -> tuple:
+    if policy == "sjf":
+        return cost, seq
+    if policy == "ljf":
+        return -cost, seq
+    if policy == "fifo":
+        return seq, 0
+    raise ValueError(f"Unknown scheduling policy: {policy}")
+
+
+class Job:
+    __slots__ = ("doc_index", "name", "lane", "cost", "fn", "args", "kwargs",
+                 "future", "enqueued_at", "started_at", "finished_at")
+
+    def __init__(self, doc_index, name, lane, cost, fn, args, kwargs):
+        self.doc_index = doc_index
+        self.name = name
+        self.lane = lane
+        self.cost = cost
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def queue_delay(self) -> float | None:
+        return None if self.started_at is None else self.started_at - self.enqueued_at
+
+
+class BatchScheduler:
+    """
+    Priority queues + worker threads, one lane per pipeline (or one shared lane).
+
+    Usage:
+        sched = BatchScheduler(policy="sjf")
+        fut = sched.submit("cu", doc_index, filename, cost, svc.analyze, ...)
+        sched.start()          # enqueue everything first, then start
+        ...
+        sched.shutdown()
+    """
+
+    def __init__(self, policy: str = SCHEDULER_POLICY,
+                 workers_per_lane: int = SCHEDULER_LANE_WORKERS,
+                 lanes: bool = True,
+                 adaptive: bool = ADAPTIVE_CONCURRENCY,
+                 scope: str = ""):
+        order_key(policy, 0.0, 0)     # validate early
+        self.policy = policy
+        self.workers_per_lane = max(1, workers_per_lane)
+        self.lanes = lanes
+        self.adaptive = adaptive
+        self.scope = scope          # limiter name prefix (e.g. a batch phase)
+        self._limiters = {}         # lane → AdaptiveLimiter
+        self.jobs = []
+        self._queues = {}
+        self._threads = {}      # lane → worker threads
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def _queue(self, lane: str) -> queue.PriorityQueue:
+        lane = lane if self.lanes else "shared"
+        with self._lock:
+            if lane not in self._queues:
+                self._queues[lane] = queue.PriorityQueue()
+                if self._started:
+                    self._spawn(lane)
+            return self._queues[lane]
+
+    def submit(self, lane: str, doc_index: int, name: str, cost: float,
+               fn, *args, **kwargs) -> Future:
+        """Queue `fn(*args, **kwargs)` for document `doc_index` on `lane`."""
+        job = Job(doc_index, name, lane, cost, fn, args, kwargs)
+        seq = next(self._seq)
+        self.jobs.append(job)
+        self._queue(lane).put((order_key(self.policy, cost, seq), seq, job))
+        return job.future
+
+    def _lane_workers(self) -> int:
+        # One shared lane gets the workers every lane would have had
+        return self.workers_per_lane if self.lanes else self.workers_per_lane * 3
+
+    def _spawn(self, lane: str):
+        n = self._lane_workers()
+        limiter = None
+        if self.adaptive:
+            # Threads up to the ceiling; the limiter decides how many run
+            limiter = self._limiters[lane] = get_limiter(self.scope + lane, initial=n)
+            n = limiter.max_limit
+        for i in range(n):
+            t = threading.Thread(target=self._worker, args=(self._queues[lane], limiter),
+                                 name=f"lane-{lane}-{i}", daemon=True)
+            t.start()
+            self._threads.setdefault(lane, []).append(t)
+
+    def start(self):
+        """Start the workers (call after queueing the batch so ordering applies to all of it)."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            for lane in self._queues:
+                self._spawn(lane)
+
+    def _worker(self, q: queue.PriorityQueue, limiter=None):
+        while True:
+            if limiter:
+                limiter.acquire()
+            _, _, job = q.get()
+            if job is None:
+                if limiter:
+                    limiter.release()
+                return
+            job.started_at = time.monotonic()
+            log.info("⏱ %s | %s queued %.1fs (cost %.1f)",
+                     job.lane, job.name, job.queue_delay, job.cost)
+            if not job.future.set_running_or_notify_cancel():
+                job.finished_at = time.monotonic()
+                if limiter:
+                    limiter.release()
+                continue
+            token = limiter.begin() if limiter else None
+            try:
+                result = job.fn(*job.args, **job.kwargs)
+            except BaseException as e:
+                job.finished_at = time.monotonic()
+                if limiter:
+                    limiter.release(token, job.finished_at - job.started_at, job.cost,
+                                    classify_outcome(exc=e))
+                job.future.set_exception(e)
+            else:
+                job.finished_at = time.monotonic()
+                if limiter:
+                    limiter.release(token, job.finished_at - job.started_at, job.cost,
+                                    classify_outcome(result))
+                job.future.set_result(result)
+
+    def shutdown(self, wait: bool = True):
+        """Stop the workers once their queues are drained."""
+        with self._lock:
+            threads = {lane: list(ts) for lane, ts in self._threads.items()}
+            for lane, ts in threads.items():
+                for _ in ts:
+                    # Sorts after every real job
+                    self._queues[lane].put(((float("inf"),), next(self._seq), None))
+        if wait:
+            for ts in threads.values():
+                for t in ts:
+                    t.join()
+
+    def stats(self) -> list[dict]:
+        """Per-lane queueing delay and completion time (seconds since first enqueue)."""
+        if not self.jobs:
+            return []
+        t0 = min(j.enqueued_at for j in self.jobs)
+        rows = []
+        for lane in sorted({j.lane for j in self.jobs}):
+            done = [j for j in self.jobs if j.lane == lane and j.finished_at is not None]
+            if not done:
+                continue
+            limiter = self._limiters.get(lane if self.lanes else "shared")
+            limit = limiter.limit if limiter else self._lane_workers()
+            delays = sorted(j.queue_delay for j in done)
+            completions = sorted(j.finished_at - t0 for j in done)
+            rows.append({
+                "Lane": lane,
+                "Jobs": len(done),
+                "Mean queue delay (s)": round(sum(delays) / len(delays), 2),
+                "Max queue delay (s)": round(delays[-1], 2),
+                "Mean completion (s)": round(sum(completions) / len(completions), 2),
+                "p95 completion (s)": round(
+                    completions[min(len(completions) - 1, int(0.95 * len(completions)))], 2
+                ),
+                "Makespan (s)": round(completions[-1], 2),
+                "Concurrency limit": limit,
+            })
+        return rows
+
+    def limiter_names(self) -> list[str]:
+        """Names of the adaptive limiters used by this scheduler's lanes."""
+        return [lim.name for lim in self._limiters.values()]
@@ -0,0 +1,497 @@
+"""
+Ground-truth scoring for extracted fields.
+
+Loads labeled ground truth (JSON or CSV keyed by filename), normalizes
+amounts, currencies, dates and free text, then scores every pipeline's
+`fields` against it: per-field precision / recall and per-pipeline accuracy.
+Normalization is memoized so large batches only pay for each distinct
+value once.
+"""
+
+import csv
+import io
+import json
+import os
+import re
+from datetime import datetime
+from functools import lru_cache
+
+# ─── Matching thresholds ───────────────────────────────────────────────
+FUZZY_THRESHOLD = 0.85        # min similarity for free-text fields
+AMOUNT_TOLERANCE = 0.01       # absolute tolerance on normalized amounts
+LINE_ITEM_THRESHOLD = 0.6     # min description similarity to align a line item
+
+# ─── Canonical field names and the aliases each pipeline uses ──────────
+# Content Understanding, Document Intelligence and Mistral OCR all name the
+# same invoice fields differently; everything is mapped to the left column.
+FIELD_ALIASES = {
+    "InvoiceId": ["InvoiceId", "Invoice no", "Invoice number", "Invoice No."],
+    "InvoiceDate": ["InvoiceDate", "Date of issue", "Invoice date", "Date"],
+    "DueDate": ["DueDate", "Due date"],
+    "VendorName": ["VendorName", "Seller", "Vendor"],
+    "VendorTaxId": ["VendorTaxId"],
+    "CustomerName": ["CustomerName", "Client", "Customer", "Bill to"],
+    "CustomerTaxId": ["CustomerTaxId"],
+    "SubtotalAmount": ["SubtotalAmount", "SubTotal", "Subtotal", "Net worth"],
+    "TotalTaxAmount": ["TotalTaxAmount", "TotalTax", "VAT", "Tax"],
+    "TotalAmount": ["TotalAmount", "InvoiceTotal", "Total", "Gross worth"],
+    "AmountDue": ["AmountDue", "Amount due", "Balance due"],
+    "CurrencyCode": ["CurrencyCode", "Currency"],
+    "LineItems": ["LineItems", "Items"],
+}
+
+_CURRENCY_SYMBOLS = {
+    "$": "USD", "us$": "USD", "€": "EUR", "£": "GBP", "¥": "JPY",
+    "chf": "CHF", "dh": "MAD", "mad": "MAD",
+}
+
+_DATE_FORMATS = [
+    "%Y-%m-%d", "%m/%d/%Y", "%d/%m/%Y", "%d.%m.%Y", "%Y/%m/%d",
+    "%d-%m-%Y", "%m-%d-%Y", "%B %d, %Y", "%b %d, %Y", "%d %B %Y",
+    "%d %b %Y", "%m/%d/%y", "%d/%m/%y",
+]
+
+
+def _compact(name: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+_ALIAS_INDEX = {
+    _compact(alias): canonical
+    for canonical, aliases in FIELD_ALIASES.items()
+    for alias in aliases
+}
+
+
+@lru_cache(maxsize=4096)
+def canonical_field(name: str) -> str:
+    """Map a pipeline-specific field name to its canonical name."""
+    return _ALIAS_INDEX.get(_compact(name), name)
+
+
+def doc_key(filename: str) -> str:
+    """Key used to join results with ground truth (basename without extension)."""
+    return os.path.splitext(os.path.basename(str(filename)))[0].lower()
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# Normalization
+# ═══════════════════════════════════════════════════════════════════════
+@lru_cache(maxsize=65536)
+def normalize_text(value: str) -> str:
+    """Casefold, drop punctuation and collapse whitespace."""
+    text = re.sub(r"[^\w\s]", " ", value.casefold())
+    return " ".join(text.split())
+
+
+@lru_cache(maxsize=65536)
+def _parse_amount_str(value: str):
+    text = value.strip().lower()
+    currency = None
+    for symbol, code in _CURRENCY_SYMBOLS.items():
+        if symbol in text:
+            currency = code
+            text = text.replace(symbol, "")
+    m = re.search(r"\b([a-z]{3})\b", text)
+    if m:
+        currency = currency or m.group(1).upper()
+    digits = re.sub(r"[^\d,.\-]", "", text)
+    if not re.search(r"\d", digits):
+        return None, currency
+    # Decide which separator is the decimal one: the last of "," / "."
+    # followed by exactly 1-2 digits ("1.234,56" vs "1,234.56" vs "627,00").
+    last_sep = max(digits.rfind(","), digits.rfind("."))
+    if last_sep != -1 and len(digits) - last_sep - 1 in (1, 2):
+        whole = re.sub(r"[,.]", "", digits[:last_sep])
+        digits = f"{whole}.{digits[last_sep + 1:]}"
+    else:
+        digits = re.sub(r"[,.]", "", digits)
+    try:
+        return round(float(digits), 2), currency
+    except ValueError:
+        return None, currency
+
+
+def normalize_amount(value):
+    """
+    Normalize an amount to ``(float | None, currency_code | None)``.
+    Accepts numbers, strings ("6 204,19 $", "$1,234.56") and
+    Content Understanding style ``{"Amount": ..., "CurrencyCode": ...}`` dicts.
+    """
+    if isinstance(value, dict):
+        amount, currency = normalize_amount(value.get("Amount"))
+        code = value.get("CurrencyCode")
+        return amount, (normalize_currency(code) if code else currency)
+    if isinstance(value, bool) or value is None:
+        return None, None
+    if isinstance(value, (int, float)):
+        return round(float(value), 2), None
+    return _parse_amount_str(str(value))
+
+
+@lru_cache(maxsize=1024)
+def normalize_currency(value: str):
+    """Map a currency symbol or code to its ISO 4217 code."""
+    text = str(value).strip().lower()
+    if text in _CURRENCY_SYMBOLS:
+        return _CURRENCY_SYMBOLS[text]
+    return text.upper() if re.fullmatch(r"[a-z]{3}", text) else None
+
+
+@lru_cache(maxsize=65536)
+def normalize_date(value: str):
+    """Parse a date string in any common format and return it as ISO ``YYYY-MM-DD``."""
+    text = " ".join(str(value).replace(",", ", ").split()).strip()
+    text = text.replace(" ,", ",")
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date().isoformat()
+        except ValueError:
+            continue
+    m = re.match(r"(\d{4}-\d{2}-\d{2})", text)
+    return m.group(1) if m else None
+
+
+@lru_cache(maxsize=65536)
+def _bigrams(text: str) -> frozenset:
+    padded = f" {text} "
+    return frozenset(padded[i:i + 2] for i in range(len(padded) - 1))
+
+
+def similarity(a: str, b: str) -> float:
+    """
+    Fuzzy similarity between two normalized strings (0 → 1).
+    Dice coefficient over character bigrams: linear in the string length and
+    tolerant to OCR character errors, unlike difflib's quadratic matcher.
+    """
+    if a == b:
+        return 1.0
+    ga, gb = _bigrams(a), _bigrams(b)
+    if not ga or not gb:
+        return 0.0
+    return 2 * len(ga & gb) / (len(ga) + len(gb))
+
+
+@lru_cache(maxsize=4096)
+def _name_kind(field: str):
+    lname = field.lower()
+    if field == "LineItems":
+        return "items"
+    if lname.endswith("id"):
+        return "text"
+    if "currency" in lname:
+        return "currency"
+    if "date" in lname:
+        return "date"
+    if any(k in lname for k in ("amount", "total", "tax", "price", "balance", "subtotal")):
+        return "amount"
+    return None
+
+
+def _kind(field: str, value) -> str:
+    if isinstance(value, list):
+        return "items"
+    kind = _name_kind(field)
+    if kind:
+        return kind
+    if isinstance(value, dict) and "Amount" in value:
+        return "amount"
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return "amount"
+    return "text"
+
+
+def _to_text(value) -> str:
+    if isinstance(value, dict):
+        return " ".join(_to_text(v) for v in value.values())
+    if isinstance(value, list):
+        return " ".join(_to_text(v) for v in value)
+    return str(value)
+
+
+def values_match(field: str, predicted, expected) -> bool:
+    """Compare a predicted value with the ground truth for one field."""
+    kind = _kind(field, expected)
+    if kind == "items":
+        aligned = align_line_items(predicted, expected)
+        return bool(aligned) and aligned["matched"] == aligned["expected"] == aligned["predicted"]
+    if kind == "amount":
+        exp_amt, exp_cur = normalize_amount(expected)
+        pred_amt, pred_cur = normalize_amount(predicted)
+        if exp_amt is None:
+            # Label carries only a currency (e.g. {"CurrencyCode": "USD"})
+            return exp_cur is not None and exp_cur == pred_cur
+        if pred_amt is None:
+            return False
+        if exp_cur and pred_cur and exp_cur != pred_cur:
+            return False
+        return abs(exp_amt - pred_amt) <= AMOUNT_TOLERANCE
+    if kind == "currency":
+        _, pred_cur = normalize_amount(predicted) if isinstance(predicted, dict) else (None, None)
+        return normalize_currency(_to_text(expected)) == (
+            pred_cur or normalize_currency(_to_text(predicted))
+        )
+    if kind == "date":
+        exp_date = normalize_date(_to_text(expected))
+        if exp_date is not None:
+            return exp_date == normalize_date(_to_text(predicted))
+    return similarity(normalize_text(_to_text(predicted)),
+                      normalize_text(_to_text(expected))) >= FUZZY_THRESHOLD
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# Line items
+# ═══════════════════════════════════════════════════════════════════════
+def _item_description(item) -> str:
+    if isinstance(item, dict):
+        for key in ("Description", "description", "Item", "ProductCode"):
+            if item.get(key):
+                return normalize_text(_to_text(item[key]))
+    return normalize_text(_to_text(item))
+
+
+def align_line_items(predicted, expected) -> dict:
+    """
+    Greedily align predicted line items with expected ones by description
+    similarity, then check the remaining sub-fields of each aligned pair.
+
+    Returns:
+        {"expected": int, "predicted": int, "matched": int, "pairs": [(i_pred, i_exp), ...]}
+    """
+    predicted = predicted if isinstance(predicted, list) else []
+    expected = expected if isinstance(expected, list) else []
+    pred_desc = [_item_description(p) for p in predicted]
+    exp_desc = [_item_description(e) for e in expected]
+
+    # Exact description matches first; fuzzy-match only what is left over,
+    # which keeps the quadratic part small on well-extracted invoices.
+    used_pred, used_exp, pairs = set(), set(), []
+    exp_by_desc = {}
+    for j, ed in enumerate(exp_desc):
+        exp_by_desc.setdefault(ed, []).append(j)
+    for i, pd_ in enumerate(pred_desc):
+        if exp_by_desc.get(pd_):
+            j = exp_by_desc[pd_].pop(0)
+            used_pred.add(i)
+            used_exp.add(j)
+            pairs.append((i, j))
+
+    candidates = []
+    for i, pd_ in enumerate(pred_desc):
+        if i in used_pred:
+            continue
+        for j, ed in enumerate(exp_desc):
+            if j in used_exp:
+                continue
+            score = similarity(pd_, ed)
+            if score >= LINE_ITEM_THRESHOLD:
+                candidates.append((score, i, j))
+    candidates.sort(reverse=True)
+
+    for _, i, j in candidates:
+        if i in used_pred or j in used_exp:
+            continue
+        used_pred.add(i)
+        used_exp.add(j)
+        pairs.append((i, j))
+
+    matched = 0
+    for i, j in pairs:
+        exp_item, pred_item = expected[j], predicted[i]
+        if not isinstance(exp_item, dict) or not isinstance(pred_item, dict):
+            matched += 1
+            continue
+        ok = all(
+            key in pred_item and values_match(key, pred_item[key], val)
+            for key, val in exp_item.items()
+            if key.lower() != "description" and val not in (None, "")
+        )
+        matched += ok
+    return {
+        "expected": len(expected),
+        "predicted": len(predicted),
+        "matched": matched,
+        "pairs": sorted(pairs),
+    }
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# Ground truth loading
+# ═══════════════════════════════════════════════════════════════════════
+def parse_ground_truth(text: str, fmt: str = "json") -> dict:
+    """
+    Parse ground-truth labels.
+
+    JSON: ``{filename: {field: value}}`` or a list of objects with a
+    ``filename`` / ``document`` key. CSV: one row per document with a
+    ``filename`` column; cells holding JSON (e.g. ``LineItems``) are decoded.
+
+    Returns:
+        { doc_key: { canonical_field: value, ... }, ... }
+    """
+    if fmt == "csv":
+        rows = list(csv.DictReader(io.StringIO(text)))
+    else:
+        data = json.loads(text)
+        if isinstance(data, dict):
+            rows = [{"filename": k, **v} for k, v in data.items()]
+        else:
+            rows = data
+
+    truth = {}
+    for row in rows:
+        row = dict(row)
+        name = row.pop("filename", None) or row.pop("document", None)
+        if not name:
+            continue
+        labels = {}
+        for field, val in row.items():
+            if val is None or val == "":
+                continue
+            if isinstance(val, str) and val[:1] in "[{":
+                try:
+                    val = json.loads(val)
+                except ValueError:
+                    pass
+            labels[canonical_field(field)] = val
+        truth[doc_key(name)] = labels
+    return truth
+
+
+def load_ground_truth(path: str) -> dict:
+    """Load ground truth from a ``.json`` or ``.csv`` file."""
+    fmt = "csv" if path.lower().endswith(".csv") else "json"
+    with open(path, encoding="utf-8") as f:
+        return parse_ground_truth(f.read(), fmt)
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# Scoring
+# ═══════════════════════════════════════════════════════════════════════
+def score_document(fields: dict, truth: dict) -> dict:
+    """
+    Score one pipeline's extracted fields against one document's labels.
+
+    Returns:
+        { canonical_field: "tp" | "fp" | "fn" | "fp+fn" }
+        "fp+fn" means a value was predicted but it is wrong.
+    """
+    predicted = {}
+    for name, val in (fields or {}).items():
+        predicted.setdefault(canonical_field(name), val)
+
+    outcome = {}
+    for field, expected in truth.items():
+        if field not in predicted:
+            outcome[field] = "fn"
+        elif values_match(field, predicted[field], expected):
+            outcome[field] = "tp"
+        else:
+            outcome[field] = "fp+fn"
+    for field in predicted:
+        if field not in truth and field in FIELD_ALIASES:
+            outcome[field] = "fp"
+    return outcome
+
+
+def score_results(all_results: list[dict], truth: dict) -> dict:
+    """
+    Score a batch of results against ground truth.
+
+    Args:
+        all_results: List of {filename: str, results: {pipeline: result_dict}}
+        truth: Output of `load_ground_truth` / `parse_ground_truth`.
+
+    Returns:
+        { pipeline: {
+            "documents": int, "accuracy": float,
+            "fields": { field: {"tp", "fp", "fn", "precision", "recall"} },
+        } }
+    """
+    counters = {}
+    for doc in all_results:
+        labels = truth.get(doc_key(doc.get("filename", "")))
+        if not labels:
+            continue
+        for pipeline, res in doc.get("results", {}).items():
+            c = counters.setdefault(
+                pipeline, {"documents": 0, "correct": 0, "labeled": 0, "fields": {}}
+            )
+            c["documents"] += 1
+            c["labeled"] += len(labels)
+            fields = res.get("fields", {}) if res else {}
+            for field, result in score_document(fields, labels).items():
+                f = c["fields"].setdefault(field, {"tp": 0, "fp": 0, "fn": 0})
+                if result == "tp":
+                    f["tp"] += 1
+                    c["correct"] += 1
+                if "fp" in result:
+                    f["fp"] += 1
+                if "fn" in result:
+                    f["fn"] += 1
+
+    scores = {}
+    for pipeline, c in counters.items():
+        per_field = {}
+        for field, f in sorted(c["fields"].items()):
+            predicted = f["tp"] + f["fp"]
+            relevant = f["tp"] + f["fn"]
+            per_field[field] = {
+                **f,
+                "precision": round(f["tp"] / predicted, 4) if predicted else None,
+                "recall": round(f["tp"] / relevant, 4) if relevant else None,
+            }
+        scores[pipeline] = {
+            "documents": c["documents"],
+            "accuracy": round(c["correct"] / c["labeled"], 4) if c["labeled"] else None,
+            "fields": per_field,
+        }
+    return scores
+
+
+def build_efficiency_table(scores: dict, summary: dict,
+                           cost_per_doc: dict | None = None) -> list[dict]:
+    """
+    Join accuracy scores with latency (and optionally cost) per pipeline.
+
+    Args:
+        scores: Output of `score_results`.
+        summary: Output of `compute_summary_stats` (provides ``avg_time_s``
+                 and ``avg_cost_usd``).
+        cost_per_doc: Optional ``{pipeline: usd_per_document}`` overriding
+                      the estimated cost from the summary.
+
+    Returns:
+        List of dicts suitable for display in a Streamlit dataframe.
+    """
+    rows = []
+    for pipeline, s in scores.items():
+        acc = s.get("accuracy")
+        avg_time = (summary.get(pipeline) or {}).get("avg_time_s") or 0
+        cost = (cost_per_doc or {}).get(pipeline, (summary.get(pipeline) or {}).get("avg_cost_usd"))
+        cost = cost if isinstance(cost, (int, float)) else None
+        rows.append({
+            "Pipeline": pipeline,
+            "Documents": s["documents"],
+            "Accuracy": acc,
+            "Avg Time (s)": avg_time,
+            "Accuracy / s": round(acc / avg_time, 4) if acc is not None and avg_time else "N/A",
+            "Cost / Doc ($)": cost if cost is not None else "N/A",
+            "Accuracy / $": round(acc / cost, 2) if acc is not None and cost else "N/A",
+        })
+    return rows
+
+
+def build_field_score_table(scores: dict) -> list[dict]:
+    """Flatten per-field precision / recall into rows for display."""
+    rows = []
+    for pipeline, s in scores.items():
+        for field, f in s["fields"].items():
+            rows.append({
+                "Pipeline": pipeline,
+                "Field": field,
+                "Precision": f["precision"] if f["precision"] is not None else "N/A",
+                "Recall": f["recall"] if f["recall"] is not None else "N/A",
+                "TP": f["tp"], "FP": f["fp"], "FN": f["fn"],
+            })
+    return rows
@@ -0,0 +1,214 @@
+"""
+Full-text search across processed documents and pipelines (SQLite FTS5).
+
+Every result is indexed as it completes: one posting row per extracted
+field (under its canonical name from `utils.scoring`, so `VendorName`
+finds the CU field, DI's `VendorName` and Mistral's "Seller") plus one for
+the markdown. Re-indexing a (document, pipeline, analyzer) replaces its
+rows. FTS5 keeps the postings compressed on disk and answers in
+milliseconds; row ids are ``doc id × MAX_FIELDS + field number`` so a
+document's rows are replaced by rowid range, without a scan.
+
+Query syntax — clauses are ANDed at document level:
+
+    acme                 word anywhere (markdown or any field)
+    "PO 4711"            phrase
+    inv*                 prefix
+    VendorName:acme      word / phrase / prefix within one field (aliases
+    vendor:"Kirby and"   resolve to the canonical name; `markdown:` too)
+    pipeline:cu          only these pipelines (repeatable: cu, di, mistral)
+    analyzer:prebuilt-invoice
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from utils.scoring import canonical_field
+
+MAX_FIELDS = 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    id         INTEGER PRIMARY KEY,
+    document   TEXT NOT NULL,
+    pipeline   TEXT NOT NULL,
+    analyzer   TEXT NOT NULL DEFAULT '',
+    source     TEXT,
+    indexed_at REAL NOT NULL,
+    UNIQUE (document, pipeline, analyzer)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS postings USING fts5(
+    field, text, tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+_CLAUSE_RE = re.compile(r'(?:(?P<scope>[\w.-]+):)?(?:"(?P<phrase>[^"]*)"|(?P<term>[^\s"]+))')
+_FILTERS = ("pipeline", "analyzer")
+
+
+class QueryError(ValueError):
+    """A search query without any searchable clause."""
+
+
+def field_text(value) -> str:
+    """Searchable text of a field value (nested objects / arrays flattened)."""
+    if value is None:
+        return ""
+    if isinstance(value, dict):
+        return " ".join(filter(None, map(field_text, value.values())))
+    if isinstance(value, list):
+        return " ".join(filter(None, map(field_text, value)))
+    return str(value)
+
+
+def _quote(text: str) -> str:
+    return '"' + text.replace('"', '""') + '"'
+
+
+def parse_query(query: str) -> tuple[list[str], dict]:
+    """Query → (FTS5 expression per clause, {"pipeline": [...], "analyzer": [...]})."""
+    clauses, filters = [], {k: [] for k in _FILTERS}
+    for m in _CLAUSE_RE.finditer(query or ""):
+        scope, phrase, term = m.group("scope"), m.group("phrase"), m.group("term")
+        if scope and scope.lower() in _FILTERS:
+            filters[scope.lower()].append(phrase if phrase is not None else term)
+            continue
+        if phrase is not None:
+            if not phrase.strip():
+                continue
+            match = _quote(phrase)
+        elif term.endswith("*") and len(term) > 1:
+            match = _quote(term[:-1]) + "*"
+        else:
+            match = _quote(term)
+        if scope:
+            name = "markdown" if scope.lower() == "markdown" else canonical_field(scope)
+            clauses.append(f"(field : {_quote(name)} AND text : {match})")
+        else:
+            clauses.append(f"text : {match}")
+    return clauses, filters
+
+
+class SearchIndex:
+    """Incremental full-text index backed by one SQLite file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=10000")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ── Writes ──────────────────────────────────────────────────────────
+    def add(self, document: str, pipeline: str, markdown: str = "", fields: dict | None = None,
+            analyzer: str = "", source: str | None = None) -> int:
+        """Index (or re-index) one result; returns the number of posting rows."""
+        rows = [("markdown", markdown)] if markdown else []
+        for name, value in (fields or {}).items():
+            text = field_text(value)
+            if text:
+                rows.append((canonical_field(name), text))
+        rows = rows[:MAX_FIELDS]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id FROM docs WHERE document = ? AND pipeline = ? AND analyzer = ?",
+                    (document, pipeline, analyzer),
+                ).fetchone()
+                if row:
+                    doc_id = row["id"]
+                    self._conn.execute("DELETE FROM postings WHERE rowid BETWEEN ? AND ?",
+                                       (doc_id * MAX_FIELDS, doc_id * MAX_FIELDS + MAX_FIELDS - 1))
+                    self._conn.execute("UPDATE docs SET source = ?, indexed_at = ? WHERE id = ?",
+                                       (source, time.time(), doc_id))
+                else:
+                    doc_id = self._conn.execute(
+                        "INSERT INTO docs (document, pipeline, analyzer, source, indexed_at) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (document, pipeline, analyzer, source, time.time()),
+                    ).lastrowid
+                self._conn.executemany(
+                    "INSERT INTO postings (rowid, field, text) VALUES (?, ?, ?)",
+                    [(doc_id * MAX_FIELDS + n, f, t) for n, (f, t) in enumerate(rows)],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(rows)
+
+    def optimize(self):
+        """Merge the FTS5 segments (smaller file, faster queries) after a large batch."""
+        with self._lock:
+            self._conn.execute("INSERT INTO postings (postings) VALUES ('optimize')")
+
+    # ── Reads ───────────────────────────────────────────────────────────
+    def search(self, query: str, pipelines: list[str] | None = None,
+               analyzers: list[str] | None = None, limit: int = 50) -> list[dict]:
+        """
+        Documents matching every clause of `query`, best first (BM25), with
+        the best-matching field and a snippet.
+        """
+        clauses, filters = parse_query(query)
+        if not clauses:
+            raise QueryError("query has no search terms")
+        pipelines = list(pipelines or []) + filters["pipeline"]
+        analyzers = list(analyzers or []) + filters["analyzer"]
+
+        # `rank` (BM25) rather than bm25(): FTS5 refuses auxiliary functions in aggregates
+        per_clause = " UNION ALL ".join(
+            "SELECT rowid / ? AS doc_id, MIN(rank) AS score "
+            "FROM postings WHERE postings MATCH ? GROUP BY doc_id"
+            for _ in clauses
+        )
+        where, params = [], [p for c in clauses for p in (MAX_FIELDS, c)]
+        params.append(len(clauses))
+        if pipelines:
+            where.append(f"d.pipeline IN ({', '.join('?' * len(pipelines))})")
+            params += pipelines
+        if analyzers:
+            where.append(f"d.analyzer IN ({', '.join('?' * len(analyzers))})")
+            params += analyzers
+        sql = (
+            f"SELECT d.id, d.document, d.pipeline, d.analyzer, d.source, s.score "
+            f"FROM (SELECT doc_id, SUM(score) AS score FROM ({per_clause}) "
+            f"      GROUP BY doc_id HAVING COUNT(*) = ?) s "
+            f"JOIN docs d ON d.id = s.doc_id "
+            f"{'WHERE ' + ' AND '.join(where) if where else ''} "
+            f"ORDER BY s.score LIMIT ?"
+        )
+        params.append(limit)
+        with self._lock:
+            hits = [dict(r) for r in self._conn.execute(sql, params)]
+            for hit in hits:
+                best = self._conn.execute(
+                    "SELECT field, snippet(postings, 1, '[', ']', '…', 12) AS snippet "
+                    "FROM postings WHERE postings MATCH ? AND rowid BETWEEN ? AND ? "
+                    "ORDER BY rank LIMIT 1",
+                    (clauses[0], hit["id"] * MAX_FIELDS, hit["id"] * MAX_FIELDS + MAX_FIELDS - 1),
+                ).fetchone()
+                hit["field"], hit["snippet"] = (best["field"], best["snippet"]) if best else ("", "")
+                hit["score"] = round(-hit["score"], 3)
+                del hit["id"]
+        return hits
+
+    def stats(self) -> dict:
+        with self._lock:
+            docs = self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+            by_pipeline = dict(self._conn.execute(
+                "SELECT pipeline, COUNT(*) FROM docs GROUP BY pipeline").fetchall())
+            rows = self._conn.execute("SELECT COUNT(*) FROM postings").fetchone()[0]
+        size = sum(os.path.getsize(p) for p in (self.path, self.path + "-wal") if os.path.exists(p))
+        return {"documents": docs, "by_pipeline": by_pipeline, "posting_rows": rows,
+                "size_mb": round(size / 1024 / 1024, 2)}
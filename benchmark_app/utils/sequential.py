@@ -0,0 +1,244 @@
+"""
+Sequential (early-stopping) comparison of pipelines on a document sample.
+
+Instead of running every pipeline on every document, documents are drawn at
+random — stratified by size or type so the sample keeps the corpus mix —
+and after every round of results the comparison is looked at again:
+
+    per pipeline   p50 / p90 latency and mean fields extracted, with CIs
+    per pair       difference in p50 / p90 latency and in fields extracted,
+                   paired on the documents both pipelines completed
+
+Standard errors come from a bootstrap that resamples documents within their
+stratum (strata with fewer than `MIN_STRATUM_ROWS` documents are merged into
+a neighbour first: a one-document stratum has no variance to resample);
+intervals are ``estimate ± z·SE`` (normal, so very high confidence levels
+stay meaningful with a modest number of resamples).
+
+A comparison is settled when it has at least `min_pairs` paired documents, a
+non-zero standard error, and its interval excludes zero (one pipeline is
+better) or lies inside ±margin (practically equivalent). Looking again after
+every round would inflate the error rate, so decisions use a stricter level
+than the reported intervals: the error budget `alpha` is spent as
+``alpha · t²`` over the sample fraction ``t = n / n_max`` (a power-family
+alpha-spending function, conservative early on) and split across the
+comparisons (Bonferroni). The run stops once every comparison is settled.
+"""
+
+import itertools
+import math
+import random
+from statistics import NormalDist
+
+# metric → (result key, percentile or None for the mean, what winning means)
+METRICS = {
+    "p50_latency_s": ("time_seconds", 50, "faster"),
+    "p90_latency_s": ("time_seconds", 90, "faster"),
+    "fields_extracted": ("fields_with_values", None, "more fields"),
+}
+
+
+MIN_STRATUM_ROWS = 2
+_SIZE_ORDER = {"small": 0, "medium": 1, "large": 2}
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Linear-interpolated percentile (`q` in 0–100) of a non-empty list."""
+    s = sorted(values)
+    pos = (len(s) - 1) * q / 100
+    lo = math.floor(pos)
+    hi = min(lo + 1, len(s) - 1)
+    return s[lo] + (s[hi] - s[lo]) * (pos - lo)
+
+
+def _mean(values: list[float]) -> float:
+    return sum(values) / len(values)
+
+
+def _stat(q: float | None):
+    return _mean if q is None else (lambda values: percentile(values, q))
+
+
+def size_strata(costs: list[float], buckets: int = 3) -> list[str]:
+    """Size bucket per document (quantiles of the cost estimate): small / medium / large."""
+    names = ["small", "medium", "large"] if buckets == 3 else [f"q{i + 1}" for i in range(buckets)]
+    order = sorted(range(len(costs)), key=costs.__getitem__)
+    labels = [""] * len(costs)
+    for rank, i in enumerate(order):
+        labels[i] = names[min(rank * buckets // max(len(costs), 1), buckets - 1)]
+    return labels
+
+
+class StratifiedSampler:
+    """Draws items at random without replacement, keeping each stratum's share."""
+
+    def __init__(self, items: list, strata: list[str], seed: int | None = None):
+        self._rng = random.Random(seed)
+        self._pools = {}
+        for item, stratum in zip(items, strata):
+            self._pools.setdefault(stratum, []).append(item)
+        for pool in self._pools.values():
+            self._rng.shuffle(pool)
+        self.shares = {s: len(p) / len(items) for s, p in self._pools.items()} if items else {}
+        self.drawn = {s: 0 for s in self._pools}
+
+    def __len__(self) -> int:
+        return sum(len(p) for p in self._pools.values())
+
+    def draw(self, k: int) -> list[tuple[str, object]]:
+        """Up to `k` (stratum, item), each from the stratum furthest below its share."""
+        out = []
+        for _ in range(k):
+            open_strata = [s for s, p in self._pools.items() if p]
+            if not open_strata:
+                break
+            total = sum(self.drawn.values()) + 1
+            stratum = max(open_strata, key=lambda s: (self.shares[s] * total - self.drawn[s], self.shares[s]))
+            self.drawn[stratum] += 1
+            out.append((stratum, self._pools[stratum].pop()))
+        return out
+
+
+def merge_strata(groups: dict[str, list]) -> list[list]:
+    """
+    Strata as resampling groups, each merged into its smaller neighbour (size
+    order, else name order) until every group has `MIN_STRATUM_ROWS` rows.
+    A single group left means an unstratified resample.
+    """
+    keys = sorted(groups, key=lambda k: (_SIZE_ORDER.get(k, len(_SIZE_ORDER)), k))
+    merged = [list(groups[k]) for k in keys]
+    while len(merged) > 1:
+        i = min(range(len(merged)), key=lambda j: len(merged[j]))
+        if len(merged[i]) >= MIN_STRATUM_ROWS:
+            break
+        neighbours = [j for j in (i - 1, i + 1) if 0 <= j < len(merged)]
+        j = min(neighbours, key=lambda j: len(merged[j]))
+        merged[j].extend(merged.pop(i))
+    return merged
+
+
+def bootstrap_se(rows: list, strata: list[str], stat, n_boot: int, rng: random.Random) -> float:
+    """Standard error of `stat(rows)` with documents resampled within their (merged) stratum."""
+    by_stratum = {}
+    for row, s in zip(rows, strata):
+        by_stratum.setdefault(s, []).append(row)
+    groups = merge_strata(by_stratum)
+    estimates = []
+    for _ in range(n_boot):
+        sample = [r for g in groups for r in rng.choices(g, k=len(g))]
+        estimates.append(stat(sample))
+    m = _mean(estimates)
+    return math.sqrt(sum((e - m) ** 2 for e in estimates) / max(len(estimates) - 1, 1))
+
+
+def interval(estimate: float, se: float, level: float) -> list[float]:
+    z = NormalDist().inv_cdf(0.5 + level / 2)
+    return [round(estimate - z * se, 4), round(estimate + z * se, 4)]
+
+
+def spent_alpha(alpha: float, t: float) -> float:
+    """Error budget spent by sample fraction `t` (power family, ρ = 2)."""
+    return alpha * min(max(t, 0.0), 1.0) ** 2
+
+
+class SequentialComparison:
+    """Accumulates per-document results and decides when the comparison is settled."""
+
+    def __init__(self, pipelines: list[str], n_max: int, alpha: float = 0.05,
+                 latency_margin: float = 0.5, fields_margin: float = 0.5,
+                 min_docs: int = 10, min_pairs: int = 10, n_boot: int = 500,
+                 seed: int | None = None):
+        self.pipelines = pipelines
+        self.n_max = max(n_max, 1)
+        self.alpha = alpha
+        self.margins = {"p50_latency_s": latency_margin, "p90_latency_s": latency_margin,
+                        "fields_extracted": fields_margin}
+        self.min_docs = min_docs
+        self.min_pairs = max(min_pairs, 2)
+        self.n_boot = n_boot
+        self._rng = random.Random(seed)
+        self.docs = []              # (document, stratum, {pipeline: result})
+        self.looks = []
+        self._spent = 0.0
+
+    def add(self, document: str, stratum: str, results: dict):
+        self.docs.append((document, stratum, results))
+
+    def _ok(self, res: dict | None) -> bool:
+        return bool(res) and res.get("status") in ("success", "partial")
+
+    def pairs(self) -> list[tuple[str, str]]:
+        return list(itertools.combinations(self.pipelines, 2))
+
+    def look(self) -> dict:
+        """Intervals for every pipeline and pair, and whether all pairs are settled."""
+        n = len(self.docs)
+        comparisons = len(self.pairs()) * len(METRICS)
+        spent = spent_alpha(self.alpha, n / self.n_max)
+        step_alpha, self._spent = max(spent - self._spent, 1e-12), spent
+        decision_level = 1 - step_alpha / max(comparisons, 1)
+
+        pipelines = {}
+        for p in self.pipelines:
+            ok = [(d[2][p], d[1]) for d in self.docs if self._ok(d[2].get(p))]
+            entry = {"sample_size": len(ok), "errors": sum(1 for d in self.docs if p in d[2]) - len(ok)}
+            for metric, (key, q, _) in METRICS.items():
+                values = [r.get(key) or 0 for r, _ in ok]
+                if len(values) < 2:
+                    continue
+                stat = _stat(q)
+                est = stat(values)
+                se = bootstrap_se(values, [s for _, s in ok], stat, self.n_boot, self._rng)
+                entry[metric] = {"value": round(est, 4), "ci": interval(est, se, 1 - self.alpha)}
+            pipelines[p] = entry
+
+        results, settled = [], n >= self.min_docs
+        for a, b in self.pairs():
+            both = [(d[2][a], d[2][b], d[1]) for d in self.docs
+                    if self._ok(d[2].get(a)) and self._ok(d[2].get(b))]
+            strata = [s for _, _, s in both]
+            for metric, (key, q, better) in METRICS.items():
+                row = {"comparison": f"{a} vs {b}", "metric": metric, "sample_size": len(both)}
+                if len(both) < self.min_pairs:
+                    row["verdict"] = "open"
+                    settled = False
+                    results.append(row)
+                    continue
+                stat = _stat(q)
+
+                def diff(sample, stat=stat, key=key):
+                    return stat([x.get(key) or 0 for x, _ in sample]) - stat([y.get(key) or 0 for _, y in sample])
+
+                pairs = [(x, y) for x, y, _ in both]
+                est = diff(pairs)
+                se = bootstrap_se(pairs, strata, diff, self.n_boot, self._rng)
+                lo, hi = interval(est, se, decision_level)
+                margin = self.margins[metric]
+                lower_wins = metric != "fields_extracted"
+                if se <= 1e-9 * max(1.0, abs(est)):
+                    # No observed variation (too few distinct documents): undecidable yet
+                    verdict = "open"
+                    settled = False
+                elif hi < 0:
+                    verdict = f"{a if lower_wins else b} {better}"
+                elif lo > 0:
+                    verdict = f"{b if lower_wins else a} {better}"
+                elif -margin <= lo and hi <= margin:
+                    verdict = f"equivalent (±{margin})"
+                else:
+                    verdict = "open"
+                    settled = False
+                row.update({
+                    "difference": round(est, 4),
+                    "ci": interval(est, se, 1 - self.alpha),
+                    "decision_ci": [lo, hi],
+                    "verdict": verdict,
+                })
+                results.append(row)
+
+        look = {"sample_size": n, "decision_level": round(decision_level, 6),
+                "settled": settled and bool(results), "pipelines": pipelines, "comparisons": results}
+        self.looks.append({"sample_size": n, "settled": look["settled"],
+                           "open": [f"{r['comparison']} {r['metric']}" for r in results
+                                    if r["verdict"] == "open"]})
+        return look
@@ -0,0 +1,85 @@
+"""
+Single-flight call coalescing.
+
+Concurrent calls with the same key share one in-flight execution and its
+result (or its exception). Optionally, successful results are kept for a
+short time so duplicates that arrive just after completion are also served
+without a new call.
+"""
+
+import threading
+import time
+
+from utils.deadline import Deadline, DeadlineExceeded
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Thread-safe single-flight group keyed by arbitrary hashable keys."""
+
+    def __init__(self, result_ttl: float = 0.0):
+        self.result_ttl = result_ttl
+        self._lock = threading.Lock()
+        self._calls = {}      # key -> _Call in flight
+        self._done = {}       # key -> (expires_at, result)
+        self.stats = {"executed": 0, "shared": 0}
+
+    def do(self, key, fn, deadline: Deadline | None = None):
+        """
+        Run `fn()` once per key among concurrent callers. A caller that
+        waits on another's execution gives up when its own `deadline`
+        expires (DeadlineExceeded); the execution carries on for the others.
+
+        Returns:
+            (result, shared) — `shared` is True when the result came from
+            another caller's execution (in flight or recently completed).
+        """
+        now = time.monotonic()
+        with self._lock:
+            cached = self._done.get(key)
+            if cached and cached[0] > now:
+                self.stats["shared"] += 1
+                return cached[1], True
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.stats["executed"] += 1
+            else:
+                self.stats["shared"] += 1
+
+        if not leader:
+            if not call.event.wait(deadline.timeout() if deadline else None):
+                raise DeadlineExceeded(
+                    f"{deadline.name} deadline ({deadline.budget_s}s) exceeded waiting for a shared call"
+                )
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                if call.error is None and self.result_ttl > 0:
+                    self._prune(now)
+                    self._done[key] = (time.monotonic() + self.result_ttl, call.result)
+            call.event.set()
+        return call.result, False
+
+    def _prune(self, now: float):
+        expired = [k for k, (exp, _) in self._done.items() if exp <= now]
+        for k in expired:
+            del self._done[k]
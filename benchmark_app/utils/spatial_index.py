@@ -0,0 +1,296 @@
+"""
+Per-page spatial index over OCR words and lines.
+
+Layout / read / invoice results carry hundreds to thousands of words per
+page, each with a polygon (`source: "D(page,x1,y1,…,x4,y4)"` in Content
+Understanding, `polygon: [x1, y1, …]` in Document Intelligence). Finding the
+text in a region, or the words behind a field, used to mean scanning the raw
+JSON. `SpatialIndex.from_result` walks it once and keeps, per page:
+
+    boxes     array('d')  x0, y0, x1, y1 per item (axis-aligned polygon bounds)
+    offsets   array('l')  span offset / length per item (for field spans)
+    grid      uniform cells of ~`ITEMS_PER_CELL` items, CSR-packed:
+              cell → starts[cell]:starts[cell + 1] in `members` (array('l'))
+
+Box queries only visit the overlapping cells, nearest-neighbour queries
+grow rings of cells around the point, and span lookups bisect the
+offset-sorted words — all well under a millisecond on a dense page.
+Coordinates are in the page's own unit (pixels for images, inches for PDFs).
+"""
+
+import math
+import re
+from array import array
+from bisect import bisect_right
+from typing import NamedTuple
+
+ITEMS_PER_CELL = 4
+
+_SOURCE_RE = re.compile(r"D\((\d+),([^)]*)\)")
+
+
+class Word(NamedTuple):
+    page: int
+    text: str
+    box: tuple            # (x0, y0, x1, y1)
+    offset: int           # span offset in the markdown / content, -1 if unknown
+    confidence: float | None
+
+
+def parse_source(source: str) -> list[tuple[int, tuple]]:
+    """`D(page,x1,y1,…)` regions (several when joined by ';') → [(page, box)]."""
+    regions = []
+    for m in _SOURCE_RE.finditer(source or ""):
+        coords = [float(c) for c in m.group(2).split(",")]
+        if len(coords) >= 4:
+            regions.append((int(m.group(1)), _bounds(coords)))
+    return regions
+
+
+def _bounds(coords: list[float]) -> tuple:
+    xs, ys = coords[0::2], coords[1::2]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def _item_box(item: dict, page_number: int) -> tuple | None:
+    if item.get("polygon"):
+        return _bounds(item["polygon"])
+    for page, box in parse_source(item.get("source", "")):
+        if page == page_number:
+            return box
+    return None
+
+
+def _box_distance(box, x: float, y: float) -> float:
+    dx = max(box[0] - x, 0.0, x - box[2])
+    dy = max(box[1] - y, 0.0, y - box[3])
+    return math.hypot(dx, dy)
+
+
+class _BoxGrid:
+    """Array-backed uniform grid over the bounding boxes of one page's items."""
+
+    __slots__ = ("texts", "boxes", "offsets", "lengths", "confidences",
+                 "cell", "cols", "rows", "starts", "members")
+
+    def __init__(self, items: list[dict], page_number: int, width: float, height: float):
+        self.texts = []
+        self.boxes = array("d")
+        self.offsets = array("l")
+        self.lengths = array("l")
+        self.confidences = []
+        for item in items:
+            box = _item_box(item, page_number)
+            if box is None:
+                continue
+            span = item.get("span") or (item.get("spans") or [{}])[0]
+            self.texts.append(item.get("content", ""))
+            self.boxes.extend(box)
+            self.offsets.append(span.get("offset", -1))
+            self.lengths.append(span.get("length", 0))
+            self.confidences.append(item.get("confidence"))
+
+        n = len(self.texts)
+        width = width or max(self.boxes[2::4], default=1.0)
+        height = height or max(self.boxes[3::4], default=1.0)
+        self.cell = max(math.sqrt(width * height * ITEMS_PER_CELL / max(n, 1)), 1e-6)
+        self.cols = max(1, math.ceil(width / self.cell))
+        self.rows = max(1, math.ceil(height / self.cell))
+
+        # CSR layout: count per cell, prefix sums, then fill
+        cells_of = [self._cells(self.boxes[i * 4:i * 4 + 4]) for i in range(n)]
+        counts = [0] * (self.cols * self.rows + 1)
+        for cells in cells_of:
+            for c in cells:
+                counts[c + 1] += 1
+        for c in range(1, len(counts)):
+            counts[c] += counts[c - 1]
+        self.starts = array("l", counts)
+        self.members = array("l", bytes(self.starts[-1] * self.starts.itemsize))
+        fill = list(counts[:-1])
+        for i, cells in enumerate(cells_of):
+            for c in cells:
+                self.members[fill[c]] = i
+                fill[c] += 1
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def _clamp(self, value: float, limit: int) -> int:
+        return min(limit - 1, max(0, int(value // self.cell)))
+
+    def _cells(self, box) -> list[int]:
+        c0, c1 = self._clamp(box[0], self.cols), self._clamp(box[2], self.cols)
+        r0, r1 = self._clamp(box[1], self.rows), self._clamp(box[3], self.rows)
+        return [r * self.cols + c for r in range(r0, r1 + 1) for c in range(c0, c1 + 1)]
+
+    def box(self, i: int) -> tuple:
+        return tuple(self.boxes[i * 4:i * 4 + 4])
+
+    def query(self, box, contained: bool = False) -> list[int]:
+        """Items intersecting (or fully inside) `box`, in index order."""
+        x0, y0, x1, y1 = box
+        hits = set()
+        for c in self._cells(box):
+            for i in self.members[self.starts[c]:self.starts[c + 1]]:
+                b = self.boxes[i * 4:i * 4 + 4]
+                if contained:
+                    if b[0] >= x0 and b[1] >= y0 and b[2] <= x1 and b[3] <= y1:
+                        hits.add(i)
+                elif b[0] <= x1 and b[2] >= x0 and b[1] <= y1 and b[3] >= y0:
+                    hits.add(i)
+        return sorted(hits)
+
+    def nearest(self, x: float, y: float, k: int = 5) -> list[tuple[float, int]]:
+        """`k` closest items to a point as (distance, index), closest first."""
+        if not self.texts:
+            return []
+        cx, cy = self._clamp(x, self.cols), self._clamp(y, self.rows)
+        best, seen = [], set()
+        for ring in range(max(self.cols, self.rows)):
+            for r in range(cy - ring, cy + ring + 1):
+                for c in range(cx - ring, cx + ring + 1):
+                    if not (0 <= r < self.rows and 0 <= c < self.cols):
+                        continue
+                    if max(abs(r - cy), abs(c - cx)) != ring:
+                        continue
+                    cell = r * self.cols + c
+                    for i in self.members[self.starts[cell]:self.starts[cell + 1]]:
+                        if i not in seen:
+                            seen.add(i)
+                            best.append((_box_distance(self.boxes[i * 4:i * 4 + 4], x, y), i))
+            # Anything outside this ring is at least `ring × cell` away
+            if len(best) >= k:
+                best.sort()
+                if best[k - 1][0] <= ring * self.cell:
+                    break
+        best.sort()
+        return best[:k]
+
+
+class PageIndex:
+    """Words and lines of one page."""
+
+    def __init__(self, page: dict):
+        self.number = page.get("pageNumber", 1)
+        self.width = page.get("width") or 0.0
+        self.height = page.get("height") or 0.0
+        self.words = _BoxGrid(page.get("words") or [], self.number, self.width, self.height)
+        self.lines = _BoxGrid(page.get("lines") or [], self.number, self.width, self.height)
+        # Word positions sorted by span offset, for span → words lookups
+        self.by_offset = sorted(range(len(self.words)), key=self.words.offsets.__getitem__)
+        self.sorted_offsets = array("l", (self.words.offsets[i] for i in self.by_offset))
+
+    def word(self, i: int) -> Word:
+        w = self.words
+        return Word(self.number, w.texts[i], w.box(i), w.offsets[i], w.confidences[i])
+
+
+class SpatialIndex:
+    """Spatial index over every page of one analysis result."""
+
+    def __init__(self, pages: list[dict], unit: str | None = None):
+        self.unit = unit
+        self.pages = {p.number: p for p in map(PageIndex, pages)}
+
+    @classmethod
+    def from_result(cls, raw: dict) -> "SpatialIndex":
+        """
+        Build from a Content Understanding raw result (``result.contents[]``)
+        or a Document Intelligence ``analyzeResult`` (``pages[]``).
+        """
+        if "result" in raw:
+            contents = raw["result"].get("contents") or []
+            pages = [p for block in contents for p in block.get("pages") or []]
+            unit = next((b.get("unit") for b in contents if b.get("unit")), None)
+            return cls(pages, unit)
+        analyze = raw.get("analyzeResult", raw)
+        pages = analyze.get("pages") or []
+        return cls(pages, next((p.get("unit") for p in pages if p.get("unit")), None))
+
+    def __len__(self) -> int:
+        return sum(len(p.words) for p in self.pages.values())
+
+    # ── Region queries ──────────────────────────────────────────────────
+    def words_in_box(self, page: int, box, contained: bool = False) -> list[Word]:
+        """Words intersecting (or, with `contained`, fully inside) `box`."""
+        p = self.pages.get(page)
+        return [p.word(i) for i in p.words.query(box, contained)] if p else []
+
+    def text_in_region(self, page: int, box, contained: bool = True) -> str:
+        """Text of the lines (else words) inside `box`, in reading order."""
+        p = self.pages.get(page)
+        if not p:
+            return ""
+        grid = p.lines if len(p.lines) else p.words
+        hits = grid.query(box, contained)
+        # Reading order: top to bottom by line band, then left to right
+        band = max(grid.cell / 4, 1e-6)
+        hits.sort(key=lambda i: (round(grid.boxes[i * 4 + 1] / band), grid.boxes[i * 4]))
+        return "\n".join(grid.texts[i] for i in hits) if grid is p.lines else " ".join(grid.texts[i] for i in hits)
+
+    def nearest_words(self, page: int, x: float, y: float, k: int = 5) -> list[tuple[float, Word]]:
+        """The `k` words closest to a point, as (distance, word)."""
+        p = self.pages.get(page)
+        return [(d, p.word(i)) for d, i in p.words.nearest(x, y, k)] if p else []
+
+    # ── Fields ──────────────────────────────────────────────────────────
+    def words_for_span(self, offset: int, length: int) -> list[Word]:
+        """Words whose span overlaps [offset, offset + length)."""
+        end = offset + length
+        out = []
+        for p in self.pages.values():
+            j = max(0, bisect_right(p.sorted_offsets, offset) - 1)
+            while j < len(p.by_offset) and p.sorted_offsets[j] < end:
+                i = p.by_offset[j]
+                if p.words.offsets[i] + p.words.lengths[i] > offset:
+                    out.append(p.word(i))
+                j += 1
+        return out
+
+    @staticmethod
+    def field_regions(field: dict) -> list[tuple[int, tuple]]:
+        """(page, box) of a field's own polygon(s), if the result has one."""
+        if field.get("polygon"):
+            return [(field.get("pageNumber", 1), _bounds(field["polygon"]))]
+        regions = parse_source(field.get("source", ""))
+        for region in field.get("boundingRegions") or []:
+            regions.append((region.get("pageNumber", 1), _bounds(region["polygon"])))
+        return regions
+
+    def field_words(self, field: dict, k: int = 5) -> list[Word]:
+        """
+        Words behind a field: by its spans, else the words inside its
+        polygon, else the `k` words nearest to the polygon's center.
+        """
+        words = [w for s in field.get("spans") or [] for w in self.words_for_span(s["offset"], s["length"])]
+        if words:
+            return words
+        for page, box in self.field_regions(field):
+            words += self.words_in_box(page, box)
+        if words:
+            return words
+        for page, (x0, y0, x1, y1) in self.field_regions(field):
+            words += [w for _, w in self.nearest_words(page, (x0 + x1) / 2, (y0 + y1) / 2, k)]
+        return words
+
+
+def field_locations(fields: dict, prefix: str = "") -> dict[str, list[tuple[int, tuple]]]:
+    """
+    {field path: [(page, box)]} for every field with a polygon, nested
+    objects / arrays flattened as ``Parent.Child`` / ``Parent[0].Child``.
+    """
+    out = {}
+    for name, field in (fields or {}).items():
+        if not isinstance(field, dict):
+            continue
+        path = f"{prefix}{name}"
+        regions = SpatialIndex.field_regions(field)
+        if regions:
+            out[path] = regions
+        if isinstance(field.get("valueObject"), dict):
+            out.update(field_locations(field["valueObject"], f"{path}."))
+        for n, item in enumerate(field.get("valueArray") or []):
+            if isinstance(item, dict):
+                out.update(field_locations({f"[{n}]": item}, path))
+    return out
@@ -0,0 +1,87 @@
+"""
+Streaming JSON request bodies with an inline base64 payload.
+
+The OCR and vision endpoints take the document as a
+``data:<mime>;base64,<...>`` URL inside a JSON body. Building that string in
+Python and letting `requests` serialize it again holds roughly three copies
+of the base64 text in memory before the first byte is sent.
+
+`StreamingJSONBody` instead serializes the JSON around a placeholder once,
+then yields: JSON prefix → base64 chunks encoded on the fly → JSON suffix.
+The exact length is known up front, so `requests` sends a Content-Length
+header and streams the chunks; memory stays constant in the document size.
+"""
+
+import base64
+import json
+import mmap
+import os
+
+# Marker replaced by the base64 payload; never produced by json.dumps itself
+PAYLOAD_PLACEHOLDER = "@@STREAMED_BASE64_PAYLOAD@@"
+
+# Raw bytes encoded per chunk — a multiple of 3 so chunks concatenate
+# into valid base64 without padding in the middle.
+CHUNK_SIZE = 3 * 64 * 1024
+
+
+def data_url(mime: str) -> str:
+    """Placeholder data URL to put in the request template."""
+    return f"data:{mime};base64,{PAYLOAD_PLACEHOLDER}"
+
+
+def b64_length(n: int) -> int:
+    """Length of the base64 encoding of `n` raw bytes."""
+    return 4 * ((n + 2) // 3)
+
+
+class StreamingJSONBody:
+    """
+    Re-iterable request body for `requests.post(data=...)`.
+
+    Args:
+        template: JSON-serializable body containing exactly one occurrence of
+                  `PAYLOAD_PLACEHOLDER` (see `data_url`).
+        source:   The raw document: bytes / memoryview, or a file path
+                  (memory-mapped, never read fully into memory).
+    """
+
+    def __init__(self, template: dict, source, chunk_size: int = CHUNK_SIZE):
+        encoded = json.dumps(template, ensure_ascii=False).encode("utf-8")
+        marker = PAYLOAD_PLACEHOLDER.encode("ascii")
+        if encoded.count(marker) != 1:
+            raise ValueError("template must contain the payload placeholder exactly once")
+        self.prefix, self.suffix = encoded.split(marker)
+        self.source = source
+        self.chunk_size = chunk_size - chunk_size % 3 or 3
+
+    def _source_size(self) -> int:
+        if isinstance(self.source, (str, os.PathLike)):
+            return os.path.getsize(self.source)
+        return memoryview(self.source).nbytes
+
+    def __len__(self) -> int:
+        return len(self.prefix) + b64_length(self._source_size()) + len(self.suffix)
+
+    def _chunks(self, view: memoryview):
+        for i in range(0, len(view), self.chunk_size):
+            yield base64.b64encode(view[i:i + self.chunk_size])
+
+    def __iter__(self):
+        yield self.prefix
+        if isinstance(self.source, (str, os.PathLike)):
+            with open(self.source, "rb") as f:
+                if os.fstat(f.fileno()).st_size:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        view = memoryview(mm)
+                        try:
+                            yield from self._chunks(view)
+                        finally:
+                            view.release()
+        else:
+            yield from self._chunks(memoryview(self.source).cast("B"))
+        yield self.suffix
+
+    def chunked(self):
+        """Plain generator (no length) — makes `requests` use chunked transfer."""
+        yield from self
@@ -0,0 +1,137 @@
+"""
+Token / page usage normalization and cost estimation.
+
+Every billable step of a pipeline becomes one *stage record*:
+
+    {
+        "stage": "cu_analyze" | "llm_describe" | "di_analyze" | "mistral_ocr" | …,
+        "pages": int,                 # pages billed by this stage
+        "page_meter": str | None,     # key in PRICE_TABLE["pages"]
+        "tokens": {model: {"input": int, "output": int}},
+        "image_tokens": int,          # part of the input tokens spent on images
+        "shared": bool,               # result reused from a coalesced call (not billed again)
+    }
+
+`summarize_usage` rolls the stage records of one result up into the
+normalized `usage` block (pages, prompt / completion / image tokens) with an
+estimated `cost_usd` from the configurable price table.
+"""
+
+import math
+import re
+
+from config import PRICE_TABLE
+
+# Content Understanding usage keys → page meters
+_CU_PAGE_METERS = {
+    "documentPagesStandard": "cu:standard",
+    "documentPagesBasic": "cu:basic",
+    "documentPagesMinimal": "cu:minimal",
+}
+_CU_TOKEN_RE = re.compile(r"^(.+)-(input|output)$")
+_DEPLOYMENT_RE = re.compile(r"/deployments/([^/?]+)")
+
+
+def stage_record(stage: str, pages: int = 0, page_meter: str | None = None,
+                 tokens: dict | None = None, image_tokens: int = 0,
+                 shared: bool = False) -> dict:
+    return {
+        "stage": stage,
+        "pages": pages,
+        "page_meter": page_meter,
+        "tokens": tokens or {},
+        "image_tokens": image_tokens,
+        "shared": shared,
+    }
+
+
+def cu_usage(raw: dict, share: float = 1.0) -> list[dict]:
+    """
+    Stage records from a Content Understanding result's ``usage`` block.
+    `share` splits the usage of a multi-input call across its documents.
+    """
+    usage = raw.get("usage") or {}
+    records = []
+    for key, meter in _CU_PAGE_METERS.items():
+        if usage.get(key):
+            pages = usage[key] * share if share != 1 else usage[key]
+            records.append(stage_record("cu_analyze", pages=pages, page_meter=meter))
+    tokens = {}
+    for key, n in (usage.get("tokens") or {}).items():
+        m = _CU_TOKEN_RE.match(key)
+        model, direction = (m.group(1), m.group(2)) if m else (key, "input")
+        tokens.setdefault(model, {"input": 0, "output": 0})[direction] += n * share
+    if usage.get("contextualizationTokens"):
+        tokens["contextualization"] = {"input": usage["contextualizationTokens"] * share, "output": 0}
+    if tokens:
+        records.append(stage_record("cu_analyze", tokens=tokens))
+    return records
+
+
+def chat_usage(response: dict, stage: str, endpoint: str = "", image_tokens: int = 0) -> dict:
+    """Stage record from a chat-completions response (OpenAI / Mistral shape)."""
+    usage = response.get("usage") or {}
+    model = (response.get("model") or "").strip()
+    if not model:
+        m = _DEPLOYMENT_RE.search(endpoint or "")
+        model = m.group(1) if m else "default"
+    return stage_record(stage, tokens={model: {
+        "input": usage.get("prompt_tokens", 0),
+        "output": usage.get("completion_tokens", 0),
+    }}, image_tokens=min(image_tokens, usage.get("prompt_tokens", image_tokens)))
+
+
+def page_usage(stage: str, meter: str, pages: int) -> dict:
+    return stage_record(stage, pages=pages, page_meter=meter)
+
+
+def image_tokens(width: int | None, height: int | None, detail: str = "high") -> int:
+    """
+    Vision input tokens for one image (OpenAI tiling: fit in 2048², shortest
+    side to 768, 170 tokens per 512 px tile + 85 base).
+    """
+    if detail == "low" or not width or not height:
+        return 85
+    scale = min(1.0, 2048 / max(width, height))
+    w, h = width * scale, height * scale
+    scale = min(1.0, 768 / min(w, h))
+    w, h = w * scale, h * scale
+    return 85 + 170 * math.ceil(w / 512) * math.ceil(h / 512)
+
+
+# ─── Pricing ───────────────────────────────────────────────────────────
+def _token_price(model: str) -> dict:
+    prices = PRICE_TABLE["tokens_per_million"]
+    if model in prices:
+        return prices[model]
+    # Versioned names ("gpt-4.1-2025-04-14", "mistral-document-ai-2505") → longest prefix
+    matches = [k for k in prices if model.lower().startswith(k.lower())]
+    return prices[max(matches, key=len)] if matches else prices["default"]
+
+
+def stage_cost(record: dict) -> float:
+    """Estimated USD for one stage record (0 when it was a shared result)."""
+    if record.get("shared"):
+        return 0.0
+    cost = 0.0
+    if record.get("pages") and record.get("page_meter"):
+        cost += record["pages"] * PRICE_TABLE["pages"].get(record["page_meter"], 0.0)
+    for model, counts in record.get("tokens", {}).items():
+        price = _token_price(model)
+        cost += counts.get("input", 0) / 1e6 * price.get("input", 0.0)
+        cost += counts.get("output", 0) / 1e6 * price.get("output", 0.0)
+    return cost
+
+
+def summarize_usage(records: list[dict]) -> dict:
+    """Normalized per-result usage block with the estimated cost."""
+    billed = [r for r in records if not r.get("shared")]
+    pages = max([r["pages"] for r in billed if r.get("page_meter")] or [0])
+    return {
+        "pages": pages,
+        "prompt_tokens": round(sum(c.get("input", 0) for r in billed for c in r["tokens"].values())),
+        "completion_tokens": round(sum(c.get("output", 0) for r in billed for c in r["tokens"].values())),
+        "image_tokens": sum(r.get("image_tokens", 0) for r in billed),
+        "cost_usd": round(sum(stage_cost(r) for r in records), 6),
+        "stages": records,
+    }
@@ -0,0 +1,227 @@
+"""
+Shared work queue with leases for multi-process / multi-node batches.
+
+A single SQLite file (on local disk, or on a shared mount with working POSIX
+locks) holds one task per (document, analyzer). Workers lease a task for
+`lease_s` seconds and keep extending it with heartbeats while they work. A
+worker that dies stops heartbeating; once its lease expires the task is
+stolen by the next worker that asks for work. Tasks that keep failing are
+given up after `max_attempts` leases.
+
+The blob URL and Operation-Location of a submitted task are checkpointed on
+its row, so a worker that steals it resumes polling the dead worker's
+operation instead of uploading and paying for the analysis again.
+
+    queued → leased → done
+               ↘ queued (lease expired / retryable failure) → … → failed
+
+The rollback journal (not WAL) is used so the file also works when workers
+on different machines share it over a network file system.
+"""
+
+import sqlite3
+import threading
+import time
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    document      TEXT NOT NULL,
+    analyzer      TEXT NOT NULL,
+    path          TEXT NOT NULL,
+    priority      REAL NOT NULL DEFAULT 0,
+    state         TEXT NOT NULL DEFAULT 'queued',
+    worker        TEXT,
+    lease_expires REAL,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    stolen        INTEGER NOT NULL DEFAULT 0,
+    error         TEXT,
+    blob_url      TEXT,
+    op_url        TEXT,
+    submitted_at  REAL,
+    updated_at    REAL NOT NULL,
+    UNIQUE (document, analyzer)
+);
+CREATE INDEX IF NOT EXISTS tasks_pick ON tasks (state, priority, id);
+"""
+
+
+class WorkQueue:
+    """Lease-based task queue backed by a SQLite file."""
+
+    def __init__(self, path: str, lease_s: float = 120.0, max_attempts: int = 3):
+        self.path = path
+        self.lease_s = lease_s
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=60, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=DELETE")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.executescript(_SCHEMA)
+        # Queues created before operations were checkpointed
+        columns = {r["name"] for r in self._conn.execute("PRAGMA table_info(tasks)")}
+        for name, kind in (("blob_url", "TEXT"), ("op_url", "TEXT"), ("submitted_at", "REAL")):
+            if name not in columns:
+                self._conn.execute(f"ALTER TABLE tasks ADD COLUMN {name} {kind}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ── Coordinator ─────────────────────────────────────────────────────
+    def enqueue(self, document: str, analyzer: str, path: str, priority: float = 0.0) -> bool:
+        """Add a task unless it is already known; returns True if added."""
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT OR IGNORE INTO tasks (document, analyzer, path, priority, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (document, analyzer, path, priority, time.time()),
+            )
+            return cur.rowcount == 1
+
+    def requeue_failed(self) -> int:
+        """Give failed tasks a fresh set of attempts."""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE tasks SET state = 'queued', attempts = 0, worker = NULL, "
+                "lease_expires = NULL, updated_at = ? WHERE state = 'failed'",
+                (time.time(),),
+            )
+            return cur.rowcount
+
+    # ── Workers ─────────────────────────────────────────────────────────
+    def lease(self, worker: str) -> dict | None:
+        """
+        Take the next task: queued first (by priority), else steal one whose
+        lease has expired. Returns None when nothing is available right now.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            while True:
+                row = self._conn.execute(
+                    "SELECT * FROM tasks WHERE state = 'queued' "
+                    "   OR (state = 'leased' AND lease_expires < ?) "
+                    "ORDER BY state = 'leased', priority, id LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is None:
+                    return None
+                stolen = row["state"] == "leased"
+                if row["attempts"] < self.max_attempts:
+                    break
+                # Its last holder never came back: give up on it
+                self._conn.execute(
+                    "UPDATE tasks SET state = 'failed', worker = NULL, lease_expires = NULL, "
+                    "error = COALESCE(error, 'lease expired') || ' (gave up after ' "
+                    "|| attempts || ' attempts)', updated_at = ? WHERE id = ?",
+                    (now, row["id"]),
+                )
+            self._conn.execute(
+                "UPDATE tasks SET state = 'leased', worker = ?, lease_expires = ?, "
+                "attempts = attempts + 1, stolen = stolen + ?, updated_at = ? WHERE id = ?",
+                (worker, now + self.lease_s, int(stolen), now, row["id"]),
+            )
+        task = dict(row)
+        task.update(worker=worker, stolen_from=row["worker"] if stolen else None,
+                    attempts=row["attempts"] + 1)
+        return task
+
+    def heartbeat(self, task_id: int, worker: str) -> bool:
+        """Extend the lease; False if the task was stolen meanwhile."""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE tasks SET lease_expires = ?, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND state = 'leased'",
+                (time.time() + self.lease_s, time.time(), task_id, worker),
+            )
+            return cur.rowcount == 1
+
+    def checkpoint(self, task_id: int, worker: str, blob_url: str | None = None,
+                   op_url: str | None = None, submitted_at: float | None = None) -> bool:
+        """Save the task's upload / operation for whoever runs it next; False if stolen."""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE tasks SET blob_url = ?, op_url = ?, submitted_at = ?, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND state = 'leased'",
+                (blob_url, op_url, submitted_at, time.time(), task_id, worker),
+            )
+            return cur.rowcount == 1
+
+    def complete(self, task_id: int, worker: str) -> bool:
+        """Mark the task done; False if its lease was lost (another worker owns it)."""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE tasks SET state = 'done', lease_expires = NULL, error = NULL, "
+                "updated_at = ? WHERE id = ? AND worker = ? AND state = 'leased'",
+                (time.time(), task_id, worker),
+            )
+            return cur.rowcount == 1
+
+    def fail(self, task_id: int, worker: str, error: str, retry: bool = True) -> str:
+        """Release a failed task: back to queued while attempts remain, else failed."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT attempts FROM tasks WHERE id = ? AND worker = ? AND state = 'leased'",
+                (task_id, worker),
+            ).fetchone()
+            if row is None:
+                return "stolen"
+            state = "queued" if retry and row["attempts"] < self.max_attempts else "failed"
+            self._conn.execute(
+                "UPDATE tasks SET state = ?, lease_expires = NULL, error = ?, updated_at = ? "
+                "WHERE id = ?",
+                (state, error[:1000], time.time(), task_id),
+            )
+            return state
+
+    # ── Reads ───────────────────────────────────────────────────────────
+    def counts(self) -> dict:
+        """{state: number_of_tasks}"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT state, COUNT(*) AS n FROM tasks GROUP BY state"
+            ).fetchall()
+        return {r["state"]: r["n"] for r in rows}
+
+    def outstanding(self) -> int:
+        """Tasks still queued or leased (i.e. a worker may still get work)."""
+        counts = self.counts()
+        return counts.get("queued", 0) + counts.get("leased", 0)
+
+    def tasks(self, states=None) -> list[dict]:
+        query, params = "SELECT * FROM tasks", ()
+        if states:
+            query += f" WHERE state IN ({', '.join('?' * len(states))})"
+            params = tuple(states)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY document, analyzer", params).fetchall()
+        return [dict(r) for r in rows]
+
+
+class Heartbeat:
+    """Background lease renewal while a task is being worked on."""
+
+    def __init__(self, queue: WorkQueue, task_id: int, worker: str):
+        self.queue = queue
+        self.task_id = task_id
+        self.worker = worker
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.queue.lease_s / 3):
+            if not self.queue.heartbeat(self.task_id, self.worker):
+                self.lost = True
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()